@@ -1,7 +1,194 @@
+import heapq
 import random
+import sys
+from collections import deque
 from dataclasses import dataclass
-from typing import List, Dict, Optional
-from time import sleep
+from itertools import islice
+from operator import attrgetter
+from typing import Deque, Iterable, Iterator, List, Dict, NamedTuple, Optional, Tuple
+from types import MappingProxyType
+
+from content import NO_ID, CompiledWorld, Npc, compile_world
+from pacing import Pacer, RealTimePacer, TurboPacer
+from renderer import Renderer
+from sampling import COMBAT, ITEM, NOTHING
+
+class Inventory:
+    """Multiset of item IDs with O(1) add, remove and count.
+
+    Items keep the order they were added in, like the list this replaces,
+    so the numbered item list and choose_item() index it the same way.
+    Each item is stored under a sequence number, and every item ID keeps its
+    sequence numbers oldest first, so removing an ID drops its first copy.
+    While an UndoHistory follows the inventory, journal lists the calls that
+    changed it.
+    """
+    __slots__ = ("_items", "_positions", "_next", "version", "journal")
+
+    def __init__(self, items: Iterable[int] = ()):
+        self._items: Dict[int, int] = {}  # sequence number -> item, in the order added
+        self._positions: Dict[int, Deque[int]] = {}  # item -> its sequence numbers, oldest first
+        self._next = 0
+        self.version = 0
+        self.journal: Optional[List[tuple]] = None
+        for item in items:
+            self.append(item)
+
+    def append(self, item: int):
+        self._items[self._next] = item
+        positions = self._positions.get(item)
+        if positions is None:
+            positions = self._positions[item] = deque()
+        positions.append(self._next)
+        self._next += 1
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(("append", item))
+
+    def remove(self, item: int):
+        positions = self._positions.get(item)
+        if not positions:
+            raise ValueError(f"{item!r} is not in the inventory")
+        del self._items[positions.popleft()]
+        if not positions:
+            del self._positions[item]
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(("remove", item))
+
+    def count(self, item: int) -> int:
+        positions = self._positions.get(item)
+        return len(positions) if positions else 0
+
+    def counts(self) -> Dict[int, int]:
+        return {item: len(positions) for item, positions in self._positions.items()}
+
+    def grouped(self):
+        """(item, count) pairs, for counting rather than display"""
+        return ((item, len(positions)) for item, positions in self._positions.items())
+
+    def copy(self) -> "Inventory":
+        clone = Inventory()
+        clone._items = self._items.copy()
+        clone._positions = {item: positions.copy() for item, positions in self._positions.items()}
+        clone._next = self._next
+        return clone
+
+    def __contains__(self, item: int) -> bool:
+        return item in self._positions
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._items.values())
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += len(self._items)
+        if not 0 <= index < len(self._items):
+            raise IndexError("inventory index out of range")
+        return next(islice(self._items.values(), index, None))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Inventory):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Inventory({list(self)!r})"
+
+class QuestList:
+    """Insertion-ordered set of quest IDs with O(1) membership, add and remove"""
+    __slots__ = ("_quests", "version", "journal")
+
+    def __init__(self, quests: Iterable[int] = ()):
+        self._quests: Dict[int, None] = dict.fromkeys(quests)
+        self.version = 0
+        self.journal: Optional[List[tuple]] = None  # calls that changed the list, while an UndoHistory follows it
+
+    def append(self, quest: int):
+        self._quests[quest] = None
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(("append", quest))
+
+    def copy(self) -> "QuestList":
+        clone = QuestList()
+        clone._quests = self._quests.copy()
+        return clone
+
+    def remove(self, quest: int):
+        try:
+            del self._quests[quest]
+        except KeyError:
+            raise ValueError(f"{quest!r} is not in the list") from None
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(("remove", quest))
+
+    def __contains__(self, quest: int) -> bool:
+        return quest in self._quests
+
+    def __len__(self) -> int:
+        return len(self._quests)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._quests)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, QuestList):
+            return list(self._quests) == list(other._quests)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"QuestList({list(self._quests)!r})"
+
+class QuestProgress:
+    """Progress per quest ID, with a version counter that moves whenever progress is set"""
+    __slots__ = ("_progress", "version", "journal")
+
+    def __init__(self, progress: Iterable[Tuple[int, int]] = ()):
+        self._progress: Dict[int, int] = dict(progress)
+        self.version = 0
+        self.journal: Optional[List[tuple]] = None  # calls that changed the progress, while an UndoHistory follows it
+
+    def __getitem__(self, quest: int) -> int:
+        return self._progress[quest]
+
+    def __setitem__(self, quest: int, progress: int):
+        self._progress[quest] = progress
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(("__setitem__", quest, progress))
+
+    def get(self, quest: int, default: Optional[int] = None) -> Optional[int]:
+        return self._progress.get(quest, default)
+
+    def items(self):
+        return self._progress.items()
+
+    def copy(self) -> "QuestProgress":
+        clone = QuestProgress()
+        clone._progress = self._progress.copy()
+        return clone
+
+    def __contains__(self, quest: int) -> bool:
+        return quest in self._progress
+
+    def __len__(self) -> int:
+        return len(self._progress)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._progress)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, QuestProgress):
+            return self._progress == other._progress
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"QuestProgress({self._progress!r})"
 
 @dataclass
 class Character:
@@ -12,112 +199,417 @@ class Character:
     strength: int
     agility: int
     magic: int
-    inventory: List[str]
-    current_location: str
-    story_choices: List[str]
-    quests_completed: List[str]
-    active_quests: List[str]
-    quest_progress: Dict[str, int]
+    inventory: Inventory
+    current_location: int
+    story_choices: List[int]
+    quests_completed: QuestList
+    active_quests: QuestList
+    quest_progress: QuestProgress
 
-class CrystalKingdoms:
-    def __init__(self):
+    def copy(self) -> "Character":
+        """A copy that shares no mutable containers with this character"""
+        return Character(self.name, self.char_class, self.health, self.max_health, self.strength,
+                         self.agility, self.magic, self.inventory.copy(), self.current_location,
+                         self.story_choices[:], self.quests_completed.copy(), self.active_quests.copy(),
+                         self.quest_progress.copy())
+
+class QuestTracker:
+    """Tells which quests a player can take, keeping only what the player has done.
+
+    A quest is available once all its requirements are completed, until it
+    is accepted or completed. missing only holds the quests with some but not
+    all requirements completed; any other quest is still missing all of
+    world.requires_count. taken holds the accepted and completed quests and
+    unlocked the quests with requirements that became available. None of
+    them grows with the world, so neither does the tracker: available quests
+    are listed by walking world.root_quests and unlocked, skipping taken.
+    """
+    def __init__(self, world: CompiledWorld, quests_completed: Iterable[int] = (),
+                 active_quests: Iterable[int] = ()):
+        self.dependents = world.dependents
+        self.requires_count = world.requires_count
+        self.root_quests = world.root_quests
+        self.version = 0
+        self.taken = set(quests_completed)
+        self.missing: Dict[int, int] = {}
+        for quest in self.taken:
+            for dependent in self.dependents[quest]:
+                self.missing[dependent] = self._missing(dependent) - 1
+        self.unlocked = {quest for quest, missing in self.missing.items() if not missing}
+        self.taken.update(active_quests)
+        self.count = (len(self.root_quests) + len(self.unlocked)
+                      - sum(1 for quest in self.taken if self._missing(quest) == 0))
+
+    def _missing(self, quest: int) -> int:
+        return self.missing.get(quest, self.requires_count[quest])
+
+    def is_unlocked(self, quest: int) -> bool:
+        return self._missing(quest) == 0
+
+    def is_available(self, quest: int) -> bool:
+        return quest not in self.taken and self._missing(quest) == 0
+
+    def _take(self, quest: int):
+        if self.is_available(quest):
+            self.count -= 1
+        self.taken.add(quest)
+        self.version += 1
+
+    def accept(self, quest: int):
+        self._take(quest)
+
+    def complete(self, quest: int) -> List[int]:
+        """Mark quest completed and return the quests it made available"""
+        self._take(quest)
+        unlocked = []
+        for dependent in self.dependents[quest]:
+            missing = self.missing[dependent] = self._missing(dependent) - 1
+            if not missing:
+                self.unlocked.add(dependent)
+                if dependent not in self.taken:
+                    self.count += 1
+                unlocked.append(dependent)
+        return unlocked
+
+    def available(self, limit: Optional[int] = None) -> List[int]:
+        """The available quests in ID order, only the first limit of them if given"""
+        quests = heapq.merge(self.root_quests, sorted(self.unlocked))
+        return list(islice((quest for quest in quests if quest not in self.taken), limit))
+
+    def copy(self) -> "QuestTracker":
+        clone = QuestTracker.__new__(QuestTracker)
+        clone.dependents = self.dependents
+        clone.requires_count = self.requires_count
+        clone.root_quests = self.root_quests
+        clone.version = self.version
+        clone.taken = self.taken.copy()
+        clone.missing = self.missing.copy()
+        clone.unlocked = self.unlocked.copy()
+        clone.count = self.count
+        return clone
+
+def freeze(value):
+    """Read-only copy of nested content: dicts become mappingproxies and lists become tuples"""
+    if isinstance(value, MappingProxyType):
+        return value
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+# World content. It is built once, frozen and shared by every game instance.
+CHARACTER_CLASSES = freeze({
+    "warrior": {"health": 100, "strength": 8, "agility": 5, "magic": 2},
+    "mage": {"health": 70, "strength": 3, "agility": 4, "magic": 9},
+    "rogue": {"health": 80, "strength": 5, "agility": 8, "magic": 4}
+})
+ITEMS = freeze({
+    "health_potion": {"type": "consumable", "effect": "heal", "value": 30},
+    "magic_scroll": {"type": "consumable", "effect": "magic_boost", "value": 5},
+    "crystal_shard": {"type": "key_item", "effect": "story"},
+    "ancient_sword": {"type": "weapon", "effect": "strength_boost", "value": 3},
+    "elven_heirloom": {"type": "key_item", "effect": "story"},
+    "purified_crystal": {"type": "key_item", "effect": "story"}
+})
+LOCATIONS = freeze({
+    "crystal_cave": {
+        "description": "A luminous cave filled with glowing crystals.",
+        "enemies": ["Crystal Guardian", "Shadow Lurker"],
+        "items": ["crystal_shard", "health_potion"],
+        "npcs": [{"name": "Wise Crystalreach Sage", "quests": ["Cleanse the Corrupted Crystals"]}]
+    },
+    "haunted_forest": {
+        "description": "An eerie forest where shadows move on their own.",
+        "enemies": ["Dark Wisp", "Corrupted Treant"],
+        "items": ["magic_scroll", "ancient_sword", "elven_heirloom"],
+        "npcs": [
+            {"name": "Elven Ranger", "quests": ["Purge the Dark Forces", "Retrieve Stolen Elven Heirloom"]}
+        ]
+    },
+    "corrupted_castle": {
+        "description": "Once majestic, now twisted by dark magic.",
+        "enemies": ["Dark Knight", "Shadow Mage"],
+        "items": ["health_potion", "crystal_shard"],
+        "npcs": [{"name": "Fallen Prince", "quests": ["Reclaim the Corrupted Throne"]}]
+    }
+})
+ENEMIES = freeze({
+    "Crystal Guardian": {"health": 50, "strength": 5, "agility": 4, "name": "Crystal Guardian"},
+    "Shadow Lurker": {"health": 30, "strength": 7, "agility": 6, "name": "Shadow Lurker"},
+    "Dark Wisp": {"health": 40, "strength": 4, "agility": 8, "name": "Dark Wisp"},
+    "Corrupted Treant": {"health": 60, "strength": 6, "agility": 3, "name": "Corrupted Treant"},
+    "Dark Knight": {"health": 70, "strength": 8, "agility": 5, "name": "Dark Knight"},
+    "Shadow Mage": {"health": 45, "strength": 3, "agility": 4, "name": "Shadow Mage"},
+    "Emperor SkekSo": {"health": 300, "strength": 15, "agility": 7, "name": "Emperor SkekSo"}
+})
+QUEST_DATA = freeze({
+    "Cleanse the Corrupted Crystals": {
+        "requires": [],
+        "enemy_kills": {"Crystal Guardian": 2},
+        "items_needed": ["crystal_shard"],
+        "reward": "purified_crystal",
+        "progress_max": 2
+    },
+    "Purge the Dark Forces": {
+        "requires": ["Cleanse the Corrupted Crystals"],
+        "enemy_kills": {"Dark Wisp": 3, "Corrupted Treant": 1},
+        "items_needed": [],
+        "reward": "magic_scroll",
+        "progress_max": 4
+    },
+    "Retrieve Stolen Elven Heirloom": {
+        "requires": ["Purge the Dark Forces"],
+        "enemy_kills": {},
+        "items_needed": ["elven_heirloom"],
+        "reward": "ancient_sword",
+        "progress_max": 1
+    },
+    "Reclaim the Corrupted Throne": {
+        "requires": ["Retrieve Stolen Elven Heirloom"],
+        "enemy_kills": {"Dark Knight": 1, "Shadow Mage": 1, "Emperor SkekSo": 1},
+        "items_needed": ["purified_crystal"],
+        "reward": None,
+        "progress_max": 2
+    }
+})
+
+DEFAULT_WORLD = compile_world(CHARACTER_CLASSES, ITEMS, LOCATIONS, ENEMIES, QUEST_DATA,
+                              boss="Emperor SkekSo", start_location="crystal_cave",
+                              starting_items=["health_potion"])
+
+class GameState:
+    """Everything about one game session that changes while playing"""
+    __slots__ = ("player", "final", "fighting_skekso", "game_running", "turns", "quest_tracker")
+
+    def __init__(self, quest_tracker: QuestTracker):
         self.player: Optional[Character] = None
         self.final = False
         self.fighting_skekso = False
         self.game_running = True
-        self.character_classes = {
-            "warrior": {"health": 100, "strength": 8, "agility": 5, "magic": 2},
-            "mage": {"health": 70, "strength": 3, "agility": 4, "magic": 9},
-            "rogue": {"health": 80, "strength": 5, "agility": 8, "magic": 4}
-        }
-        self.items = {
-            "health_potion": {"type": "consumable", "effect": "heal", "value": 30},
-            "magic_scroll": {"type": "consumable", "effect": "magic_boost", "value": 5},
-            "crystal_shard": {"type": "key_item", "effect": "story"},
-            "ancient_sword": {"type": "weapon", "effect": "strength_boost", "value": 3},
-            "elven_heirloom": {"type": "key_item", "effect": "story"},
-            "purified_crystal": {"type": "key_item", "effect": "story"}
-        }
-        self.locations = {
-            "crystal_cave": {
-                "description": "A luminous cave filled with glowing crystals.",
-                "enemies": ["Crystal Guardian", "Shadow Lurker"],
-                "items": ["crystal_shard", "health_potion"],
-                "npcs": [{"name": "Wise Crystalreach Sage", "quests": ["Cleanse the Corrupted Crystals"]}]
-            },
-            "haunted_forest": {
-                "description": "An eerie forest where shadows move on their own.",
-                "enemies": ["Dark Wisp", "Corrupted Treant"],
-                "items": ["magic_scroll", "ancient_sword", "elven_heirloom"],
-                "npcs": [
-                    {"name": "Elven Ranger", "quests": ["Purge the Dark Forces", "Retrieve Stolen Elven Heirloom"]}
-                ]
-            },
-            "corrupted_castle": {
-                "description": "Once majestic, now twisted by dark magic.",
-                "enemies": ["Dark Knight", "Shadow Mage"],
-                "items": ["health_potion", "crystal_shard"],
-                "npcs": [{"name": "Fallen Prince", "quests": ["Reclaim the Corrupted Throne"]}]
-            }
-        }
-        self.enemies = {
-            "Crystal Guardian": {"health": 50, "strength": 5, "agility": 4, "name": "Crystal Guardian"},
-            "Shadow Lurker": {"health": 30, "strength": 7, "agility": 6, "name": "Shadow Lurker"},
-            "Dark Wisp": {"health": 40, "strength": 4, "agility": 8, "name": "Dark Wisp"},
-            "Corrupted Treant": {"health": 60, "strength": 6, "agility": 3, "name": "Corrupted Treant"},
-            "Dark Knight": {"health": 70, "strength": 8, "agility": 5, "name": "Dark Knight"},
-            "Shadow Mage": {"health": 45, "strength": 3, "agility": 4, "name": "Shadow Mage"},
-            "Emperor SkekSo": {"health": 300, "strength": 15, "agility": 7, "name": "Emperor SkekSo"}
-        }
-        self.quest_data = {
-            "Cleanse the Corrupted Crystals": {
-                "requires": [],
-                "enemy_kills": {"Crystal Guardian": 2},
-                "items_needed": ["crystal_shard"],
-                "reward": "purified_crystal",
-                "progress_max": 2
-            },
-            "Purge the Dark Forces": {
-                "requires": ["Cleanse the Corrupted Crystals"],
-                "enemy_kills": {"Dark Wisp": 3, "Corrupted Treant": 1},
-                "items_needed": [],
-                "reward": "magic_scroll",
-                "progress_max": 4
-            },
-            "Retrieve Stolen Elven Heirloom": {
-                "requires": ["Purge the Dark Forces"],
-                "enemy_kills": {},
-                "items_needed": ["elven_heirloom"],
-                "reward": "ancient_sword",
-                "progress_max": 1
-            },
-            "Reclaim the Corrupted Throne": {
-                "requires": ["Retrieve Stolen Elven Heirloom"],
-                "enemy_kills": {"Dark Knight": 1, "Shadow Mage": 1, "Emperor SkekSo": 1},
-                "items_needed": ["purified_crystal"],
-                "reward": None,
-                "progress_max": 2
-            }
-        }
+        self.turns = 0
+        self.quest_tracker = quest_tracker
+
+    def copy(self) -> "GameState":
+        clone = GameState(self.quest_tracker.copy())
+        clone.player = None if self.player is None else self.player.copy()
+        clone.final = self.final
+        clone.fighting_skekso = self.fighting_skekso
+        clone.game_running = self.game_running
+        clone.turns = self.turns
+        return clone
+
+class GameSnapshot(NamedTuple):
+    """The mutable part of a game at one moment; see CrystalKingdoms.snapshot()"""
+    state: GameState
+    rng: Optional[tuple]
+
+class Frame(NamedTuple):
+    """The game at the start of one turn, as stored by UndoHistory.
+
+    The inventory and quest fields hold the (method, *args) calls that
+    changed them since the previous frame.
+    """
+    stats: tuple
+    flags: tuple
+    inventory: tuple
+    story_length: int
+    quests_completed: tuple
+    active_quests: tuple
+    quest_progress: tuple
+
+class UndoHistory:
+    """The last `depth` turn starts of a game, for rewinding.
+
+    Frames hold only what changed since the previous frame. While the
+    history follows the inventory, quest lists and quest progress they
+    journal every call that changes them, and each frame keeps the calls
+    made since the frame before, so a turn costs time and memory in
+    proportion to what it changed. The containers as of the oldest frame are
+    kept whole, and rewinding replays the calls on a copy of them. A
+    container the game replaced is stored whole once, as a "reset" call.
+    Story choices are append-only and stored as a length. The random stream
+    is not rewound, so a replayed turn rolls fresh dice.
+    """
+    CONTAINERS = ("inventory", "quests_completed", "active_quests", "quest_progress")
+
+    def __init__(self, depth: int = 20):
+        self.depth = depth
+        self.frames: Deque[Frame] = deque()
+        self._base: Dict[str, object] = {}  # each container as of frames[0]
+        self._followed: Dict[str, object] = {}  # the containers journaling their changes
+        self._pending: Dict[str, tuple] = {}  # changes rewind() went back over, due in the next frame
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def _changes(self, name: str, container) -> tuple:
+        """The calls that changed container since the previous frame"""
+        if self._followed.get(name) is not container:
+            self._followed[name] = container
+            self._pending.pop(name, None)
+            container.journal = []
+            return (("reset", container.copy()),)
+        changes = self._pending.pop(name, ()) + tuple(container.journal)
+        container.journal.clear()
+        return changes
+
+    @staticmethod
+    def _apply(container, changes: tuple):
+        for method, *args in changes:
+            if method == "reset":
+                container = args[0].copy()
+            else:
+                getattr(container, method)(*args)
+        return container
+
+    def record(self, game: "CrystalKingdoms"):
+        player = game.player
+        changes = {name: self._changes(name, getattr(player, name)) for name in self.CONTAINERS}
+        self.frames.append(Frame(
+            stats=(player.name, player.char_class, player.health, player.max_health, player.strength,
+                   player.agility, player.magic, player.current_location),
+            flags=(game.final, game.fighting_skekso, game.game_running, game.turns),
+            inventory=changes["inventory"],
+            story_length=len(player.story_choices),
+            quests_completed=changes["quests_completed"],
+            active_quests=changes["active_quests"],
+            quest_progress=changes["quest_progress"],
+        ))
+        if len(self.frames) > self.depth:
+            self.frames.popleft()
+        elif len(self.frames) > 1:
+            return
+        for name in self.CONTAINERS:  # the base moves up to the new oldest frame
+            self._base[name] = self._apply(self._base.get(name), getattr(self.frames[0], name))
+
+    def rewind(self, game: "CrystalKingdoms", turns: int = 0) -> bool:
+        """Go back to the start of the turn `turns` turns before the latest recorded one.
+
+        The frames after it are dropped, and so is the frame itself, since
+        the game records it again when the turn starts over.
+        """
+        if turns >= len(self.frames):
+            return False
+        for _ in range(turns):
+            self.frames.pop()
+        frame = self.frames.pop()
+        containers = {}
+        for name in self.CONTAINERS:
+            container = self._base[name].copy()
+            for earlier in islice(self.frames, 1, None):
+                container = self._apply(container, getattr(earlier, name))
+            if self.frames:
+                container = self._apply(container, getattr(frame, name))
+                self._pending[name] = getattr(frame, name)
+            else:
+                self._pending.pop(name, None)
+            container.journal = []
+            self._followed[name] = containers[name] = container
+        name, char_class, health, max_health, strength, agility, magic, location = frame.stats
+        story_choices = game.player.story_choices
+        del story_choices[frame.story_length:]
+        game.player = Character(
+            name=name, char_class=char_class, health=health, max_health=max_health, strength=strength,
+            agility=agility, magic=magic, inventory=containers["inventory"],
+            current_location=location, story_choices=story_choices,
+            quests_completed=containers["quests_completed"], active_quests=containers["active_quests"],
+            quest_progress=containers["quest_progress"],
+        )
+        game.quest_tracker = QuestTracker(game.world, containers["quests_completed"], containers["active_quests"])
+        game.final, game.fighting_skekso, game.game_running, game.turns = frame.flags
+        return True
+
+def _state_attribute(name: str) -> property:
+    """Expose a GameState field as an attribute of the game"""
+    def set_value(game, value):
+        setattr(game.state, name, value)
+    return property(attrgetter("state." + name), set_value)
+
+def run_sync(coroutine):
+    """Drive a game coroutine to completion without an event loop.
+
+    Works as long as everything the game awaits answers immediately (console
+    input, headless policies, TurboPacer/RealTimePacer); anything that really
+    suspends, such as a network read, needs asyncio instead.
+    """
+    try:
+        while True:
+            if coroutine.send(None) is not None:
+                coroutine.close()
+                raise RuntimeError("run_sync() cannot wait on asyncio futures; use asyncio.run() instead")
+    except StopIteration as stop:
+        return stop.value
+
+class ConsoleIO:
+    """Terminal front end: every prompt goes to input() and every message to print()"""
+    async def ask(self, kind: str, prompt: str) -> str:
+        """Answer the decision point `kind` by asking the player"""
+        return input(prompt)
+
+    def say(self, text: str):
+        sys.stdout.write(f"{text}\n")
+
+class CrystalKingdoms:
+    player = _state_attribute("player")
+    final = _state_attribute("final")
+    fighting_skekso = _state_attribute("fighting_skekso")
+    game_running = _state_attribute("game_running")
+    turns = _state_attribute("turns")
+    quest_tracker = _state_attribute("quest_tracker")
+
+    def __init__(self, io=None, rng: Optional[random.Random] = None, world: Optional[CompiledWorld] = None,
+                 pacer: Optional[Pacer] = None, undo_depth: int = 0):
+        self.io = io or ConsoleIO()
+        self.rng = rng or random.Random()
+        self.pacer = pacer or RealTimePacer(1.5)
+        world = world or DEFAULT_WORLD
+        self.world = world
+        self.character_classes = world.character_classes
+        self.items = world.items
+        self.locations = world.locations
+        self.enemies = world.enemies
+        self.npcs = world.npcs
+        self.quests = world.quests
+        self.renderer = Renderer(world)
+        self.state = GameState(QuestTracker(world))
+        self.history = UndoHistory(undo_depth) if undo_depth > 0 else None
+
+    def snapshot(self, with_rng: bool = True) -> GameSnapshot:
+        """Capture the session state and random stream, without the shared world tables.
+
+        Costs time proportional to the player's state only. Taken between
+        turns, or at a prompt together with the answers given so far this
+        turn, it is enough to replay the game from that point. Copying the
+        random stream is the most expensive part; planners that reseed the
+        game for every rollout can leave it out with with_rng=False.
+        """
+        return GameSnapshot(self.state.copy(), self.rng.getstate() if with_rng else None)
 
-    def start_game(self):
+    def restore(self, snapshot: GameSnapshot):
+        """Return to a snapshot; the snapshot itself is left untouched and can be restored again"""
+        self.state = snapshot.state.copy()
+        if snapshot.rng is not None:
+            self.rng.setstate(snapshot.rng)
+
+    async def start_game(self):
         """Initialize and start the game"""
-        print("\n" + "="*50)
-        print("Welcome to The Crystal Kingdoms!")
-        print("="*50)
-        print("\nIn a realm where three kingdoms once maintained peace through sacred crystals,")
-        print("darkness now spreads across the land. As a brave adventurer, you must restore")
-        print("balance to the kingdoms and choose your path carefully...")
-        print("\nYour choices and completed quests will determine your ultimate destiny.")
+        self.io.say("\n" + "="*50)
+        self.io.say("Welcome to The Crystal Kingdoms!")
+        self.io.say("="*50)
+        self.io.say("\nIn a realm where three kingdoms once maintained peace through sacred crystals,")
+        self.io.say("darkness now spreads across the land. As a brave adventurer, you must restore")
+        self.io.say("balance to the kingdoms and choose your path carefully...")
+        self.io.say("\nYour choices and completed quests will determine your ultimate destiny.")
         
-        self.create_character()
-        self.game_loop()
+        await self.create_character()
+        await self.game_loop()
 
-    def create_character(self):
+    async def create_character(self):
         """Create a new character"""
-        print("\n=== Character Creation ===")
-        name = input("Enter your character's name: ").strip()
-        char_class = self.choose_class()
+        self.io.say("\n=== Character Creation ===")
+        name = (await self.io.ask("name", "Enter your character's name: ")).strip()
+        char_class = await self.choose_class()
         stats = self.character_classes[char_class]
         self.player = Character(
             name=name,
@@ -127,102 +619,60 @@ class CrystalKingdoms:
             strength=stats['strength'],
             agility=stats['agility'],
             magic=stats['magic'],
-            inventory=["health_potion"],
-            current_location="crystal_cave",
+            inventory=Inventory(self.world.starting_items),
+            current_location=self.world.start_location,
             story_choices=[],
-            quests_completed=[],
-            active_quests=[],
-            quest_progress={}
+            quests_completed=QuestList(),
+            active_quests=QuestList(),
+            quest_progress=QuestProgress()
         )
-        print(f"\nWelcome, {name} the {char_class.title()}!")
-        print(f"\nYou begin your journey in the Crystal Cave...")
+        self.quest_tracker = QuestTracker(self.world)
+        start = self.locations[self.player.current_location].name
+        self.io.say(f"\nWelcome, {name} the {char_class.title()}!")
+        self.io.say(f"\nYou begin your journey in the {start.replace('_', ' ').title()}...")
 
-    def choose_class(self):
+    async def choose_class(self):
         """Let the player choose their character class"""
-        print("\nAvailable Classes:")
+        self.io.say("\nAvailable Classes:")
         for class_name, stats in self.character_classes.items():
-            print(f"\n{class_name.title()}:")
+            self.io.say(f"\n{class_name.title()}:")
             for stat, value in stats.items():
-                print(f"  {stat.title()}: {value}")
+                self.io.say(f"  {stat.title()}: {value}")
         
         while True:
-            choice = input("\nChoose your class (warrior/mage/rogue): ").lower()
+            choice = (await self.io.ask("class", "\nChoose your class (warrior/mage/rogue): ")).lower()
             if choice in self.character_classes:
                 return choice
-            print("Invalid class choice. Please try again.")
+            self.io.say("Invalid class choice. Please try again.")
+
+    async def game_loop(self, max_turns: Optional[int] = None):
+        """Main game loop, optionally stopping after max_turns turns"""
+        while self.game_running:
+            if self.check_game_over() and not await self.offer_rewind():
+                break
+            if max_turns is not None and self.turns >= max_turns:
+                break
+            await self.play_turn()
+            await self.pacer.end_turn_async(self.turns)
 
-    def game_loop(self):
-        """Main game loop"""
-        while self.game_running and not self.check_game_over():
-            self.show_status()
-            self.handle_player_turn()
-            sleep(1.5)
+    async def play_turn(self):
+        """Show the status screen and handle one player action"""
+        self.pacer.start_turn()
+        if self.history is not None:
+            self.history.record(self)
+        self.show_status()
+        await self.handle_player_turn()
+        self.turns += 1
 
     def show_status(self):
         """Display current game status"""
-        print("\n" + "="*50)
-        print(f"Location: {self.player.current_location.replace('_', ' ').title()}")
-        print(f"Health: {self.player.health}/{self.player.max_health}")
-        print(f"Inventory: {', '.join(item.replace('_', ' ').title() for item in self.player.inventory) or 'Empty'}")
-        
-        # Display Active Quests with detailed progress
-        if self.player.active_quests:
-            print("\n=== Active Quests ===")
-            for quest in self.player.active_quests:
-                quest_data = self.quest_data[quest]
-                progress = self.player.quest_progress.get(quest, 0)
-                max_progress = quest_data["progress_max"]
-                print(f"\n- {quest} ({progress}/{max_progress})")
-                
-                # Show enemy kills needed
-                if quest_data["enemy_kills"]:
-                    print("  Required kills:")
-                    for enemy, count in quest_data["enemy_kills"].items():
-                        current_kills = min(progress, count)  # Estimate kills based on progress
-                        print(f"  - {enemy}: {current_kills}/{count}")
-                
-                # Show items needed
-                if quest_data["items_needed"]:
-                    print("  Required items:")
-                    for item in quest_data["items_needed"]:
-                        has_item = item in self.player.inventory
-                        status = "✓" if has_item else "✗"
-                        print(f"  - {item.replace('_', ' ')}: {status}")
-                
-                # Show reward if any
-                if quest_data["reward"]:
-                    print(f"  Reward: {quest_data['reward'].replace('_', ' ')}")
-        
-        # Display Completed Quests
-        if self.player.quests_completed:
-            print("\n=== Completed Quests ===")
-            for quest in self.player.quests_completed:
-                print(f"✓ {quest}")
-        
-        # Display Available Quests (not taken but prerequisites met)
-        available_quests = [
-            quest for quest, data in self.quest_data.items()
-            if quest not in self.player.active_quests 
-            and quest not in self.player.quests_completed
-            and all(req in self.player.quests_completed for req in data["requires"])
-        ]
-        if available_quests:
-            print("\n=== Available Quests ===")
-            for quest in available_quests:
-                print(f"! {quest}")
-        
-        print("="*50)
-        print("\nActions:")
-        print("1. Explore")
-        print("2. Use item")
-        print("3. Move to new location")
-        print("4. Rest")
-        print("5. Talk to NPCs")
-        print("6. Quit game")
-        if self.final:
-            print("7. Fight Emperor SkekSo")
-
-    def handle_player_turn(self):
+        self.io.say(self.renderer.status(self.player, self.quest_tracker, self.final, self.history is not None))
+
+    def status_data(self) -> dict:
+        """The data shown by show_status, as a JSON-friendly dict"""
+        return self.renderer.status_data(self.player, self.quest_tracker, self.final, self.history is not None)
+
+    async def handle_player_turn(self):
         """Handle player's turn"""
         actions = {
             "1": self.explore,
@@ -233,355 +683,396 @@ class CrystalKingdoms:
             "6": self.quit_game,
             "7": self.fight_skekso
         }
+        if self.history is not None:
+            actions["8"] = self.undo_turn
         
-        choice = input("\nWhat would you like to do? (1-6): ")
+        choice = await self.io.ask("action", "\nWhat would you like to do? (1-6): ")
         if choice == '7' and not self.final:
-            choice = '8'
+            choice = ''
         if choice in actions:
-            actions[choice]()
+            await actions[choice]()
         else:
-            print("\nInvalid choice. Please try again.")
+            self.io.say("\nInvalid choice. Please try again.")
 
-    def handle_item_effect(self, item: str):
-        if item:
+    async def handle_item_effect(self, item: Optional[int]):
+        if item is not None:
             used = False
             item_data = self.items[item]
-            if item_data["type"] == "consumable":
-                if item_data["effect"] == "heal":
-                    self.player.health = min(self.player.max_health, self.player.health + item_data["value"])
-                    print(f"\nHealed for {item_data['value']} health!")
+            if item_data.type == "consumable":
+                if item_data.effect == "heal":
+                    self.player.health = min(self.player.max_health, self.player.health + item_data.value)
+                    self.io.say(f"\nHealed for {item_data.value} health!")
                     used = True
-                elif item_data["effect"] == "magic_boost":
-                    self.player.magic += item_data["value"]
-                    print(f"\nMagic increased by {item_data['value']}!")
+                elif item_data.effect == "magic_boost":
+                    self.player.magic += item_data.value
+                    self.io.say(f"\nMagic increased by {item_data.value}!")
                     used = True
-            elif item_data["type"] == "weapon":
-                self.player.strength += item_data["value"]
-                print(f"\nStrength increased by {item_data['value']}!")
+            elif item_data.type == "weapon":
+                self.player.strength += item_data.value
+                self.io.say(f"\nStrength increased by {item_data.value}!")
                 used = True
-            elif item_data["type"] == "key_item":
-                throw_away = input("\nYou cannot use this item, do you wish to throw it away? WARNING: YOU CANNOT UNDO THIS ACTION (y/n): ")
+            elif item_data.type == "key_item":
+                throw_away = await self.io.ask("throw_away", "\nYou cannot use this item, do you wish to throw it away? WARNING: YOU CANNOT UNDO THIS ACTION (y/n): ")
                 if throw_away[0] == 'y':
                     used = True
             if used:
                 self.player.inventory.remove(item)
     
-    def explore(self):
+    async def explore(self):
         location = self.locations[self.player.current_location]
-        print(f"\n{location['description']}")
-        if random.random() < 0.7:  # 70% chance of an event
-            if random.random() < 0.6:  # 60% chance of combat
-                self.combat(random.choice(location['enemies']))
+        tables = self.world.location_tables[self.player.current_location]
+        self.io.say(f"\n{location.description}")
+        if tables.classic:  # 70% chance of an event, of which 60% are fights, drawn as they always were
+            event = (COMBAT if self.rng.random() < 0.6 else ITEM) if self.rng.random() < 0.7 else NOTHING
+        else:
+            event = tables.events.sample(self.rng)
+        if event == COMBAT:
+            if tables.classic:
+                await self.combat(self.rng.choice(location.enemies))
             else:
-                self.find_item()
+                await self.combat(location.enemies[tables.enemies.sample(self.rng)])
+        elif event == ITEM:
+            self.find_item()
         else:
-            print("\nYou explore the area but find nothing of interest.")
+            self.io.say("\nYou explore the area but find nothing of interest.")
 
-    def combat(self, enemy_name: str):
-        enemy = self.enemies[enemy_name].copy()
+    async def combat(self, enemy_id: int):
+        enemy = self.enemies[enemy_id]._asdict()
         enemy['current_health'] = enemy['health']
         if not self.fighting_skekso:
-            print(f"\nYou encounter a {enemy_name}!")
+            self.io.say(f"\nYou encounter a {enemy['name']}!")
         else:
-            print("\nOMG ITS SKEKSO")
+            self.io.say("\nOMG ITS SKEKSO")
         
         while enemy['current_health'] > 0 and self.player.health > 0:
             self.display_health(enemy)
-            fled = self.do_combat_action(enemy)
+            fled = await self.do_combat_action(enemy)
             if fled:
                 break
 
         if enemy['current_health'] <= 0:
-            print(f"\nYou defeated the {enemy_name}!")
+            self.io.say(f"\nYou defeated the {enemy['name']}!")
             # Update quest progress for enemy kills
-            for quest in self.player.active_quests:
-                quest_data = self.quest_data[quest]
-                if enemy_name in quest_data["enemy_kills"]:
-                    self.player.quest_progress[quest] = min(
-                        quest_data["progress_max"],
-                        self.player.quest_progress.get(quest, 0) + 1
-                    )
-                    current_progress = self.player.quest_progress[quest]
-                    max_progress = quest_data["progress_max"]
-                    print(f"\nQuest progress updated: {quest} ({current_progress}/{max_progress})")
+            affected = self.world.quests_for_kill(enemy_id, self.player.active_quests)
+            progress_max = self.world.quest_progress_max
+            for quest in affected:
+                self.player.quest_progress[quest] = min(
+                    progress_max[quest],
+                    self.player.quest_progress.get(quest, 0) + 1
+                )
+                current_progress = self.player.quest_progress[quest]
+                self.io.say(f"\nQuest progress updated: {self.quests[quest].name} ({current_progress}/{progress_max[quest]})")
                     
-            self.check_all_quests()
+            self.check_all_quests(affected)
 
     def display_health(self, enemy):
-        print(f"\nYour Health: {self.player.health}/{self.player.max_health}")
-        print(f"{enemy['name']} Health: {enemy['current_health']}/{enemy['health']}")
-
-    def do_combat_action(self, enemy):
-        print("\nCombat Options:")
-        print("1. Attack")
-        print("2. Defend")
-        print("3. Use Item")
-        print("4. Flee")
+        self.io.say(f"\nYour Health: {self.player.health}/{self.player.max_health}")
+        self.io.say(f"{enemy['name']} Health: {enemy['current_health']}/{enemy['health']}")
+
+    async def do_combat_action(self, enemy):
+        self.io.say("\nCombat Options:")
+        self.io.say("1. Attack")
+        self.io.say("2. Defend")
+        self.io.say("3. Use Item")
+        self.io.say("4. Flee")
         
-        choice = input("Choose your action (1-4): ")
+        choice = await self.io.ask("combat", "Choose your action (1-4): ")
         
         if choice == "1":
             self.attack(enemy)
         elif choice == "2":
             self.defend()
         elif choice == "3":
-            self.use_item()
+            await self.use_item()
         elif choice == "4":
             if self.flee():
                 return True
         else:
-            print("Invalid choice! Turn skipped.")
+            self.io.say("Invalid choice! Turn skipped.")
 
         # Enemy turn
         if enemy['current_health'] > 0:
-            damage = max(0, enemy['strength'] - random.randint(0, 3))
+            damage = max(0, enemy['strength'] - self.rng.randint(0, 3))
             self.player.health -= damage
-            print(f"\n{enemy['name']} deals {damage} damage to you!")
+            self.io.say(f"\n{enemy['name']} deals {damage} damage to you!")
         return False
 
     def attack(self, enemy):
-        damage = self.player.strength + random.randint(1, 6)
+        damage = self.player.strength + self.rng.randint(1, 6)
         enemy['current_health'] -= damage
-        print(f"\nYou deal {damage} damage!")
+        self.io.say(f"\nYou deal {damage} damage!")
 
     def defend(self):
         self.player.health = min(self.player.max_health, 
-                               self.player.health + random.randint(5, 10))
-        print("\nYou take a defensive stance and recover some health!")
+                               self.player.health + self.rng.randint(5, 10))
+        self.io.say("\nYou take a defensive stance and recover some health!")
 
-    def use_item(self):
+    async def use_item(self):
         if self.player.inventory:
-            choice = self.choose_item()
+            choice = await self.choose_item()
             if choice == -1:
-                print('\nCancelling...')
+                self.io.say('\nCancelling...')
                 return
             try:
-                self.handle_item_effect(self.player.inventory[choice])
+                await self.handle_item_effect(self.player.inventory[choice])
             except IndexError:
-                print('\nPlease enter a valid number!')
-                self.use_item()
+                self.io.say('\nPlease enter a valid number!')
+                await self.use_item()
         else:
-            print('\nYour inventory is empty!')
+            self.io.say('\nYour inventory is empty!')
 
-    def choose_item(self):
-        print("\nInventory:")
+    async def choose_item(self):
+        self.io.say("\nInventory:")
         for i, item in enumerate(self.player.inventory, 1):
-            print(f"{i}. {item.replace('_', ' ').title()}")
+            self.io.say(f"{i}. {self.renderer.item_title(item)}")
         try:
-            return int(input("\nChoose item to use (0 to cancel): ")) - 1
+            return int(await self.io.ask("item", "\nChoose item to use (0 to cancel): ")) - 1
         except ValueError:
-            print("\nPlease enter a number!")
-            return self.choose_item()
+            self.io.say("\nPlease enter a number!")
+            return await self.choose_item()
 
     def flee(self):
-        if random.random() < self.player.agility * 0.1:
-            print("\nYou successfully fled!")
+        if self.rng.random() < self.player.agility * 0.1:
+            self.io.say("\nYou successfully fled!")
             return True
-        print("\nYou couldn't escape!")
+        self.io.say("\nYou couldn't escape!")
         return False
 
     def find_item(self):
         location = self.locations[self.player.current_location]
-        if location['items']:
-            item = random.choice(location['items'])
-            print(f"\nYou found a {item.replace('_', ' ')}!")
+        if location.items:
+            tables = self.world.location_tables[self.player.current_location]
+            item = (self.rng.choice(location.items) if tables.classic
+                    else location.items[tables.items.sample(self.rng)])
+            self.io.say(f"\nYou found a {self.items[item].name.replace('_', ' ')}!")
             self.player.inventory.append(item)
             
             # Check if the found item completes any quests
-            for quest in self.player.active_quests:
-                quest_data = self.quest_data[quest]
-                if item in quest_data["items_needed"]:
-                    print(f"This item is needed for the quest: {quest}")
+            affected = self.world.quests_for_item(item, self.player.active_quests)
+            for quest in affected:
+                self.io.say(f"This item is needed for the quest: {self.quests[quest].name}")
             
-            self.check_all_quests()
+            self.check_all_quests(affected)
 
-    def change_location(self):
-        print("\nAvailable locations:")
-        for i, location in enumerate(self.locations, 1):
-            print(f"{i}. {location.replace('_', ' ').title()}")
+    async def change_location(self):
+        exits = self.world.graph.exits(self.player.current_location)
+        self.io.say("\nNeighbouring locations:")
+        for i, (location, cost) in enumerate(exits, 1):
+            self.io.say(f"{i}. {self.renderer.location_title(location)} (travel cost {cost})")
+        answer = await self.io.ask("location", "\nChoose location to travel to, or type the name of any location "
+                                               "to travel there by the shortest route (0 to cancel): ")
         try:
-            choice = int(input("\nChoose location to travel to (0 to cancel): ")) - 1
-            if 0 <= choice < len(self.locations):
-                new_location = list(self.locations)[choice]
-                if new_location != self.player.current_location:
-                    self.player.current_location = new_location
-                    print(f"\nTraveled to {new_location.replace('_', ' ').title()}")
-                    self.player.story_choices.append(new_location)
-                else:
-                    print("\nYou're already here!")
+            choice = int(answer) - 1
         except ValueError:
-            print("Please enter a valid number!")
+            self.travel_to(answer)
+            return
+        if 0 <= choice < len(exits):
+            self.arrive(exits[choice][0])
+
+    def travel_to(self, name: str):
+        """Follow the cheapest route to the location called name, through every location in between"""
+        destination = self.world.location_ids.get(name.strip().lower().replace(' ', '_'))
+        if destination is None:
+            self.io.say("Please enter a location number or name!")
+        elif destination == self.player.current_location:
+            self.io.say("\nYou're already here!")
+        else:
+            route = self.world.graph.route(self.player.current_location, destination)
+            if route is None:
+                self.io.say(f"\nThere is no way to reach {self.renderer.location_title(destination)} from here.")
+            for location in route or ():
+                self.arrive(location)
+
+    def arrive(self, location: int):
+        self.player.current_location = location
+        self.io.say(f"\nTraveled to {self.renderer.location_title(location)}")
+        self.player.story_choices.append(location)
 
-    def rest(self):
-        if random.random() < 0.8:
+    async def rest(self):
+        if self.rng.random() < 0.8:
             self.player.health = min(self.player.max_health, self.player.health + 20)
-            print(f"\nYou rest peacefully and recover 20 health.")
+            self.io.say(f"\nYou rest peacefully and recover 20 health.")
         else:
-            print("\nYour rest is interrupted by strange noises...")
-            self.explore()
+            self.io.say("\nYour rest is interrupted by strange noises...")
+            await self.explore()
 
-    def talk_to_npcs(self):
+    async def talk_to_npcs(self):
         location = self.locations[self.player.current_location]
-        if location['npcs']:
-            print("\nNPCs:")
-            for i, npc in enumerate(location['npcs'], 1):
-                print(f"{i}. {npc['name']}")
+        if location.npcs:
+            self.io.say("\nNPCs:")
+            for i, npc in enumerate(location.npcs, 1):
+                self.io.say(f"{i}. {self.npcs[npc].name}")
             try:
-                choice = int(input("\nChoose NPC to talk to (0 to cancel): ")) - 1
-                if 0 <= choice < len(location['npcs']):
-                    self.handle_npc_interaction(location['npcs'][choice])
+                choice = int(await self.io.ask("npc", "\nChoose NPC to talk to (0 to cancel): ")) - 1
+                if 0 <= choice < len(location.npcs):
+                    await self.handle_npc_interaction(self.npcs[location.npcs[choice]])
                 else:
-                    print("Invalid NPC choice!")
+                    self.io.say("Invalid NPC choice!")
             except ValueError:
-                print("Please enter a valid number!")
+                self.io.say("Please enter a valid number!")
         else:
-            print("\nThere are no NPCs to talk to here.")
+            self.io.say("\nThere are no NPCs to talk to here.")
 
-    def handle_npc_interaction(self, npc: dict):
-        print(f"\nYou approach {npc['name']}.")
+    async def handle_npc_interaction(self, npc: Npc):
+        self.io.say(f"\nYou approach {npc.name}.")
 
         # Check for completable quests first
         completable_quests = [
-            quest for quest in self.player.active_quests
-            if quest in npc['quests'] and  # NPC must be the quest giver
+            quest for quest in npc.quests  # NPC must be the quest giver
+            if quest in self.player.active_quests and
             self.is_quest_completable(quest)
         ]
 
         if completable_quests:
-            print(f"\n{npc['name']}: Ah, you've returned! Let me see your progress...")
+            self.io.say(f"\n{npc.name}: Ah, you've returned! Let me see your progress...")
             for quest in completable_quests:
-                print(f"\nYou can complete: {quest}")
-                choice = input("Turn in this quest? (y/n): ").lower()
+                self.io.say(f"\nYou can complete: {self.quests[quest].name}")
+                choice = (await self.io.ask("turn_in", "Turn in this quest? (y/n): ")).lower()
                 if choice == 'y':
                     self.complete_quest(quest)
                     if quest in self.player.active_quests:
                         self.player.active_quests.remove(quest)
-                    print(f"Quest '{quest}' completed!")
+                    self.io.say(f"Quest '{self.quests[quest].name}' completed!")
                     break  # Exit the loop after completing a quest
         
         # Then show available quests
         available_quests = [
-            quest for quest in npc['quests']
-            if quest not in self.player.quests_completed 
-            and quest not in self.player.active_quests
-            and self.can_take_quest(quest)
+            quest for quest in npc.quests
+            if self.quest_tracker.is_available(quest)
         ]
 
         if available_quests and not completable_quests:
-            print(f"\n{npc['name']}: I have some tasks that need attention...")
+            self.io.say(f"\n{npc.name}: I have some tasks that need attention...")
             for quest in available_quests:
-                print(f"\n- {quest}")
+                self.io.say(f"\n- {self.quests[quest].name}")
                 if self.can_take_quest(quest):
-                    choice = input("Accept this quest? (y/n): ").lower()
+                    choice = (await self.io.ask("accept_quest", "Accept this quest? (y/n): ")).lower()
                     if choice == 'y':
                         self.handle_quest(quest)
                         break  # Exit the loop after accepting a quest
                 else:
-                    required_quests = self.quest_data[quest]["requires"]
+                    required_quests = self.quests[quest].requires
                     if required_quests:
-                        print(f"  (Requires completion of: {', '.join(required_quests)})")
+                        self.io.say(f"  (Requires completion of: {', '.join(self.quests[required].name for required in required_quests)})")
 
         if not available_quests and not completable_quests:
-            print(f"\n{npc['name']}: I have nothing for you at the moment.")
+            self.io.say(f"\n{npc.name}: I have nothing for you at the moment.")
 
-    def is_quest_completable(self, quest: str) -> bool:
+    def is_quest_completable(self, quest: int) -> bool:
         """Check if a quest is ready to be turned in"""
-        quest_data = self.quest_data[quest]
+        quest_data = self.quests[quest]
         current_progress = self.player.quest_progress.get(quest, 0)
         
-        if current_progress >= quest_data["progress_max"]:
+        if current_progress >= quest_data.progress_max:
             return all(item in self.player.inventory 
-                    for item in quest_data["items_needed"])
+                    for item in quest_data.items_needed)
         return False
 
-    def complete_quest(self, quest: str):
+    def complete_quest(self, quest: int):
         """Complete a quest and give rewards"""
-        quest_data = self.quest_data[quest]
+        quest_data = self.quests[quest]
         
         # Remove required items
-        for item in quest_data["items_needed"]:
+        for item in quest_data.items_needed:
             self.player.inventory.remove(item)
         
         # Give reward
-        if quest_data["reward"]:
-            self.player.inventory.append(quest_data["reward"])
-            print(f"\nQuest completed: {quest}")
-            print(f"Received reward: {quest_data['reward'].replace('_', ' ')}")
+        if quest_data.reward != NO_ID:
+            self.player.inventory.append(quest_data.reward)
+            self.io.say(f"\nQuest completed: {quest_data.name}")
+            self.io.say(f"Received reward: {self.items[quest_data.reward].name.replace('_', ' ')}")
         else:
-            print(f"\nQuest completed: {quest}")
+            self.io.say(f"\nQuest completed: {quest_data.name}")
         
         # Update quest lists
         self.player.active_quests.remove(quest)
         self.player.quests_completed.append(quest)
         
         # Notify about newly available quests
-        for potential_quest, potential_data in self.quest_data.items():
-            if (potential_quest not in self.player.active_quests and 
-                potential_quest not in self.player.quests_completed and
-                all(req in self.player.quests_completed for req in potential_data["requires"])):
-                print(f"\nNew quest available: {potential_quest}")
-                print("Talk to the appropriate NPC to accept this quest.")
-
-    def can_take_quest(self, quest: str) -> bool:
+        for potential_quest in self.quest_tracker.complete(quest):
+            self.io.say(f"\nNew quest available: {self.quests[potential_quest].name}")
+            self.io.say("Talk to the appropriate NPC to accept this quest.")
+
+    def can_take_quest(self, quest: int) -> bool:
         """Check if all prerequisites are met for taking a quest"""
-        required_quests = self.quest_data[quest]["requires"]
-        return all(req in self.player.quests_completed for req in required_quests)
+        return self.quest_tracker.is_unlocked(quest)
 
-    def handle_quest(self, quest: str):
+    def handle_quest(self, quest: int):
         """Add a new quest to the player's active quests"""
         if quest not in self.player.active_quests and quest not in self.player.quests_completed:
             self.player.active_quests.append(quest)
             self.player.quest_progress[quest] = 0
-            print(f"\nQuest accepted: {quest}")
-            
+            self.quest_tracker.accept(quest)
             # Display quest details
-            quest_data = self.quest_data[quest]
+            quest_data = self.quests[quest]
+            self.io.say(f"\nQuest accepted: {quest_data.name}")
             
-            print("\nQuest Requirements:")
-            if quest_data["enemy_kills"]:
-                print("Enemies to defeat:")
-                for enemy, count in quest_data["enemy_kills"].items():
-                    print(f"- {enemy}: {count}")
+            self.io.say("\nQuest Requirements:")
+            if quest_data.enemy_kills:
+                self.io.say("Enemies to defeat:")
+                for enemy, count in quest_data.enemy_kills:
+                    self.io.say(f"- {self.enemies[enemy].name}: {count}")
             
-            if quest_data["items_needed"]:
-                print("Items needed:")
-                for item in quest_data["items_needed"]:
-                    print(f"- {item.replace('_', ' ')}")
+            if quest_data.items_needed:
+                self.io.say("Items needed:")
+                for item in quest_data.items_needed:
+                    self.io.say(f"- {self.items[item].name.replace('_', ' ')}")
             
-            if quest_data["reward"]:
-                print(f"\nReward: {quest_data['reward'].replace('_', ' ')}")
+            if quest_data.reward != NO_ID:
+                self.io.say(f"\nReward: {self.items[quest_data.reward].name.replace('_', ' ')}")
         else:
-            print("\nYou already have this quest or have completed it.")
+            self.io.say("\nYou already have this quest or have completed it.")
 
-    def check_all_quests(self):
-        """Check if any active quests have been completed but not yet turned in"""
-        for quest in self.player.active_quests:
-            quest_data = self.quest_data[quest]
+    def check_all_quests(self, quests: Optional[List[int]] = None):
+        """Check if any active quests have been completed but not yet turned in.
+
+        Only the given quests are checked when quests is passed.
+        """
+        for quest in self.player.active_quests if quests is None else quests:
+            quest_data = self.quests[quest]
             current_progress = self.player.quest_progress.get(quest, 0)
             
             # Check if quest requirements are met
-            if current_progress >= quest_data["progress_max"]:
+            if current_progress >= quest_data.progress_max:
                 # Verify required items are in inventory
                 has_required_items = all(item in self.player.inventory 
-                                    for item in quest_data["items_needed"])
+                                    for item in quest_data.items_needed)
                 
                 if has_required_items:
-                    print(f"\nQuest requirements met for: {quest}")
-                    print("Return to the quest giver to complete the quest!")
-                    self.player.quest_progress[quest] = quest_data["progress_max"]  # Cap the progress
+                    self.io.say(f"\nQuest requirements met for: {quest_data.name}")
+                    self.io.say("Return to the quest giver to complete the quest!")
+                    self.player.quest_progress[quest] = quest_data.progress_max  # Cap the progress
 
-    def fight_skekso(self):
+    async def undo_turn(self):
+        """Go back to the start of the previous turn"""
+        if self.history.rewind(self, 1):
+            self.turns -= 1  # play_turn counts this turn, which should not count at all
+            self.io.say("\nYou rewind to the start of your previous turn.")
+        else:
+            self.io.say("\nThere is nothing to undo.")
+
+    async def offer_rewind(self) -> bool:
+        """After a death, offer to go back to the start of the fatal turn"""
+        if self.history is None or not self.history or self.player.health > 0:
+            return False
+        if (await self.io.ask("rewind", "\nRewind to the start of this turn? (y/n): ")).lower() != 'y':
+            return False
+        self.history.rewind(self)
+        self.io.say("\nTime flows backwards...")
+        return True
+
+    async def fight_skekso(self):
         self.fighting_skekso = True
-        self.combat("Emperor Skekso")
+        await self.combat(self.world.boss)
         self.fighting_skekso = False
 
     def check_game_over(self) -> bool:
         """Check if the game should end"""
         if self.player.health <= 0:
-            print("\nYou have fallen in battle... Game Over!")
+            self.io.say("\nYou have fallen in battle... Game Over!")
             return True
             
-        all_quests_completed = len(self.player.quests_completed) == len(self.quest_data)
+        all_quests_completed = len(self.player.quests_completed) == len(self.quests)
         
         if all_quests_completed:
             self.trigger_ending()
@@ -589,15 +1080,41 @@ class CrystalKingdoms:
         return False
 
     def trigger_ending(self):
-        print('\nwoohoo you did it')
+        self.io.say('\nwoohoo you did it')
 
-    def quit_game(self):
+    async def quit_game(self):
         """Handle game quit"""
-        if input("\nAre you sure you want to quit? (y/n): ").lower() == 'y':
-            print("\nThanks for playing The Crystal Kingdoms!")
+        if (await self.io.ask("quit", "\nAre you sure you want to quit? (y/n): ")).lower() == 'y':
+            self.io.say("\nThanks for playing The Crystal Kingdoms!")
             self.game_running = False
 
 # Start the game if this file is run directly
 if __name__ == "__main__":
-    game = CrystalKingdoms()
-    game.start_game()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Play The Crystal Kingdoms")
+    parser.add_argument("--delay", type=float, default=1.5, help="seconds to wait after each turn (0 for none)")
+    parser.add_argument("--undo", type=int, default=0, metavar="TURNS",
+                        help="keep this many turns of undo history (0 to disable)")
+    parser.add_argument("--record", metavar="FILE", help="save a session log for replay.py")
+    parser.add_argument("--seed", type=int, default=None, help="random seed (default: a random one)")
+    parser.add_argument("--pack", metavar="FILE", help="play the world in a JSON or TOML content pack")
+    args = parser.parse_args()
+    seed = random.getrandbits(64) if args.seed is None else args.seed
+    world = None
+    if args.pack:
+        from packs import load_pack
+        world = load_pack(args.pack)
+    game = CrystalKingdoms(rng=random.Random(seed), world=world,
+                           pacer=RealTimePacer(args.delay) if args.delay > 0 else TurboPacer(),
+                           undo_depth=args.undo)
+    if not args.record:
+        run_sync(game.start_game())
+    else:
+        from replay import RecordingIO, SessionLog, finish
+        log = SessionLog(seed, args.undo, pack=args.pack)
+        game.io = RecordingIO(game.io, log)
+        try:
+            run_sync(game.start_game())
+        finally:
+            finish(log, game)
+            log.save(args.record)
\ No newline at end of file
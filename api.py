@@ -0,0 +1,462 @@
+"""HTTP/JSON API for The Crystal Kingdoms.
+
+    POST   /games               {"name": ..., "char_class": ..., "seed": ...}  start a game
+    GET    /games/<id>          status, current prompt and whether the game is over
+    GET    /games/<id>/actions  the choices for the current prompt
+    POST   /games/<id>/actions  {"answer": "1"}  answer the prompt, get the messages it produced
+    DELETE /games/<id>          forget a game
+
+No game object outlives a request. A session is the game state at the start
+of the current turn, including the state of its random stream, plus the
+answers given since then. Each request rebuilds the game from that snapshot
+and replays the answers, which reproduces the turn exactly, until the game
+asks for something it has no answer for.
+
+Sessions are kept in an LRU. A session idle for longer than the TTL, or
+pushed out by newer ones, is written to a JSON file in the store directory
+and read back the next time it is used, so memory stays flat however many
+players have ever connected. Requests to one session run one at a time,
+under that session's lock; requests to different sessions run in parallel.
+
+Run `python api.py --port 8000 --store sessions`.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from AI_edited_rpg import Character, CrystalKingdoms, Inventory, QuestList, QuestProgress, QuestTracker, run_sync
+from headless import QuietGame
+from pacing import TurboPacer
+
+MAX_BODY = 64 * 1024
+COMBAT_OPTIONS = (("1", "Attack"), ("2", "Defend"), ("3", "Use Item"), ("4", "Flee"))
+YES_NO = (("y", "Yes"), ("n", "No"))
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class NeedInput(Exception):
+    """Raised out of the game when it asks a question nobody has answered yet"""
+    def __init__(self, kind: str, prompt: str):
+        super().__init__(kind)
+        self.kind = kind
+        self.prompt = prompt
+
+
+class ReplayIO:
+    """Answers prompts from a list and only keeps output the client has not seen"""
+    __slots__ = ("answers", "position", "messages")
+
+    def __init__(self, answers: List[str]):
+        self.answers = answers
+        self.position = 0
+        self.messages: List[str] = []
+
+    async def ask(self, kind: str, prompt: str) -> str:
+        if self.position == len(self.answers):
+            raise NeedInput(kind, prompt.strip())
+        self.position += 1
+        return self.answers[self.position - 1]
+
+    def say(self, text: str):
+        if self.position == len(self.answers):
+            self.messages.append(text.strip("\n"))
+
+
+def dump_game(game: CrystalKingdoms) -> Dict[str, Any]:
+    """The mutable state of a game as JSON-friendly data"""
+    player = game.player
+    version, internal, gauss = game.rng.getstate()
+    return {
+        "player": {
+            "name": player.name,
+            "char_class": player.char_class,
+            "health": player.health,
+            "max_health": player.max_health,
+            "strength": player.strength,
+            "agility": player.agility,
+            "magic": player.magic,
+            "inventory": list(player.inventory),
+            "current_location": player.current_location,
+            "story_choices": player.story_choices,
+            "quests_completed": list(player.quests_completed),
+            "active_quests": list(player.active_quests),
+            "quest_progress": list(player.quest_progress.items()),
+        },
+        "final": game.final,
+        "fighting_skekso": game.fighting_skekso,
+        "game_running": game.game_running,
+        "turns": game.turns,
+        "rng": [version, internal, gauss],
+    }
+
+
+def load_game(data: Dict[str, Any], io) -> QuietGame:
+    """Rebuild a game from dump_game() output"""
+    game = QuietGame(io=io, rng=random.Random(), pacer=TurboPacer(history=1))
+    version, internal, gauss = data["rng"]
+    game.rng.setstate((version, tuple(internal), gauss))
+    player = data["player"]
+    game.player = Character(
+        name=player["name"],
+        char_class=player["char_class"],
+        health=player["health"],
+        max_health=player["max_health"],
+        strength=player["strength"],
+        agility=player["agility"],
+        magic=player["magic"],
+        inventory=Inventory(player["inventory"]),
+        current_location=player["current_location"],
+        story_choices=list(player["story_choices"]),
+        quests_completed=QuestList(player["quests_completed"]),
+        active_quests=QuestList(player["active_quests"]),
+        quest_progress=QuestProgress(player["quest_progress"]),
+    )
+    game.quest_tracker = QuestTracker(game.world, game.player.quests_completed, game.player.active_quests)
+    game.final = data["final"]
+    game.fighting_skekso = data["fighting_skekso"]
+    game.game_running = data["game_running"]
+    game.turns = data["turns"]
+    return game
+
+
+def prompt_options(game: CrystalKingdoms, kind: str) -> List[Dict[str, str]]:
+    """The valid answers to a prompt of the given kind, as key/label pairs"""
+    cancel = [("0", "Cancel")]
+    if kind == "action":
+        options = game.renderer.actions(game.final, game.history is not None)
+    elif kind == "combat":
+        options = COMBAT_OPTIONS
+    elif kind == "class":
+        options = [(name, name.title()) for name in game.character_classes]
+    elif kind == "item":
+        options = cancel + [(str(i), game.renderer.item_title(item))
+                            for i, item in enumerate(game.player.inventory, 1)]
+    elif kind == "location":
+        exits = game.world.graph.exits(game.player.current_location)
+        options = cancel + [(str(i), game.renderer.location_title(location))
+                            for i, (location, _) in enumerate(exits, 1)]
+    elif kind == "npc":
+        npcs = game.locations[game.player.current_location].npcs
+        options = cancel + [(str(i), game.npcs[npc].name) for i, npc in enumerate(npcs, 1)]
+    elif kind in ("turn_in", "accept_quest", "quit", "throw_away", "rewind"):
+        options = YES_NO
+    else:
+        options = ()
+    return [{"key": key, "label": label} for key, label in options]
+
+
+class Session:
+    __slots__ = ("id", "snapshot", "answers", "over", "view", "last_used", "lock", "users")
+
+    def __init__(self, session_id: str, snapshot: Dict[str, Any], answers: List[str], over: bool = False):
+        self.id = session_id
+        self.snapshot = snapshot
+        self.answers = answers
+        self.over = over
+        self.view: Optional[Dict[str, Any]] = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()  # held while a request plays or changes the session
+        self.users = 0  # requests that checked the session out of the store
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"id": self.id, "snapshot": self.snapshot, "answers": self.answers, "over": self.over}
+
+
+class SessionStore:
+    """LRU of sessions in memory; evicted sessions are spilled to JSON files.
+
+    A request checks a session out and back in, and sweep() never spills a
+    checked-out session, so a session is never spilled between being fetched
+    and being changed. The store's own lock only guards the map and is never
+    held while a game plays; the API sweeps before each request.
+    """
+    def __init__(self, directory: str, capacity: int = 1000, ttl: float = 300.0):
+        self.directory = directory
+        self.capacity = capacity
+        self.ttl = ttl
+        self.spilled = 0
+        self.loaded = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, session: Session):
+        with self._lock:
+            self._sessions[session.id] = session
+
+    def check_out(self, session_id: str) -> Session:
+        """Return a session, reading it back from disk if it was evicted; KeyError if unknown.
+
+        The session stays in memory until it is checked back in.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                try:
+                    with open(self._path(session_id), encoding="utf-8") as file:
+                        data = json.load(file)
+                except FileNotFoundError:
+                    raise KeyError(session_id) from None
+                session = Session(data["id"], data["snapshot"], data["answers"], data["over"])
+                self._sessions[session_id] = session
+                self.loaded += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.users += 1
+            return session
+
+    def check_in(self, session: Session):
+        with self._lock:
+            session.users -= 1
+            session.last_used = time.monotonic()
+
+    def remove(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def sweep(self):
+        """Spill sessions past the TTL, then the least recently used ones over capacity"""
+        with self._lock:
+            expired = time.monotonic() - self.ttl
+            for session in list(self._sessions.values()):
+                if len(self._sessions) <= self.capacity and session.last_used > expired:
+                    break
+                if session.users:
+                    continue
+                self._spill(session)
+                del self._sessions[session.id]
+
+    def flush(self):
+        with self._lock:
+            for session in self._sessions.values():
+                self._spill(session)
+
+    def _spill(self, session: Session):
+        path = self._path(session.id)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(session.to_json(), file, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        self.spilled += 1
+
+
+class GameApi:
+    """The API operations, independent of HTTP"""
+    def __init__(self, store: SessionStore):
+        self.store = store
+
+    def create(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        name = str(body.get("name", "Adventurer"))
+        char_class = str(body.get("char_class", "")).lower()
+        seed = body.get("seed")
+        if seed is not None and not isinstance(seed, (int, float, str)):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "seed must be a number or a string")
+        io = ReplayIO([name, char_class])
+        game = QuietGame(io=io, rng=random.Random(seed), pacer=TurboPacer(history=1))
+        if char_class not in game.character_classes:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"char_class must be one of {', '.join(game.character_classes)}")
+        run_sync(game.create_character())
+        session = Session(secrets.token_hex(8), dump_game(game), [])
+        result = self._play(session, io.messages)
+        self.store.sweep()
+        self.store.add(session)
+        return result
+
+    def view(self, session_id: str) -> Dict[str, Any]:
+        with self._session(session_id) as session:
+            if session.view is None:
+                self._play(session)
+            return session.view
+
+    def actions(self, session_id: str) -> Dict[str, Any]:
+        prompt = self.view(session_id)["prompt"]
+        return {"kind": None, "text": None, "options": []} if prompt is None else prompt
+
+    def answer(self, session_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        answer = body.get("answer")
+        if not isinstance(answer, str):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Send the answer as a string, e.g. {\"answer\": \"1\"}")
+        with self._session(session_id) as session:
+            if session.over:
+                raise ApiError(HTTPStatus.CONFLICT, "This game is over")
+            saved = session.snapshot, session.answers, session.over
+            session.answers = session.answers + [answer]
+            try:
+                return self._play(session)
+            except Exception:
+                session.snapshot, session.answers, session.over = saved
+                raise
+
+    def delete(self, session_id: str) -> Dict[str, Any]:
+        with self._session(session_id):
+            self.store.remove(session_id)
+        return {"id": session_id, "deleted": True}
+
+    @contextmanager
+    def _session(self, session_id: str) -> Iterator[Session]:
+        """Check a session out of the store and hold its lock"""
+        self.store.sweep()
+        try:
+            session = self.store.check_out(session_id)
+        except KeyError:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No game {session_id}") from None
+        try:
+            with session.lock:
+                yield session
+        finally:
+            self.store.check_in(session)
+
+    def _play(self, session: Session, messages: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Replay the current turn and keep playing until the game needs input or ends"""
+        io = ReplayIO(session.answers)
+        game = load_game(session.snapshot, io)
+        need: Optional[NeedInput] = None
+        while not session.over:
+            try:
+                run_sync(game.play_turn())
+            except NeedInput as error:
+                need = error
+                break
+            session.over = not game.game_running or game.check_game_over()
+            session.snapshot = dump_game(game)
+            session.answers = io.answers = []
+            io.position = 0
+
+        session.view = {
+            "id": session.id,
+            "turns": game.turns,
+            "over": session.over,
+            "status": game.status_data(),
+            "prompt": None if need is None else {
+                "kind": need.kind, "text": need.prompt, "options": prompt_options(game, need.kind),
+            },
+        }
+        return dict(session.view, messages=(messages or []) + io.messages)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    api: GameApi
+    routes = (
+        ("POST", re.compile(r"^/games/?$"), "create", HTTPStatus.CREATED),
+        ("GET", re.compile(r"^/games/(?P<id>[0-9a-f]{16})/?$"), "view", HTTPStatus.OK),
+        ("DELETE", re.compile(r"^/games/(?P<id>[0-9a-f]{16})/?$"), "delete", HTTPStatus.OK),
+        ("GET", re.compile(r"^/games/(?P<id>[0-9a-f]{16})/actions/?$"), "actions", HTTPStatus.OK),
+        ("POST", re.compile(r"^/games/(?P<id>[0-9a-f]{16})/actions/?$"), "answer", HTTPStatus.OK),
+    )
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        try:
+            status, body = self._route(method)
+        except ApiError as error:
+            status, body = error.status, {"error": str(error)}
+        except Exception:
+            traceback.print_exc()
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal error"}
+        self._send(status, body)
+
+    def _route(self, method: str) -> Tuple[HTTPStatus, Dict[str, Any]]:
+        path = self.path.split("?", 1)[0]
+        known_path = False
+        for route_method, pattern, operation, status in self.routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            known_path = True
+            if route_method != method:
+                continue
+            args: Tuple = tuple(match.groupdict().values())
+            if method == "POST":
+                args += (self._read_json(),)
+            return status, getattr(self.api, operation)(*args)
+        if known_path:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported on {path}")
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No such endpoint {path}")
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be JSON") from None
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return body
+
+    def _send(self, status: HTTPStatus, body: Dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str, port: int, store: SessionStore) -> ThreadingHTTPServer:
+    handler = type("Handler", (ApiHandler,), {"api": GameApi(store)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve The Crystal Kingdoms as a JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--store", default="sessions", help="directory for sessions evicted from memory")
+    parser.add_argument("--capacity", type=int, default=1000, help="sessions kept in memory")
+    parser.add_argument("--ttl", type=float, default=300.0, help="seconds before an idle session is spilled")
+    args = parser.parse_args()
+
+    store = SessionStore(args.store, args.capacity, args.ttl)
+    server = make_server(args.host, args.port, store)
+
+    def sweep():
+        while True:
+            time.sleep(max(1.0, args.ttl / 4))
+            store.sweep()
+
+    threading.Thread(target=sweep, daemon=True).start()
+    print(f"Serving The Crystal Kingdoms API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.flush()
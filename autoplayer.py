@@ -0,0 +1,201 @@
+"""Monte Carlo tree search autoplayer for The Crystal Kingdoms.
+
+At every decision (main menu, combat option, which item, where to travel,
+which NPC to talk to) the planner runs a number of simulations on a private
+copy of the game and picks the answer it tried most often.
+
+The search is open loop: the tree is over sequences of answers, not game
+states. A simulation restores the snapshot taken at the start of the current
+turn, replays the answers already given this turn to get back to the
+decision, then reseeds the copy's random stream so the planner never sees the
+real game's upcoming rolls. From there it walks down the tree with UCT,
+expands one new answer and finishes with a random rollout of a few turns.
+
+Run `python autoplayer.py --games 5` for decisions per second and the win
+rate per class.
+"""
+import argparse
+import math
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from AI_edited_rpg import CrystalKingdoms, GameSnapshot
+from headless import PromptIO, QuietGame, RandomPolicy
+from pacing import TurboPacer
+
+DECISIONS = ("action", "combat", "item", "location", "npc")
+
+
+def decision_options(game: CrystalKingdoms, kind: str) -> List[str]:
+    """Sensible answers to a decision prompt (no cancelling, no quitting)"""
+    if kind == "action":
+        return list("123457" if game.final else "12345")
+    if kind == "combat":
+        return list("1234")
+    if kind == "item":
+        return [str(i) for i in range(1, len(game.player.inventory) + 1)]
+    if kind == "location":
+        return [str(i) for i in range(1, len(game.world.graph.exits(game.player.current_location)) + 1)]
+    if kind == "npc":
+        return [str(i) for i in range(1, len(game.locations[game.player.current_location].npcs) + 1)]
+    return []
+
+
+def evaluate(game: CrystalKingdoms, completed_before: int) -> float:
+    """Score a simulated position: quests done and under way, health, death and victory"""
+    player = game.player
+    if player.health <= 0:
+        return -3.0
+    progress_max = game.world.quest_progress_max
+    score = len(player.quests_completed) - completed_before
+    score += sum(0.1 + 0.5 * player.quest_progress.get(quest, 0) / max(1, progress_max[quest])
+                 for quest in player.active_quests)
+    score += 0.2 * player.health / player.max_health
+    if len(player.quests_completed) == len(game.quests):
+        score += 10.0
+    return score
+
+
+class Node:
+    __slots__ = ("visits", "value", "children")
+
+    def __init__(self):
+        self.visits = 0
+        self.value = 0.0
+        self.children: Dict[Tuple[str, str], "Node"] = {}
+
+
+class MctsPlayer:
+    """Chooses answers by simulating the game from the current turn"""
+    def __init__(self, simulations: int = 100, horizon: int = 8, exploration: float = 1.0,
+                 seed: Optional[int] = None):
+        self.simulations = simulations
+        self.horizon = horizon
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.rollout_policy = RandomPolicy(random.Random(self.rng.getrandbits(64)))
+        self.sim = QuietGame(io=PromptIO(), pacer=TurboPacer(history=1))
+        self.decisions = 0
+        self.thinking = 0.0
+
+    def choose(self, game: CrystalKingdoms, kind: str, turn_start: GameSnapshot, answers: Sequence[str]) -> str:
+        """Answer a decision prompt of the real game.
+
+        turn_start is the game's snapshot at the start of this turn and
+        answers everything answered since.
+        """
+        options = decision_options(game, kind)
+        if len(options) < 2:
+            return options[0] if options else "0"
+        start = time.perf_counter()
+        root = Node()
+        for _ in range(self.simulations):
+            self._simulate(root, turn_start, answers)
+        best = max(options, key=lambda option: root.children.get((kind, option), Node()).visits)
+        self.thinking += time.perf_counter() - start
+        self.decisions += 1
+        return best
+
+    def _simulate(self, root: Node, turn_start: GameSnapshot, answers: Sequence[str]):
+        sim = self.sim
+        sim.restore(turn_start)
+        completed_before = len(sim.player.quests_completed)
+        episode = sim.game_loop(sim.turns + self.horizon)
+        prompt = episode.send(None)
+        for answer in answers:
+            prompt = episode.send(answer)
+        sim.rng.seed(self.rng.getrandbits(64))
+
+        node: Optional[Node] = root
+        path = [root]
+        while True:
+            kind = prompt.kind
+            options = decision_options(sim, kind) if node is not None and kind in DECISIONS else None
+            if options:
+                answer, node, expanded = self._select(node, kind, options)
+                path.append(node)
+                if expanded:
+                    node = None
+            else:
+                answer = self.rollout_policy.choose(kind, prompt.text, sim)
+            try:
+                prompt = episode.send(answer)
+            except StopIteration:
+                break
+
+        value = evaluate(sim, completed_before)
+        for visited in path:
+            visited.visits += 1
+            visited.value += value
+
+    def _select(self, node: Node, kind: str, options: List[str]) -> Tuple[str, Node, bool]:
+        """UCT choice among options; returns (answer, child, whether the child is new)"""
+        untried = [option for option in options if (kind, option) not in node.children]
+        if untried:
+            option = self.rng.choice(untried)
+            child = node.children[(kind, option)] = Node()
+            return option, child, True
+        log_visits = math.log(node.visits)
+        best_score, best = -math.inf, options[0]
+        for option in options:
+            child = node.children[(kind, option)]
+            score = child.value / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best_score, best = score, option
+        return best, node.children[(kind, best)], False
+
+
+def play(planner: MctsPlayer, char_class: str, seed: Optional[int] = None, max_turns: int = 300) -> CrystalKingdoms:
+    """Play one game with the planner making every decision"""
+    game = QuietGame(io=PromptIO(), rng=random.Random(seed), pacer=TurboPacer(history=1))
+
+    async def run():
+        await game.create_character()
+        await game.game_loop(max_turns)
+
+    episode = run()
+    prompt = episode.send(None)
+    turn_start: Optional[GameSnapshot] = None
+    answers: List[str] = []
+    while True:
+        if prompt.kind == "name":
+            answer = "Planner"
+        elif prompt.kind == "class":
+            answer = char_class
+        else:
+            if prompt.kind == "action":
+                turn_start = game.snapshot()
+                answers = []
+            if prompt.kind in DECISIONS:
+                answer = planner.choose(game, prompt.kind, turn_start, answers)
+            else:
+                answer = planner.rollout_policy.choose(prompt.kind, prompt.text, game)
+            answers.append(answer)
+        try:
+            prompt = episode.send(answer)
+        except StopIteration:
+            return game
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play The Crystal Kingdoms with Monte Carlo tree search")
+    parser.add_argument("--games", type=int, default=5, help="games per class")
+    parser.add_argument("--simulations", type=int, default=100, help="simulations per decision")
+    parser.add_argument("--horizon", type=int, default=8, help="turns simulated ahead")
+    parser.add_argument("--max-turns", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for char_class in CrystalKingdoms(io=PromptIO()).character_classes:
+        planner = MctsPlayer(args.simulations, args.horizon, seed=args.seed)
+        wins = deaths = quests = 0
+        for index in range(args.games):
+            game = play(planner, char_class, seed=args.seed * 1000 + index, max_turns=args.max_turns)
+            wins += len(game.player.quests_completed) == len(game.quests)
+            deaths += game.player.health <= 0
+            quests += len(game.player.quests_completed)
+        print(f"{char_class:8} win rate {wins / args.games:.0%}  deaths {deaths}/{args.games}  "
+              f"mean quests {quests / args.games:.2f}  "
+              f"{planner.decisions / planner.thinking:.1f} decisions/s "
+              f"({planner.simulations * planner.decisions / planner.thinking:.0f} simulations/s)")
@@ -0,0 +1,106 @@
+"""Parallel batch playthroughs of The Crystal Kingdoms.
+
+Every game gets its own seed derived from a master seed and its index, and
+that seed drives both the game's random.Random stream and the player policy.
+Games are spread over a process pool and their results come back in chunks,
+so any single game can later be replayed from its seed alone.
+
+Run `python batch_runner.py --games 10000 --seed 42` for a batch, or
+`python batch_runner.py --replay <seed>` to replay one game. With --pack the
+games are played on a content pack; workers load it from the pack cache,
+which the parent fills before the pool starts.
+"""
+import argparse
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence
+
+from content import CompiledWorld
+from headless import RandomPolicy, play
+from packs import load_pack
+
+
+@dataclass
+class GameResult:
+    seed: int
+    char_class: str
+    turns: int
+    died: bool
+    quests_completed: List[str]
+    inventory: List[str]
+
+
+def game_seed(master_seed: int, index: int) -> int:
+    """Seed for game `index` of a batch, independent of how the batch is split up"""
+    digest = hashlib.blake2b(f"{master_seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def play_seeded(seed: int, max_turns: int = 1000, char_class: Optional[str] = None,
+                world: Optional[CompiledWorld] = None) -> GameResult:
+    """Play (or replay) the game identified by seed"""
+    policy = RandomPolicy(random.Random(f"policy:{seed}"), char_class)
+    game = play(policy, max_turns=max_turns, rng=random.Random(seed), world=world)
+    return GameResult(
+        seed=seed,
+        char_class=game.player.char_class,
+        turns=game.turns,
+        died=game.player.health <= 0,
+        quests_completed=[game.quests[quest].name for quest in game.player.quests_completed],
+        inventory=[game.items[item].name for item in game.player.inventory],
+    )
+
+
+def _play_chunk(seeds: Sequence[int], max_turns: int, char_class: Optional[str],
+                pack: Optional[str]) -> List[GameResult]:
+    world = load_pack(pack) if pack else None
+    return [play_seeded(seed, max_turns, char_class, world) for seed in seeds]
+
+
+def run_batch(games: int, master_seed: int = 0, workers: Optional[int] = None, chunk_size: int = 100,
+              max_turns: int = 1000, char_class: Optional[str] = None,
+              pack: Optional[str] = None) -> Iterator[List[GameResult]]:
+    """Play `games` games over a process pool, yielding results a chunk at a time"""
+    if pack:
+        load_pack(pack)  # compile and cache it once here rather than in every worker
+    chunks = [
+        [game_seed(master_seed, index) for index in range(start, min(start + chunk_size, games))]
+        for start in range(0, games, chunk_size)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_play_chunk, chunk, max_turns, char_class, pack) for chunk in chunks]
+        for future in futures:
+            yield future.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run seeded Crystal Kingdoms games in parallel")
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0, help="master seed for the batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--char-class", default=None)
+    parser.add_argument("--pack", metavar="FILE", help="play on a JSON or TOML content pack")
+    parser.add_argument("--replay", type=int, default=None, metavar="GAME_SEED",
+                        help="replay a single game from its seed and print its result")
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        print(play_seeded(args.replay, args.max_turns, args.char_class, load_pack(args.pack) if args.pack else None))
+    else:
+        start = time.perf_counter()
+        played = deaths = turns = quests = 0
+        for results in run_batch(args.games, args.seed, args.workers, args.chunk_size,
+                                 args.max_turns, args.char_class, args.pack):
+            played += len(results)
+            deaths += sum(result.died for result in results)
+            turns += sum(result.turns for result in results)
+            quests += sum(len(result.quests_completed) for result in results)
+        elapsed = time.perf_counter() - start
+        print(f"{played} games on {args.workers} workers in {elapsed:.2f}s ({played / elapsed:.1f} games/s)")
+        print(f"Deaths: {deaths}  Mean turns: {turns / played:.1f}  Mean quests completed: {quests / played:.2f}")
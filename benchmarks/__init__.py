@@ -0,0 +1 @@
+"""Benchmarks for The Crystal Kingdoms. Run them with `python -m benchmarks.<name>`."""
@@ -0,0 +1,76 @@
+"""Game construction time and memory per session.
+
+Compares building every session its own world tables, as CrystalKingdoms
+used to, with sharing the frozen world tables between sessions.
+
+Run `python -m benchmarks.construction --sessions 10000`.
+"""
+import argparse
+import copy
+import time
+from types import MappingProxyType
+from typing import Set
+
+import AI_edited_rpg
+from AI_edited_rpg import CrystalKingdoms
+from memory_report import deep_getsizeof
+
+
+def thaw(value):
+    """Mutable deep copy of frozen world content"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return copy.copy(value)
+
+
+class QuestIndex:
+    """Quest lookups as plain dicts, as every session built them before the world was shared"""
+    def __init__(self, quest_data):
+        self.order = {}
+        self.by_enemy = {}
+        self.by_item = {}
+        self.dependents = {}
+        self.requires_count = {}
+        for position, (quest, data) in enumerate(quest_data.items()):
+            self.order[quest] = position
+            for enemy in data["enemy_kills"]:
+                self.by_enemy.setdefault(enemy, []).append(quest)
+            for item in dict.fromkeys(data["items_needed"]):
+                self.by_item.setdefault(item, []).append(quest)
+            requires = set(data["requires"])
+            for required in requires:
+                self.dependents.setdefault(required, []).append(quest)
+            self.requires_count[quest] = len(requires)
+
+
+class PerSessionTables(CrystalKingdoms):
+    """CrystalKingdoms with its own copy of every world table, like before they were shared"""
+    def __init__(self):
+        super().__init__()
+        self.character_classes = thaw(AI_edited_rpg.CHARACTER_CLASSES)
+        self.items = thaw(AI_edited_rpg.ITEMS)
+        self.locations = thaw(AI_edited_rpg.LOCATIONS)
+        self.enemies = thaw(AI_edited_rpg.ENEMIES)
+        self.quest_data = thaw(AI_edited_rpg.QUEST_DATA)
+        self.quest_index = QuestIndex(self.quest_data)
+
+
+def measure(factory, sessions: int):
+    start = time.perf_counter()
+    games = [factory() for _ in range(sessions)]
+    elapsed = time.perf_counter() - start
+    seen: Set[int] = set()
+    total = sum(deep_getsizeof(game, seen) for game in games)
+    return elapsed / sessions, total / sessions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure game construction cost")
+    parser.add_argument("--sessions", type=int, default=10_000)
+    args = parser.parse_args()
+
+    for label, factory in (("per-session tables", PerSessionTables), ("shared tables", CrystalKingdoms)):
+        seconds, size = measure(factory, args.sessions)
+        print(f"{label:>20}: {seconds * 1e6:8.2f} us per instance, {size:10,.0f} bytes per session")
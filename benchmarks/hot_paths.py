@@ -0,0 +1,277 @@
+"""Hot path benchmarks across content sizes.
+
+Times the status screen, a whole fight, quest checks, turning in a quest,
+talking to an NPC, next-hop route lookups, loot table draws and headless
+playthroughs on synthetic worlds of 10 to 10,000 quests, locations and
+items (see benchmarks/synthetic.py). Every measurement is the median of
+repeated calls, with the game restored from a snapshot before each call and
+the restore left out of the timing. Calls that take well under a
+microsecond are timed in batches, since the clock cannot time one alone.
+
+For each benchmark the scaling exponent between the smallest and largest
+world is reported: 0 means the cost does not depend on content size, 1 means
+it grows linearly. Benchmarks whose cost should not depend on content size
+are flagged when the exponent exceeds --max-exponent.
+
+Results can be written as JSON (--output) and appended to a JSON-lines
+history (--history); each run is compared with the previous history entry
+or with --compare FILE, and timings more than --threshold times slower are
+reported as regressions. --check exits with status 1 on any regression.
+
+Run `python -m benchmarks.hot_paths --history bench_history.jsonl`.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from AI_edited_rpg import CrystalKingdoms, run_sync
+from benchmarks.synthetic import loaded_game, synthetic_world
+from content import CompiledWorld
+from headless import HeadlessIO, RandomPolicy
+from pacing import TurboPacer
+from sampling import AliasTable
+
+SIZES = (10, 100, 1000, 10_000)
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Builds the timed call and the setup run before each call
+    prepare: Callable[[CompiledWorld], "Timed"]
+    # Whether the cost is expected to grow with content size
+    scales: bool
+
+
+class Timed(NamedTuple):
+    run: Callable[[], Optional[int]]  # may return how many units (turns) one call covered
+    setup: Callable[[], None]
+    batch: int = 1  # calls per sample, for calls too fast to time one by one; setup runs once per batch
+
+
+class AnswerAll:
+    """Policy giving the same answer to every prompt of a kind"""
+    def __init__(self, answers: Dict[str, str]):
+        self.answers = answers
+
+    def choose(self, kind: str, prompt: str, game: CrystalKingdoms) -> str:
+        return self.answers[kind]
+
+
+def _resetting(game: CrystalKingdoms) -> Callable[[], None]:
+    snapshot = game.snapshot()
+    return lambda: game.restore(snapshot)
+
+
+def show_status(world: CompiledWorld) -> Timed:
+    game = loaded_game(world)
+    return Timed(game.show_status, lambda: None)
+
+
+def combat(world: CompiledWorld) -> Timed:
+    io = HeadlessIO(AnswerAll({"combat": "1"}))
+    game = loaded_game(world, io=io)
+    io.game = game
+    enemy = world.quests[0].enemy_kills[0][0]
+    return Timed(lambda: run_sync(game.combat(enemy)), _resetting(game))
+
+
+def check_all_quests(world: CompiledWorld) -> Timed:
+    game = loaded_game(world)
+    return Timed(game.check_all_quests, lambda: None)
+
+
+def complete_quest(world: CompiledWorld) -> Timed:
+    game = loaded_game(world)
+    return Timed(lambda: game.complete_quest(0), _resetting(game))
+
+
+def npc_interaction(world: CompiledWorld) -> Timed:
+    io = HeadlessIO(AnswerAll({"turn_in": "y", "accept_quest": "y"}))
+    game = loaded_game(world, io=io)
+    io.game = game
+    npc = world.npcs[world.locations[0].npcs[0]]
+    return Timed(lambda: run_sync(game.handle_npc_interaction(npc)), _resetting(game))
+
+
+def next_hop(world: CompiledWorld) -> Timed:
+    """The first hop towards the last location, once its route table is built"""
+    graph = world.graph
+    destination = len(world.locations) - 1
+    graph.next_hop(0, destination)
+
+    def run():
+        graph.next_hop(0, destination)  # returns a location, not a count of units
+    return Timed(run, lambda: None, batch=1000)
+
+
+def loot_draw(world: CompiledWorld) -> Timed:
+    """One draw from a loot table weighting every item of the world"""
+    table = AliasTable.build([1 + item % 10 for item in range(len(world.items))])
+    rng = random.Random(0)
+
+    def run():
+        table.sample(rng)  # returns an item, not a count of units
+    return Timed(run, lambda: None, batch=1000)
+
+
+def playthrough(world: CompiledWorld, max_turns: int = 100) -> Timed:
+    """A random 100-turn game; timed per turn, without building the game"""
+    rng = random.Random(0)
+    state = {}
+
+    def setup():
+        io = HeadlessIO(RandomPolicy(random.Random(rng.getrandbits(32))))
+        game = CrystalKingdoms(io=io, rng=random.Random(rng.getrandbits(32)), world=world,
+                               pacer=TurboPacer(history=1))
+        io.game = game
+        run_sync(game.create_character())
+        state["game"] = game
+
+    def run():
+        game = state["game"]
+        run_sync(game.game_loop(max_turns))
+        return max(1, game.turns)
+    return Timed(run, setup)
+
+
+BENCHMARKS = (
+    Benchmark("show_status", show_status, scales=True),
+    Benchmark("combat", combat, scales=False),
+    Benchmark("check_all_quests", check_all_quests, scales=True),
+    Benchmark("complete_quest", complete_quest, scales=False),
+    Benchmark("npc_interaction", npc_interaction, scales=False),
+    Benchmark("next_hop", next_hop, scales=False),
+    Benchmark("loot_draw", loot_draw, scales=False),
+    Benchmark("playthrough_turn", playthrough, scales=False),
+)
+
+
+def measure(timed: Timed, min_time: float = 0.2, max_calls: int = 10_000) -> float:
+    """Median microseconds per call (per unit, if run() returns a count)"""
+    samples: List[float] = []
+    spent = 0.0
+    calls = range(timed.batch)
+    while spent < min_time and len(samples) < max_calls or len(samples) < 5:
+        timed.setup()
+        start = time.perf_counter()
+        for _ in calls:
+            units = timed.run()
+        elapsed = time.perf_counter() - start
+        spent += elapsed
+        samples.append(elapsed / timed.batch / (units or 1))
+    return statistics.median(samples) * 1e6
+
+
+def exponent(results: Dict[str, float]) -> float:
+    """Scaling exponent of cost against content size between the smallest and largest size"""
+    sizes = sorted(results, key=int)
+    first, last = sizes[0], sizes[-1]
+    if first == last or results[first] <= 0:
+        return 0.0
+    return math.log(results[last] / results[first]) / math.log(int(last) / int(first))
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: Sequence[int] = SIZES, names: Optional[Sequence[str]] = None,
+              min_time: float = 0.2) -> dict:
+    benchmarks = [benchmark for benchmark in BENCHMARKS if names is None or benchmark.name in names]
+    results: Dict[str, Dict[str, float]] = {benchmark.name: {} for benchmark in benchmarks}
+    for size in sizes:
+        world = synthetic_world(size)
+        for benchmark in benchmarks:
+            results[benchmark.name][str(size)] = measure(benchmark.prepare(world), min_time)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "microseconds",
+        "results": results,
+        "exponents": {name: exponent(timings) for name, timings in results.items()},
+    }
+
+
+def regressions(current: dict, baseline: dict, threshold: float) -> List[str]:
+    found = []
+    for name, timings in current["results"].items():
+        for size, value in timings.items():
+            before = baseline.get("results", {}).get(name, {}).get(size)
+            if before and value / before > threshold:
+                found.append(f"{name} at size {size}: {before:.2f}us -> {value:.2f}us ({value / before:.2f}x)")
+    return found
+
+
+def report(current: dict, baseline: Optional[dict], max_exponent: float):
+    sizes = sorted({size for timings in current["results"].values() for size in timings}, key=int)
+    print(f"{'benchmark (us)':18}" + "".join(f"{size:>11}" for size in sizes) + "   exponent")
+    scales = {benchmark.name: benchmark.scales for benchmark in BENCHMARKS}
+    for name, timings in current["results"].items():
+        row = "".join(f"{timings.get(size, float('nan')):11.2f}" for size in sizes)
+        value = current["exponents"][name]
+        flag = "  grows with content size" if not scales[name] and value > max_exponent else ""
+        print(f"{name:18}{row}   {value:8.2f}{flag}")
+    if baseline is not None:
+        print(f"\nCompared with {baseline.get('commit') or 'baseline'} from {baseline.get('timestamp')}:")
+        for name, timings in current["results"].items():
+            before = baseline.get("results", {}).get(name, {})
+            ratios = "".join(f"{timings[size] / before[size]:10.2f}x" if before.get(size) else f"{'-':>11}"
+                             for size in sizes if size in timings)
+            print(f"{name:18}{ratios}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hot paths across content sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--only", nargs="+", choices=[benchmark.name for benchmark in BENCHMARKS])
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent on each measurement")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--history", metavar="FILE", help="JSON-lines history to compare with and append to")
+    parser.add_argument("--compare", metavar="FILE", help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown counted as a regression")
+    parser.add_argument("--max-exponent", type=float, default=0.25,
+                        help="flag size-independent benchmarks that scale worse than this")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    elif args.history:
+        try:
+            with open(args.history) as file:
+                lines = [line for line in file if line.strip()]
+            baseline = json.loads(lines[-1]) if lines else None
+        except FileNotFoundError:
+            pass
+
+    current = run_suite(args.sizes, args.only, args.min_time)
+    report(current, baseline, args.max_exponent)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+    if args.history:
+        with open(args.history, "a") as file:
+            file.write(json.dumps(current) + "\n")
+
+    found = regressions(current, baseline, args.threshold) if baseline else []
+    if found:
+        print(f"\n{len(found)} regressions (more than {args.threshold}x slower):")
+        for line in found:
+            print(f"  {line}")
+    if args.check and found:
+        sys.exit(1)
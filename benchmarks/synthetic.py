@@ -0,0 +1,46 @@
+"""Synthetic worlds and game states of any size, for benchmarks.
+
+synthetic_world(size) is a worldgen.py world with `size` quests, locations
+and items and size // 10 enemies. Even-numbered quests have no prerequisite
+and each odd-numbered one requires the quest before it. Location i has one
+NPC, giving quest i.
+
+loaded_game(world) is a game in progress on such a world: the player holds
+one of each item (or the first `inventory` items) and has every quest
+without prerequisites active, with full progress and the items they need,
+so quest checks do their full work.
+"""
+import random
+from typing import Optional
+
+from AI_edited_rpg import CrystalKingdoms, Character, Inventory, QuestList, QuestProgress
+from content import CompiledWorld
+from headless import PromptIO
+from pacing import TurboPacer
+from worldgen import generate_world
+
+
+def synthetic_world(size: int, seed: int = 0) -> CompiledWorld:
+    return generate_world(seed, quests=size, locations=size, npcs_per_location=1, enemies=max(2, size // 10),
+                          items=size, chain_length=2, cross_links=0)
+
+
+def loaded_game(world: CompiledWorld, inventory: Optional[int] = None, io=None) -> CrystalKingdoms:
+    """A game on world whose player is in the middle of every quest without prerequisites"""
+    game = CrystalKingdoms(io=io or PromptIO(), rng=random.Random(0), world=world, pacer=TurboPacer(history=1))
+    stats = world.character_classes["warrior"]
+    held = list(range(len(world.items) if inventory is None else min(inventory, len(world.items))))
+    game.player = Character(
+        name="Bench", char_class="warrior", health=stats["health"], max_health=stats["health"],
+        strength=stats["strength"], agility=stats["agility"], magic=stats["magic"],
+        inventory=Inventory(held), current_location=world.start_location, story_choices=[],
+        quests_completed=QuestList(), active_quests=QuestList(), quest_progress=QuestProgress(),
+    )
+    progress_max = world.quest_progress_max
+    for quest_id, quest in enumerate(world.quests):
+        if not quest.requires:
+            game.handle_quest(quest_id)
+            game.player.quest_progress[quest_id] = progress_max[quest_id]
+            for item in quest.items_needed:
+                game.player.inventory.append(item)
+    return game
@@ -0,0 +1,184 @@
+"""Vectorized Monte Carlo combat for The Crystal Kingdoms.
+
+Resolves many independent fights at once with NumPy. Each round follows the
+same rules as `CrystalKingdoms.do_combat_action`:
+
+- attack: the enemy loses `strength + randint(1, 6)` health
+- defend: the player heals `randint(5, 10)`, capped at max health
+- flee: succeeds with probability `agility * 0.1` and ends the fight
+- enemy turn, if the enemy is still alive: the player loses
+  `max(0, enemy strength - randint(0, 3))` health
+
+Run `python combat_sim.py warrior "Dark Knight"` to compare against the
+scalar engine.
+"""
+import argparse
+import random
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from AI_edited_rpg import CrystalKingdoms, run_sync
+from headless import new_game
+
+WIN, LOSS, FLED, UNFINISHED = 0, 1, 2, 3
+ATTACK, DEFEND, FLEE = 0, 1, 2
+
+
+def player_stats(game: CrystalKingdoms, char_class: str, items: Iterable[str] = ()) -> Dict[str, int]:
+    """Stat block for a fresh character of char_class after using the given items"""
+    base = game.character_classes[char_class]
+    stats = {"health": base["health"], "max_health": base["health"],
+             "strength": base["strength"], "agility": base["agility"], "magic": base["magic"]}
+    for item in items:
+        item_data = game.items[game.world.item_ids[item]]
+        if item_data.effect == "strength_boost":
+            stats["strength"] += item_data.value
+        elif item_data.effect == "magic_boost":
+            stats["magic"] += item_data.value
+    return stats
+
+
+def enemy_stats(game: CrystalKingdoms, enemy: str) -> Dict[str, int]:
+    """Stat block for the named enemy"""
+    return game.enemies[game.world.enemy_ids[enemy]]._asdict()
+
+
+@dataclass
+class FightResults:
+    outcome: np.ndarray
+    turns: np.ndarray
+    remaining_health: np.ndarray
+
+    @property
+    def fights(self) -> int:
+        return len(self.outcome)
+
+    def rate(self, outcome: int) -> float:
+        return float(np.mean(self.outcome == outcome))
+
+    @property
+    def win_rate(self) -> float:
+        return self.rate(WIN)
+
+    def turns_to_kill(self) -> Dict[int, int]:
+        """Histogram of rounds taken in won fights"""
+        counts = np.bincount(self.turns[self.outcome == WIN])
+        return {turns: int(count) for turns, count in enumerate(counts) if count}
+
+    def summary(self) -> str:
+        won = self.outcome == WIN
+        lines = [
+            f"Fights: {self.fights}",
+            f"Win: {self.rate(WIN):.4f}  Loss: {self.rate(LOSS):.4f}  "
+            f"Fled: {self.rate(FLED):.4f}  Unfinished: {self.rate(UNFINISHED):.4f}",
+        ]
+        if won.any():
+            lines.append(f"Mean turns to kill: {self.turns[won].mean():.3f}")
+            lines.append(f"Mean health left after a win: {self.remaining_health[won].mean():.3f}")
+        return "\n".join(lines)
+
+
+def simulate(player: Dict[str, int], enemy: Dict[str, int], fights: int = 100_000,
+             strategy: Sequence[float] = (1.0, 0.0, 0.0), max_rounds: int = 10_000,
+             seed: Optional[int] = None) -> FightResults:
+    """Resolve `fights` independent fights between player and enemy.
+
+    strategy gives the probability of attacking, defending and fleeing each
+    round. Fights still going after max_rounds are marked UNFINISHED.
+    """
+    rng = np.random.default_rng(seed)
+    strategy = np.asarray(strategy, dtype=float)
+    strategy = strategy / strategy.sum()
+
+    health = np.full(fights, player["health"], dtype=np.int64)
+    enemy_health = np.full(fights, enemy["health"], dtype=np.int64)
+    turns = np.zeros(fights, dtype=np.int64)
+    outcome = np.full(fights, UNFINISHED, dtype=np.int8)
+    active = np.arange(fights)
+
+    for _ in range(max_rounds):
+        if not active.size:
+            break
+        count = active.size
+        action = rng.choice(3, size=count, p=strategy)
+        hp = health[active]
+        enemy_hp = enemy_health[active]
+
+        attacking = action == ATTACK
+        enemy_hp[attacking] -= player["strength"] + rng.integers(1, 7, size=int(attacking.sum()))
+        defending = action == DEFEND
+        hp[defending] = np.minimum(player["max_health"],
+                                   hp[defending] + rng.integers(5, 11, size=int(defending.sum())))
+        fled = (action == FLEE) & (rng.random(count) < player["agility"] * 0.1)
+
+        enemy_turn = ~fled & (enemy_hp > 0)
+        damage = np.maximum(0, enemy["strength"] - rng.integers(0, 4, size=int(enemy_turn.sum())))
+        hp[enemy_turn] -= damage
+
+        health[active] = hp
+        enemy_health[active] = enemy_hp
+        turns[active] += 1
+        outcome[active[enemy_hp <= 0]] = WIN
+        outcome[active[fled]] = FLED
+        outcome[active[(hp <= 0) & (enemy_hp > 0)]] = LOSS
+        active = active[~fled & (enemy_hp > 0) & (hp > 0)]
+
+    return FightResults(outcome=outcome, turns=turns, remaining_health=np.maximum(health, 0))
+
+
+class _CombatPolicy:
+    """Drives the scalar engine with the same random strategy as simulate()"""
+    def __init__(self, rng: random.Random, strategy: Sequence[float]):
+        self.rng = rng
+        self.strategy = strategy
+
+    def choose(self, kind: str, prompt: str, game: CrystalKingdoms) -> str:
+        if kind == "name":
+            return "Bot"
+        if kind == "class":
+            return "warrior"
+        return self.rng.choices(("1", "2", "4"), weights=self.strategy)[0]
+
+
+def simulate_scalar(player: Dict[str, int], enemy_name: str, fights: int = 10_000,
+                    strategy: Sequence[float] = (1.0, 0.0, 0.0), seed: Optional[int] = None) -> Dict[int, float]:
+    """Run the same fights round by round through CrystalKingdoms.do_combat_action"""
+    game = new_game(_CombatPolicy(random.Random(seed), strategy), rng=random.Random(seed))
+    run_sync(game.create_character())
+    counts = {WIN: 0, LOSS: 0, FLED: 0}
+    for _ in range(fights):
+        for stat, value in player.items():
+            setattr(game.player, stat, value)
+        enemy = enemy_stats(game, enemy_name)
+        enemy["current_health"] = enemy["health"]
+        fled = False
+        while enemy["current_health"] > 0 and game.player.health > 0 and not fled:
+            fled = run_sync(game.do_combat_action(enemy))
+        if fled:
+            counts[FLED] += 1
+        elif enemy["current_health"] <= 0:
+            counts[WIN] += 1
+        else:
+            counts[LOSS] += 1
+    return {outcome: count / fights for outcome, count in counts.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized combat simulation")
+    parser.add_argument("char_class")
+    parser.add_argument("enemy")
+    parser.add_argument("--items", nargs="*", default=[])
+    parser.add_argument("--fights", type=int, default=100_000)
+    parser.add_argument("--strategy", type=float, nargs=3, default=(1.0, 0.0, 0.0),
+                        metavar=("ATTACK", "DEFEND", "FLEE"))
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    world = CrystalKingdoms()
+    stats = player_stats(world, args.char_class, args.items)
+    results = simulate(stats, enemy_stats(world, args.enemy), args.fights, args.strategy, seed=args.seed)
+    print(results.summary())
+    scalar = simulate_scalar(stats, args.enemy, min(args.fights, 10_000), args.strategy, seed=args.seed)
+    print(f"Scalar engine: Win: {scalar[WIN]:.4f}  Loss: {scalar[LOSS]:.4f}  Fled: {scalar[FLED]:.4f}")
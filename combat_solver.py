@@ -0,0 +1,195 @@
+"""Exact combat outcomes for The Crystal Kingdoms.
+
+A fight is a Markov chain over (player health, enemy health). Every round the
+player attacks, defends or flees with fixed probabilities (the same strategy
+vector as `combat_sim.simulate`), then the enemy strikes back if it is still
+alive. This module solves the chain instead of sampling it, giving win, loss
+and flee probabilities plus expected health lost and expected rounds.
+
+Enemy health never goes up, so the states are solved one enemy-health layer
+at a time. Defending and failed flee attempts stay in the same layer; those
+transitions depend only on player health, so their linear system is solved
+once per player/enemy/strategy and reused for every layer. Solved layers are
+cached and shared by all later queries with the same parameters, whatever
+the starting health.
+
+Run `python combat_solver.py warrior "Emperor SkekSo"` for an example.
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from AI_edited_rpg import CrystalKingdoms
+from combat_sim import enemy_stats, player_stats
+
+# Columns of a value vector
+WIN, LOSS, FLED, HEALTH, ROUNDS = range(5)
+
+ATTACK_ROLLS = range(1, 7)
+DEFEND_ROLLS = range(5, 11)
+ENEMY_ROLLS = range(0, 4)
+
+
+@dataclass(frozen=True)
+class CombatOutcome:
+    win: float
+    loss: float
+    fled: float
+    expected_health_lost: float
+    expected_rounds: float
+
+
+class _Table:
+    """Solved layers for one set of fight parameters"""
+    def __init__(self, max_health: int, strength: int, agility: int, enemy_strength: int,
+                 strategy: Tuple[float, float, float]):
+        self.max_health = max_health
+        self.strength = strength
+        self.attack, self.defend, self.flee = strategy
+        self.flee_chance = min(1.0, max(0.0, agility * 0.1))
+        self.damage = [max(0, enemy_strength - roll) for roll in ENEMY_ROLLS]
+        if self.attack <= 0 and self.flee * self.flee_chance <= 0:
+            raise ValueError("The fight can never end: the strategy neither attacks nor can flee")
+
+        health = np.arange(max_health + 1)
+        self.win = np.zeros((max_health + 1, 5))
+        self.win[:, WIN] = 1
+        self.win[:, HEALTH] = health
+        self.fled = np.zeros((max_health + 1, 5))
+        self.fled[:, FLED] = 1
+        self.fled[:, HEALTH] = health
+        self.loss = np.zeros(5)
+        self.loss[LOSS] = 1
+
+        # Index of the state reached after each enemy hit, 0 meaning death
+        self.hit = np.array([np.maximum(health - damage, 0) for damage in self.damage])
+        self.constant, self.solver = self._same_layer()
+        # values[e] and after_hit[e] cover enemy health e; index 0 is unused
+        self.values: List[Optional[np.ndarray]] = [None]
+        self.after_hit: List[Optional[np.ndarray]] = [None]
+
+    def _same_layer(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Transitions that keep the enemy's health unchanged.
+
+        Returns the constant part they contribute (deaths) and the matrix
+        inv(I - M) that solves a layer, or None when the layer is trivial.
+        """
+        size = self.max_health + 1
+        moves = np.zeros((size, size))
+        defend = self.defend / (len(DEFEND_ROLLS) * len(ENEMY_ROLLS))
+        stay = self.flee * (1 - self.flee_chance) / len(ENEMY_ROLLS)
+        for health in range(1, size):
+            for damage in self.damage:
+                if defend:
+                    for heal in DEFEND_ROLLS:
+                        moves[health, max(min(self.max_health, health + heal) - damage, 0)] += defend
+                if stay:
+                    moves[health, max(health - damage, 0)] += stay
+        constant = np.outer(moves[:, 0], self.loss)
+        moves = moves[1:, 1:]
+        if not moves.any():
+            return constant, None
+        return constant, np.linalg.inv(np.eye(size - 1) - moves)
+
+    def layer(self, enemy_health: int) -> np.ndarray:
+        """Value vectors for every player health at this enemy health"""
+        for current in range(len(self.values), enemy_health + 1):
+            self._solve(current)
+        return self.values[enemy_health]
+
+    def _solve(self, enemy_health: int):
+        attack = np.zeros((self.max_health + 1, 5))
+        for roll in ATTACK_ROLLS:
+            left = enemy_health - self.strength - roll
+            attack += self.win if left <= 0 else self.after_hit[left]
+        known = self.attack * attack / len(ATTACK_ROLLS)
+        known += self.flee * self.flee_chance * self.fled
+        known += self.constant
+        known[:, ROUNDS] += 1
+
+        values = np.empty_like(known)
+        values[0] = self.loss
+        values[1:] = known[1:] if self.solver is None else self.solver @ known[1:]
+        self.values.append(values)
+        self.after_hit.append(values[self.hit].mean(axis=0))
+
+
+class CombatSolver:
+    """Exact fight outcomes with a cache of solved layers shared across queries"""
+    def __init__(self):
+        self._tables: Dict[tuple, _Table] = {}
+
+    def solve(self, player: Dict[str, int], enemy: Dict[str, int],
+              strategy: Sequence[float] = (1.0, 0.0, 0.0),
+              enemy_health: Optional[int] = None) -> CombatOutcome:
+        """Outcome of a fight starting at player['health'] against enemy.
+
+        enemy_health defaults to the enemy's full health. The 'use item'
+        combat action is not modelled; apply item boosts to the stat block
+        instead.
+        """
+        total = sum(strategy)
+        strategy = tuple(float(weight) / total for weight in strategy)
+        key = (player["max_health"], player["strength"], player["agility"], enemy["strength"], strategy)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = _Table(*key)
+
+        health = min(player["health"], player["max_health"])
+        if enemy_health is None:
+            enemy_health = enemy["health"]
+        if health <= 0:
+            return CombatOutcome(0.0, 1.0, 0.0, float(max(health, 0)), 0.0)
+        if enemy_health <= 0:
+            return CombatOutcome(1.0, 0.0, 0.0, 0.0, 0.0)
+
+        value = table.layer(enemy_health)[health]
+        return CombatOutcome(
+            win=float(value[WIN]),
+            loss=float(value[LOSS]),
+            fled=float(value[FLED]),
+            expected_health_lost=float(health - value[HEALTH]),
+            expected_rounds=float(value[ROUNDS]),
+        )
+
+    def clear(self):
+        self._tables.clear()
+
+    def cached_states(self) -> int:
+        return sum((len(table.values) - 1) * table.max_health for table in self._tables.values())
+
+
+_shared = CombatSolver()
+
+
+def solve(player: Dict[str, int], enemy: Dict[str, int], strategy: Sequence[float] = (1.0, 0.0, 0.0),
+          enemy_health: Optional[int] = None) -> CombatOutcome:
+    """Solve a fight using the module-wide cache"""
+    return _shared.solve(player, enemy, strategy, enemy_health)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exact combat outcome solver")
+    parser.add_argument("char_class")
+    parser.add_argument("enemy")
+    parser.add_argument("--items", nargs="*", default=[])
+    parser.add_argument("--health", type=int, default=None)
+    parser.add_argument("--strategy", type=float, nargs=3, default=(1.0, 0.0, 0.0),
+                        metavar=("ATTACK", "DEFEND", "FLEE"))
+    args = parser.parse_args()
+
+    world = CrystalKingdoms()
+    stats = player_stats(world, args.char_class, args.items)
+    if args.health is not None:
+        stats["health"] = args.health
+    for attempt in ("cold", "cached"):
+        start = time.perf_counter()
+        outcome = solve(stats, enemy_stats(world, args.enemy), args.strategy)
+        elapsed = time.perf_counter() - start
+        print(f"{attempt}: {elapsed * 1000:.2f} ms")
+    print(f"Win: {outcome.win:.6f}  Loss: {outcome.loss:.6f}  Fled: {outcome.fled:.6f}")
+    print(f"Expected health lost: {outcome.expected_health_lost:.4f}")
+    print(f"Expected rounds: {outcome.expected_rounds:.4f}")
@@ -0,0 +1,411 @@
+"""Content compilation for The Crystal Kingdoms.
+
+The world is written as name-keyed tables (see the constants in
+AI_edited_rpg.py). compile_world() checks every cross reference and turns the
+tables into tuples of records indexed by dense integer IDs, so the game can
+work with ints and only look names up when it prints something. Each
+location's exits, compiled to (location ID, travel cost) pairs, make up the
+location graph that travel.LocationGraph routes over.
+completability_problems() goes further and checks that a compiled world can
+actually be finished.
+"""
+from array import array
+from types import MappingProxyType
+from typing import Container, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from sampling import COMBAT, DEFAULT_EVENT_WEIGHTS, EVENTS, ITEM, NOTHING, LocationTables
+from travel import LocationGraph
+
+ITEM_TYPES = {
+    "consumable": ("heal", "magic_boost"),
+    "weapon": ("strength_boost",),
+    "key_item": ("story",),
+}
+NO_ID = -1
+
+
+class ContentError(ValueError):
+    """Raised when world content is malformed or references something that does not exist"""
+
+
+class Enemy(NamedTuple):
+    name: str
+    health: int
+    strength: int
+    agility: int
+
+
+class Item(NamedTuple):
+    name: str
+    type: str
+    effect: str
+    value: int
+
+
+class Npc(NamedTuple):
+    name: str
+    quests: Tuple[int, ...]
+
+
+class Location(NamedTuple):
+    name: str
+    description: str
+    enemies: Tuple[int, ...]
+    items: Tuple[int, ...]
+    npcs: Tuple[int, ...]
+    exits: Tuple[Tuple[int, int], ...]  # (location, travel cost); every exit is listed at both ends
+    # Relative chances of each enemy and item above, and of each of sampling.EVENTS when exploring
+    enemy_weights: Tuple[float, ...]
+    item_weights: Tuple[float, ...]
+    event_weights: Tuple[float, ...]
+
+
+class Quest(NamedTuple):
+    name: str
+    requires: Tuple[int, ...]
+    enemy_kills: Tuple[Tuple[int, int], ...]
+    items_needed: Tuple[int, ...]
+    reward: int
+    progress_max: int
+
+
+class CompiledWorld:
+    """World content with every name replaced by an integer ID.
+
+    Each table is a tuple of records; a record's ID is its position. The
+    *_ids dicts map names back to IDs. Quests also get reverse indexes from
+    enemy and item IDs to the quests that need them, and from each quest to
+    the quests that require it. The game reaches the quest indexes only
+    through root_quests, dependents, requires_count, quest_progress_max and
+    the quests_for_* methods, which worldgen.LazyWorld provides as well.
+    graph routes travel over the locations' exits, and location_tables holds
+    the compiled encounter and loot tables of each location.
+    """
+    def __init__(self, character_classes: Mapping[str, Mapping[str, int]], enemies: Sequence[Enemy],
+                 items: Sequence[Item], locations: Sequence[Location], npcs: Sequence[Npc],
+                 quests: Sequence[Quest], boss: int, start_location: int, starting_items: Sequence[int]):
+        self.character_classes = character_classes
+        self.enemies = tuple(enemies)
+        self.items = tuple(items)
+        self.locations = tuple(locations)
+        self.npcs = tuple(npcs)
+        self.quests = tuple(quests)
+        self.boss = boss
+        self.start_location = start_location
+        self.starting_items = tuple(starting_items)
+
+        self.enemy_ids = {enemy.name: i for i, enemy in enumerate(self.enemies)}
+        self.item_ids = {item.name: i for i, item in enumerate(self.items)}
+        self.location_ids = {location.name: i for i, location in enumerate(self.locations)}
+        self.quest_ids = {quest.name: i for i, quest in enumerate(self.quests)}
+
+        self.enemy_health = array("i", (enemy.health for enemy in self.enemies))
+        self.enemy_strength = array("i", (enemy.strength for enemy in self.enemies))
+        self.quest_progress_max = array("i", (quest.progress_max for quest in self.quests))
+
+        quests_by_enemy: List[List[int]] = [[] for _ in self.enemies]
+        quests_by_item: List[List[int]] = [[] for _ in self.items]
+        dependents: List[List[int]] = [[] for _ in self.quests]
+        for quest_id, quest in enumerate(self.quests):
+            for enemy_id, _ in quest.enemy_kills:
+                quests_by_enemy[enemy_id].append(quest_id)
+            for item_id in dict.fromkeys(quest.items_needed):
+                quests_by_item[item_id].append(quest_id)
+            for required in quest.requires:
+                dependents[required].append(quest_id)
+        self.quests_by_enemy = tuple(map(tuple, quests_by_enemy))
+        self.quests_by_item = tuple(map(tuple, quests_by_item))
+        self.dependents = tuple(map(tuple, dependents))
+        self.requires_count = array("i", (len(quest.requires) for quest in self.quests))
+        self.root_quests = tuple(quest for quest, count in enumerate(self.requires_count) if not count)
+        self.graph = LocationGraph(self.locations)
+        self.location_tables = tuple(map(LocationTables.build, self.locations))
+
+    # Pickled as columns: rebuilding records with _make runs in C, unlike unpickling them one by one
+    _RECORD_TABLES = (("enemies", Enemy), ("items", Item), ("locations", Location), ("npcs", Npc),
+                      ("quests", Quest))
+    _NAME_INDEXES = (("enemy_ids", "enemies"), ("item_ids", "items"), ("location_ids", "locations"),
+                     ("quest_ids", "quests"))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["character_classes"] = {name: dict(stats) for name, stats in self.character_classes.items()}
+        for table, _ in self._RECORD_TABLES:
+            state[table] = tuple(zip(*state[table]))
+        for index, _ in self._NAME_INDEXES:
+            del state[index]
+        del state["graph"]  # its route tables are a cache; edits to it are not part of the content
+        return state
+
+    def __setstate__(self, state: dict):
+        state["character_classes"] = MappingProxyType(
+            {name: MappingProxyType(stats) for name, stats in state["character_classes"].items()})
+        for table, record in self._RECORD_TABLES:
+            state[table] = tuple(map(record._make, zip(*state[table])))
+        for index, table in self._NAME_INDEXES:
+            names = [record.name for record in state[table]]
+            state[index] = dict(zip(names, range(len(names))))
+        self.__dict__.update(state)
+        self.graph = LocationGraph(self.locations)
+
+    def quests_for_kill(self, enemy: int, active: Container[int]) -> List[int]:
+        """Active quests that count kills of enemy, in ID order"""
+        return [quest for quest in self.quests_by_enemy[enemy] if quest in active]
+
+    def quests_for_item(self, item: int, active: Container[int]) -> List[int]:
+        """Active quests that need item, in ID order"""
+        return [quest for quest in self.quests_by_item[item] if quest in active]
+
+
+def _lookup(ids: Dict[str, int], name, kind: str, where: str) -> int:
+    try:
+        return ids[name]
+    except (KeyError, TypeError):
+        raise ContentError(f"{where} refers to unknown {kind} {name!r}") from None
+
+
+def _check_acyclic(quests: Sequence[Quest]):
+    """Reject quests whose requirements loop back on themselves"""
+    state = [0] * len(quests)  # 0 unvisited, 1 in progress, 2 done
+    for start in range(len(quests)):
+        if state[start]:
+            continue
+        stack = [(start, iter(quests[start].requires))]
+        state[start] = 1
+        while stack:
+            quest_id, requirements = stack[-1]
+            for required in requirements:
+                if state[required] == 1:
+                    raise ContentError(f"Quest {quests[required].name!r} is part of a requirement cycle")
+                if not state[required]:
+                    state[required] = 1
+                    stack.append((required, iter(quests[required].requires)))
+                    break
+            else:
+                state[quest_id] = 2
+                stack.pop()
+
+
+def _compile_exits(locations: Mapping[str, Mapping], location_ids: Dict[str, int]) -> List[Tuple[Tuple[int, int], ...]]:
+    """Each location's (neighbour, cost) exits in ID order, listed at both ends.
+
+    A location's "exits" maps neighbouring location names to travel costs,
+    and only one end of an exit needs to list it. Tables in which no
+    location has exits predate the location graph, when every location was
+    one move from every other, so they get exactly that: every pair
+    connected at cost 1.
+    """
+    exits: List[Dict[int, int]] = [{} for _ in location_ids]
+    for name, data in locations.items():
+        here = location_ids[name]
+        for neighbour, cost in data.get("exits", {}).items():
+            there = _lookup(location_ids, neighbour, "location", f"Location {name!r}")
+            if there == here:
+                raise ContentError(f"Location {name!r} has an exit to itself")
+            if not isinstance(cost, int) or cost < 1:
+                raise ContentError(f"Location {name!r} has travel cost {cost!r} to {neighbour!r}; "
+                                   "costs are positive integers")
+            for start, end in ((here, there), (there, here)):
+                if exits[start].setdefault(end, cost) != cost:
+                    raise ContentError(f"The exit between {name!r} and {neighbour!r} is given two different costs")
+    if not any(exits):
+        everywhere = [(location, 1) for location in range(len(exits))]
+        return [tuple(everywhere[:location] + everywhere[location + 1:]) for location in range(len(exits))]
+    return [tuple(sorted(neighbours.items())) for neighbours in exits]
+
+
+def _weighted(entries, ids: Dict[str, int], kind: str, where: str) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+    """IDs and weights of a list of names (all weighing 1) or a table of names to weights"""
+    pairs = list(entries.items()) if isinstance(entries, Mapping) else [(name, 1) for name in entries]
+    for name, weight in pairs:
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not weight >= 0:
+            raise ContentError(f"{where} gives {kind} {name!r} weight {weight!r}; weights are numbers from 0 up")
+    if pairs and not any(weight for _, weight in pairs):
+        raise ContentError(f"{where} gives every {kind} weight 0")
+    return tuple(_lookup(ids, name, kind, where) for name, _ in pairs), tuple(weight for _, weight in pairs)
+
+
+def compile_world(character_classes: Mapping[str, Mapping[str, int]], items: Mapping[str, Mapping],
+                  locations: Mapping[str, Mapping], enemies: Mapping[str, Mapping],
+                  quest_data: Mapping[str, Mapping], boss: Optional[str] = None,
+                  start_location: Optional[str] = None, starting_items: Sequence[str] = ()) -> CompiledWorld:
+    """Validate name-keyed world tables and compile them to integer IDs.
+
+    boss names the enemy fought from the final action menu entry, if any.
+    New characters start in start_location (the first location by default)
+    carrying starting_items. A location's enemies and items are lists of
+    names, all equally likely, or tables of names to weights; its optional
+    "events" table weighs the outcomes of exploring it (sampling.EVENTS) and
+    defaults to DEFAULT_EVENT_WEIGHTS. At a location without enemies or
+    items, the weight of fights or finds goes to nothing. Raises ContentError
+    on the first malformed entry or dangling reference.
+    """
+    for class_name, stats in character_classes.items():
+        for stat in ("health", "strength", "agility", "magic"):
+            if not isinstance(stats.get(stat), int):
+                raise ContentError(f"Class {class_name!r} needs an integer {stat!r}")
+
+    enemy_ids = {name: i for i, name in enumerate(enemies)}
+    enemy_records = []
+    for name, data in enemies.items():
+        if data.get("name", name) != name:
+            raise ContentError(f"Enemy {name!r} is named {data['name']!r}")
+        enemy_records.append(Enemy(name, data["health"], data["strength"], data["agility"]))
+
+    item_ids = {name: i for i, name in enumerate(items)}
+    item_records = []
+    for name, data in items.items():
+        if data.get("effect") not in ITEM_TYPES.get(data.get("type"), ()):
+            raise ContentError(f"Item {name!r} has unknown type/effect {data.get('type')!r}/{data.get('effect')!r}")
+        item_records.append(Item(name, data["type"], data["effect"], data.get("value", 0)))
+
+    quest_ids = {name: i for i, name in enumerate(quest_data)}
+    quest_records = []
+    for name, data in quest_data.items():
+        where = f"Quest {name!r}"
+        reward = data.get("reward")
+        quest_records.append(Quest(
+            name=name,
+            requires=tuple(dict.fromkeys(_lookup(quest_ids, required, "quest", where)
+                                         for required in data["requires"])),
+            enemy_kills=tuple((_lookup(enemy_ids, enemy, "enemy", where), count)
+                              for enemy, count in data["enemy_kills"].items()),
+            items_needed=tuple(_lookup(item_ids, item, "item", where) for item in data["items_needed"]),
+            reward=NO_ID if reward is None else _lookup(item_ids, reward, "item", where),
+            progress_max=data["progress_max"],
+        ))
+    _check_acyclic(quest_records)
+
+    location_ids = {name: i for i, name in enumerate(locations)}
+    exits = _compile_exits(locations, location_ids)
+    npc_records = []
+    location_records = []
+    for location_id, (name, data) in enumerate(locations.items()):
+        where = f"Location {name!r}"
+        npc_ids = []
+        for npc in data["npcs"]:
+            npc_ids.append(len(npc_records))
+            npc_records.append(Npc(npc["name"], tuple(
+                _lookup(quest_ids, quest, "quest", f"NPC {npc['name']!r}") for quest in npc["quests"])))
+        location_enemies, enemy_weights = _weighted(data["enemies"], enemy_ids, "enemy", where)
+        location_items, item_weights = _weighted(data["items"], item_ids, "item", where)
+        events = data.get("events")
+        if events is None:
+            event_weights = DEFAULT_EVENT_WEIGHTS
+        else:
+            event_ids = {event: i for i, event in enumerate(EVENTS)}
+            found, weights = _weighted(events, event_ids, "event", where)
+            event_weights = [0] * len(EVENTS)
+            for event, weight in zip(found, weights):
+                event_weights[event] = weight
+            event_weights = tuple(event_weights)
+            if not any(event_weights):
+                raise ContentError(f"{where} gives every event weight 0")
+        # With nothing to fight or find, those outcomes turn up nothing instead
+        for event, entries in ((COMBAT, location_enemies), (ITEM, location_items)):
+            if event_weights[event] and not entries:
+                event_weights = tuple(weight + event_weights[event] if outcome == NOTHING else
+                                      0 if outcome == event else weight
+                                      for outcome, weight in enumerate(event_weights))
+        location_records.append(Location(
+            name=name,
+            description=data["description"],
+            enemies=location_enemies,
+            items=location_items,
+            npcs=tuple(npc_ids),
+            exits=exits[location_id],
+            enemy_weights=enemy_weights,
+            item_weights=item_weights,
+            event_weights=event_weights,
+        ))
+    if not location_records:
+        raise ContentError("The world needs at least one location")
+
+    return CompiledWorld(
+        MappingProxyType(dict(character_classes)), enemy_records, item_records,
+        location_records, npc_records, quest_records,
+        boss=NO_ID if boss is None else _lookup(enemy_ids, boss, "enemy", "The boss fight"),
+        start_location=0 if start_location is None else _lookup(location_ids, start_location, "location",
+                                                                "The starting location"),
+        starting_items=[_lookup(item_ids, item, "item", "The starting inventory") for item in starting_items],
+    )
+
+
+def _rewarded_before(world: CompiledWorld, quest_id: int, item: int) -> bool:
+    """Whether some quest that quest_id (indirectly) requires rewards item"""
+    seen = set(world.quests[quest_id].requires)
+    pending = list(seen)
+    while pending:
+        quest = world.quests[pending.pop()]
+        if quest.reward == item:
+            return True
+        for required in quest.requires:
+            if required not in seen:
+                seen.add(required)
+                pending.append(required)
+    return False
+
+
+def completability_problems(world: CompiledWorld) -> List[str]:
+    """Reasons the world can never be finished, assuming every fight is won.
+
+    The game is finished by completing every quest. A quest can be completed
+    when an NPC gives it, its requirements can be completed, one of the
+    enemies it counts appears at some location (every kill of a listed enemy
+    is one step of progress) and each needed item can be found at a location
+    or is the reward of a quest it requires. Only locations the starting
+    location has a route to count, and only enemies and items with a weight
+    above 0 at a location whose events include fights or finds. Only the
+    quests that fail these checks themselves are listed; the quests locked
+    behind them are counted.
+    """
+    problems = []
+    reachable = []
+    for location_id, location in enumerate(world.locations):
+        if world.graph.distance(location_id, world.start_location) is None:
+            problems.append(f"Location {location.name!r} cannot be reached from the starting location")
+            continue
+        reachable.append(location)
+    given = {quest for location in reachable for npc in location.npcs for quest in world.npcs[npc].quests}
+    spawning = {enemy for location in reachable if location.event_weights[COMBAT]
+                for enemy, weight in zip(location.enemies, location.enemy_weights) if weight}
+    findable = {item for location in reachable if location.event_weights[ITEM]
+                for item, weight in zip(location.items, location.item_weights) if weight}
+
+    missing = array("i", world.requires_count)  # a copy; a WorldStore's is read-only
+    ready = [quest for quest, count in enumerate(missing) if not count]
+    possible = [False] * len(world.quests)
+    blocked = 0
+    while ready:
+        quest_id = ready.pop()
+        quest = world.quests[quest_id]
+        reasons = []
+        if quest_id not in given:
+            reasons.append("no NPC gives it")
+        if quest.progress_max > 0 and not any(enemy in spawning for enemy, _ in quest.enemy_kills):
+            reasons.append(f"it needs {quest.progress_max} progress but none of its enemies appear anywhere"
+                           if quest.enemy_kills else f"it needs {quest.progress_max} progress but counts no kills")
+        unobtainable = [world.items[item].name for item in dict.fromkeys(quest.items_needed)
+                        if item not in findable and not _rewarded_before(world, quest_id, item)]
+        if unobtainable:
+            reasons.append(f"{', '.join(unobtainable)} cannot be found or earned first")
+        if reasons:
+            problems.append(f"Quest {quest.name!r} can never be completed: {'; '.join(reasons)}")
+        elif all(possible[required] for required in quest.requires):
+            possible[quest_id] = True
+        else:
+            blocked += 1
+        for dependent in world.dependents[quest_id]:
+            missing[dependent] -= 1
+            if not missing[dependent]:
+                ready.append(dependent)
+    if blocked:
+        problems.append(f"{blocked} more quests are locked behind those")
+    return problems
+
+
+def check_completable(world: CompiledWorld):
+    """Raise ContentError if the world can never be finished"""
+    problems = completability_problems(world)
+    if problems:
+        raise ContentError("The world cannot be completed:\n  " + "\n  ".join(problems))
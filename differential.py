@@ -0,0 +1,349 @@
+"""Differential harness for the two versions of The Crystal Kingdoms.
+
+Plays AI_original_rpg.py and AI_edited_rpg.py side by side with the same
+seed and the same scripted decisions, and reports where their behaviour
+parts ways and how fast each one runs.
+
+Both versions draw their randomness from a Random seeded the same way (the
+original module's `random` is swapped for one), and a shared script makes
+the decisions. The script works at the level of choices, not keystrokes: the
+two main menus are numbered differently, so "explore" or "use item" is
+translated to each version's key, and picks from a list (item, location, NPC)
+are drawn as a fraction of that version's own list. While the versions agree
+they therefore see identical answers. The edited game only lists the
+neighbouring locations, so it is given the name of the location the
+original would move to and travels there, through any locations between;
+in the built-in world every location is a neighbour. At locations with the
+default weights, the edited game explores with the same draws as the
+original (see sampling.draws_classically), so the random streams stay in
+step.
+
+The two versions differ on purpose (fleeing ends a fight, the final quest
+needs Emperor SkekSo, items are used differently), so most games part ways
+with the original. To check a change to the edited game for regressions,
+compare it with a copy of an earlier edited game instead:
+`git show <commit>:AI_edited_rpg.py > before.py`, then
+`python differential.py --baseline before.py`. That copy is played like the
+original, with the edited game's menu numbering, and on the built-in world
+every game should come out identical; any difference is a regression.
+
+After every turn both states are reduced to plain names and numbers and
+compared; the report shows the first turn that differs and what differs. The
+time from answering the main menu until the next main menu is recorded per
+action, so a slowdown shows up against the action that caused it.
+
+Run `python differential.py --games 20` for the summary, add --verbose for
+every difference.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from AI_edited_rpg import CrystalKingdoms, run_sync
+from headless import HeadlessIO
+from pacing import TurboPacer
+
+ACTIONS = ("explore", "use_item", "move", "rest", "talk")
+EDITED_KEYS = {"explore": "1", "use_item": "2", "move": "3", "rest": "4", "talk": "5"}
+ORIGINAL_KEYS = {"explore": "1", "move": "3", "rest": "4", "talk": "5", "use_item": "6"}
+# The original only has input() prompts; tell them apart by their text
+ORIGINAL_PROMPTS = (
+    ("character's name", "name"), ("Choose your class", "class"), ("What would you like to do", "action"),
+    ("Choose your action", "combat"), ("Choose item", "item"), ("Choose location", "location"),
+    ("Choose NPC", "npc"), ("Turn in", "turn_in"), ("Accept this quest", "accept_quest"),
+    ("want to quit", "quit"), ("throw it away", "throw_away"),
+)
+COMBAT_WEIGHTS = (6, 2, 1, 1)
+ORIGINAL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI_original_rpg.py")
+
+State = Dict[str, Any]
+
+
+class TurnLimit(Exception):
+    """The script stops a game that runs too long"""
+
+
+class Script:
+    """The decisions shared by both versions, one seeded stream per kind of prompt"""
+    def __init__(self, seed: int, char_class: Optional[str] = None):
+        self.seed = seed
+        self.char_class = char_class
+        self.streams: Dict[str, random.Random] = {}
+
+    def _stream(self, kind: str) -> random.Random:
+        stream = self.streams.get(kind)
+        if stream is None:
+            stream = self.streams[kind] = random.Random(f"{self.seed}:{kind}")
+        return stream
+
+    def decide(self, kind: str):
+        """A choice for the kind of prompt: an action name, a key or a fraction of a list"""
+        stream = self._stream(kind)
+        if kind == "name":
+            return "Bot"
+        if kind == "class":
+            return self.char_class or stream.choice(("warrior", "mage", "rogue"))
+        if kind == "action":
+            return stream.choice(ACTIONS)
+        if kind == "combat":
+            return stream.choices("1234", weights=COMBAT_WEIGHTS)[0]
+        if kind in ("item", "location", "npc"):
+            return stream.random()
+        if kind in ("turn_in", "accept_quest", "quit"):
+            return "y"
+        return "n"
+
+
+class Run:
+    """One version playing the script: states after every turn and time per action"""
+    def __init__(self, label: str, script: Script, max_turns: int):
+        self.label = label
+        self.script = script
+        self.max_turns = max_turns
+        self.states: List[State] = []
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.outcome = ""
+        self._action: Optional[str] = None
+        self._started = 0.0
+
+    def at_prompt(self, kind: str, state: Callable[[], State]):
+        """Called at every prompt; a main menu prompt marks the end of a turn"""
+        if kind == "action":
+            self._finish_turn(state)
+            if len(self.states) > self.max_turns:
+                raise TurnLimit
+
+    def _finish_turn(self, state: Callable[[], State]):
+        now = time.perf_counter()
+        if self._action is not None:
+            self.timings[self._action].append(now - self._started)
+            self._action = None
+        self.states.append(state())
+
+    def start_action(self, action: str):
+        self._action = action
+        self._started = time.perf_counter()
+
+    def end(self, outcome: str, state: Callable[[], State]):
+        self._finish_turn(state)
+        self.outcome = outcome
+
+
+def _pick(fraction: float, count: int) -> str:
+    return str(int(fraction * count) + 1) if count else "0"
+
+
+def edited_state(game: CrystalKingdoms) -> State:
+    player = game.player
+    quest_name = lambda quest: game.quests[quest].name
+    return {
+        "health": player.health, "max_health": player.max_health, "strength": player.strength,
+        "agility": player.agility, "magic": player.magic,
+        "location": game.locations[player.current_location].name,
+        "inventory": sorted(Counter(game.items[item].name for item in player.inventory).items()),
+        "story_choices": [game.locations[location].name for location in player.story_choices],
+        "quests_completed": sorted(map(quest_name, player.quests_completed)),
+        "active_quests": sorted(map(quest_name, player.active_quests)),
+        "quest_progress": sorted((quest_name(quest), progress) for quest, progress in player.quest_progress.items()),
+    }
+
+
+def original_state(game) -> State:
+    player = game.player
+    return {
+        "health": player.health, "max_health": player.max_health, "strength": player.strength,
+        "agility": player.agility, "magic": player.magic,
+        "location": player.current_location,
+        "inventory": sorted(Counter(player.inventory).items()),
+        "story_choices": list(player.story_choices),
+        "quests_completed": sorted(player.quests_completed),
+        "active_quests": sorted(player.active_quests),
+        "quest_progress": sorted(player.quest_progress.items()),
+    }
+
+
+def _outcome(game) -> str:
+    if game.player.health <= 0:
+        return "died"
+    if not game.game_running:
+        return "quit"
+    return "ending"
+
+
+class _EditedPolicy:
+    def __init__(self, run: Run):
+        self.run = run
+
+    def choose(self, kind: str, prompt: str, game: CrystalKingdoms) -> str:
+        run = self.run
+        run.at_prompt(kind, lambda: edited_state(game))
+        decision = run.script.decide(kind)
+        if kind == "action":
+            run.start_action(decision)
+            return EDITED_KEYS[decision]
+        if kind == "item":
+            return _pick(decision, len(game.player.inventory))
+        if kind == "location":
+            # The original lists every location; name the same one, which the edited game routes to
+            return game.locations[int(_pick(decision, len(game.locations))) - 1].name
+        if kind == "npc":
+            return _pick(decision, len(game.locations[game.player.current_location].npcs))
+        return decision
+
+
+def play_edited(script: Script, seed: int, max_turns: int) -> Run:
+    run = Run("edited", script, max_turns)
+    io = HeadlessIO(_EditedPolicy(run))
+    game = CrystalKingdoms(io=io, rng=random.Random(seed), pacer=TurboPacer())
+    io.game = game
+    try:
+        run_sync(game.start_game())
+        outcome = _outcome(game)
+    except TurnLimit:
+        outcome = "turn limit"
+    run.end(outcome, lambda: edited_state(game))
+    return run
+
+
+_modules: Dict[str, Any] = {}
+
+
+def _load(path: str):
+    module = _modules.get(path)
+    if module is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = _modules[path] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+def play_original(script: Script, seed: int, max_turns: int, path: str = ORIGINAL_FILE) -> Run:
+    """Play the original, or a blocking copy of the edited game, with input(), print() and random swapped out"""
+    module = _load(path)
+    run = Run("original" if path == ORIGINAL_FILE else "baseline", script, max_turns)
+    # A copy of the edited game has its Use item menu entry at 2, like the edited game
+    keys = EDITED_KEYS if hasattr(module.CrystalKingdoms, "fight_skekso") else ORIGINAL_KEYS
+    game = module.CrystalKingdoms()
+
+    def fake_input(prompt: str = "") -> str:
+        kind = next((kind for text, kind in ORIGINAL_PROMPTS if text in prompt), None)
+        if kind is None:
+            raise RuntimeError(f"Unknown prompt in the original game: {prompt!r}")
+        run.at_prompt(kind, lambda: original_state(game))
+        decision = script.decide(kind)
+        if kind == "action":
+            run.start_action(decision)
+            return keys[decision]
+        if kind == "item":
+            return _pick(decision, len(game.player.inventory))
+        if kind == "location":
+            return _pick(decision, len(game.locations))
+        if kind == "npc":
+            return _pick(decision, len(game.locations[game.player.current_location]["npcs"]))
+        return decision
+
+    saved_random, saved_sleep = module.random, getattr(module, "sleep", None)
+    module.input = fake_input
+    module.print = lambda *args, **kwargs: None
+    module.random = random.Random(seed)
+    if saved_sleep is not None:  # the edited game paused after every turn before pacing.py
+        module.sleep = lambda seconds: None
+    try:
+        game.start_game()
+        outcome = _outcome(game)
+    except TurnLimit:
+        outcome = "turn limit"
+    finally:
+        del module.input, module.print
+        module.random = saved_random
+        if saved_sleep is not None:
+            module.sleep = saved_sleep
+    run.end(outcome, lambda: original_state(game))
+    return run
+
+
+def differences(original: State, edited: State) -> List[Tuple[str, Any, Any]]:
+    return [(key, original[key], edited[key]) for key in original if original[key] != edited[key]]
+
+
+def compare(seed: int, char_class: Optional[str] = None, max_turns: int = 200,
+            baseline: str = ORIGINAL_FILE) -> Tuple[Run, Run]:
+    """Play both versions with the same seed and script"""
+    original = play_original(Script(seed, char_class), seed, max_turns, baseline)
+    edited = play_edited(Script(seed, char_class), seed, max_turns)
+    return original, edited
+
+
+def first_divergence(original: Run, edited: Run) -> Optional[int]:
+    """The first turn after which the states differ, or None if they never do"""
+    for turn, (before, after) in enumerate(zip(original.states, edited.states)):
+        if before != after:
+            return turn
+    if len(original.states) != len(edited.states):
+        return min(len(original.states), len(edited.states))
+    return None
+
+
+def _format(value) -> str:
+    text = repr(value)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def report(runs: List[Tuple[int, Run, Run]], verbose: bool = False):
+    diverged = 0
+    label = runs[0][1].label if runs else "original"
+    timings: Dict[str, Dict[str, List[float]]] = {label: defaultdict(list), "edited": defaultdict(list)}
+    for seed, original, edited in runs:
+        for run in (original, edited):
+            for action, samples in run.timings.items():
+                timings[run.label][action] += samples
+        turn = first_divergence(original, edited)
+        summary = (f"seed {seed}: {label} {len(original.states) - 1} turns ({original.outcome}), "
+                   f"edited {len(edited.states) - 1} turns ({edited.outcome})")
+        if turn is None:
+            print(f"{summary}, identical")
+            continue
+        diverged += 1
+        print(f"{summary}, first difference after turn {turn}")
+        if turn < min(len(original.states), len(edited.states)):
+            for key, before, after in differences(original.states[turn], edited.states[turn]):
+                print(f"    {key}: {label} {_format(before)}, edited {_format(after)}")
+        else:
+            print("    one version's game ended")
+        if verbose:
+            for later in range(turn + 1, min(len(original.states), len(edited.states))):
+                changed = differences(original.states[later], edited.states[later])
+                print(f"  turn {later}: " + ", ".join(key for key, _, _ in changed))
+    print(f"\n{diverged} of {len(runs)} games diverged")
+
+    print(f"\n{'action':10} {label:>12} {'edited':>12} {'ratio':>7}")
+    for action in ACTIONS:
+        before, after = timings[label][action], timings["edited"][action]
+        if not before or not after:
+            continue
+        mean_before = sum(before) / len(before) * 1e6
+        mean_after = sum(after) / len(after) * 1e6
+        print(f"{action:10} {mean_before:10.1f}us {mean_after:10.1f}us {mean_after / mean_before:6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the original and edited Crystal Kingdoms")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--char-class", choices=("warrior", "mage", "rogue"))
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true", help="list the differing fields of every later turn")
+    parser.add_argument("--baseline", metavar="FILE", default=ORIGINAL_FILE,
+                        help="an earlier copy of AI_edited_rpg.py to compare with instead of the original")
+    args = parser.parse_args()
+
+    runs = []
+    for seed in range(args.seed, args.seed + args.games):
+        original, edited = compare(seed, args.char_class, args.max_turns, args.baseline)
+        runs.append((seed, original, edited))
+    report(runs, args.verbose)
@@ -0,0 +1,257 @@
+"""Agent training environments for The Crystal Kingdoms.
+
+GameEnv has the classic gym interface: reset() returns an observation and
+step(action) returns (observation, reward, done, info). The game itself runs
+unchanged as a coroutine: every prompt it awaits suspends it, and the
+environment resumes it with the answer. Only two prompts are decisions for
+the agent, the same ones a player makes most often:
+
+- actions 0-6 are the main menu in handle_player_turn (explore, use item,
+  move, rest, talk to NPCs, quit, fight the boss)
+- actions 7-10 are the combat options in do_combat_action (attack, defend,
+  use item, flee)
+
+Follow-up prompts (which item, where to go, whether to accept a quest) are
+answered by a sub-policy, RandomPolicy by default. action_mask() shows which
+actions apply to the current prompt. Any other action is passed to the game
+as an invalid answer, which costs the turn or combat round.
+
+VectorEnv steps many games in lockstep and returns observations, rewards
+and done flags as NumPy arrays, resetting finished games automatically.
+
+Run `python env.py --envs 1000 --steps 200` to measure steps per second.
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from AI_edited_rpg import DEFAULT_WORLD
+from content import CompiledWorld
+from headless import Prompt, PromptIO, QuietGame, RandomPolicy
+from pacing import TurboPacer
+
+MENU_ACTIONS = ("explore", "use_item", "move", "rest", "talk", "quit", "fight_boss")
+COMBAT_ACTIONS = ("attack", "defend", "combat_item", "flee")
+ACTIONS = MENU_ACTIONS + COMBAT_ACTIONS
+COMBAT_OFFSET = len(MENU_ACTIONS)
+DECISIONS = ("action", "combat")
+
+# Quest status codes in the observation
+LOCKED, AVAILABLE, ACTIVE, COMPLETED = range(4)
+
+
+class _EnvGame(QuietGame):
+    """The game with the current enemy visible"""
+    enemy: Optional[Dict[str, Any]] = None
+
+    async def do_combat_action(self, enemy):
+        self.enemy = enemy
+        return await super().do_combat_action(enemy)
+
+
+def observation_names(world: CompiledWorld) -> List[str]:
+    """Labels for each entry of an observation vector"""
+    names = ["health", "max_health", "strength", "agility", "magic", "final", "in_combat", "enemy_health"]
+    names += [f"location:{location.name}" for location in world.locations]
+    names += [f"enemy:{enemy.name}" for enemy in world.enemies]
+    names += [f"item:{item.name}" for item in world.items]
+    for quest in world.quests:
+        names += [f"quest_status:{quest.name}", f"quest_progress:{quest.name}"]
+    return names
+
+
+class GameEnv:
+    """One game as a reset()/step() environment"""
+    quest_reward = 1.0
+    win_reward = 10.0
+    death_penalty = -10.0
+
+    def __init__(self, char_class: Optional[str] = None, max_turns: int = 1000,
+                 world: Optional[CompiledWorld] = None, sub_policy=None, seed: Optional[int] = None):
+        self.char_class = char_class
+        self.max_turns = max_turns
+        self.world = world or DEFAULT_WORLD
+        self.rng = random.Random(seed)
+        self.sub_policy = sub_policy or RandomPolicy(random.Random(self.rng.getrandbits(64)), char_class)
+        self.io = PromptIO()
+        self.game: Optional[_EnvGame] = None
+        self.prompt: Optional[Prompt] = None
+        self._episode = None
+        self._quests_completed = 0
+
+    @property
+    def observation_size(self) -> int:
+        return len(observation_names(self.world))
+
+    def reset(self, seed: Optional[int] = None) -> np.ndarray:
+        if self._episode is not None:
+            self._episode.close()
+        seed = self.rng.getrandbits(64) if seed is None else seed
+        self.game = _EnvGame(io=self.io, rng=random.Random(seed), world=self.world, pacer=TurboPacer(history=1))
+        self._episode = self._play()
+        self.prompt = self._episode.send(None)
+        self._quests_completed = 0
+        self._advance()
+        return self.observation()
+
+    async def _play(self):
+        await self.game.create_character()
+        await self.game.game_loop()
+
+    def _send(self, answer: str):
+        try:
+            self.prompt = self._episode.send(answer)
+        except StopIteration:
+            self.prompt = None
+
+    def _advance(self):
+        """Answer follow-up prompts until the agent has a decision to make or the game ends"""
+        while self.prompt is not None and self.prompt.kind not in DECISIONS:
+            if self.prompt.kind == "name":
+                answer = "Agent"
+            else:
+                answer = self.sub_policy.choose(self.prompt.kind, self.prompt.text, self.game)
+            self._send(answer)
+
+    def action_mask(self) -> List[bool]:
+        mask = [False] * len(ACTIONS)
+        if self.prompt is None:
+            return mask
+        if self.prompt.kind == "combat":
+            mask[COMBAT_OFFSET:] = [True] * len(COMBAT_ACTIONS)
+        else:
+            mask[:COMBAT_OFFSET] = [True] * COMBAT_OFFSET
+            mask[MENU_ACTIONS.index("fight_boss")] = self.game.final
+        return mask
+
+    def step(self, action: int) -> Tuple[np.ndarray, float, bool, Dict[str, Any]]:
+        reward, done, info = self._step(action)
+        return self.observation(), reward, done, info
+
+    def _step(self, action: int) -> Tuple[float, bool, Dict[str, Any]]:
+        if self.prompt is None:
+            raise RuntimeError("The episode is over; call reset()")
+        action = int(action)
+        in_combat = self.prompt.kind == "combat"
+        if in_combat and COMBAT_OFFSET <= action < len(ACTIONS):
+            answer = str(action - COMBAT_OFFSET + 1)
+        elif not in_combat and 0 <= action < COMBAT_OFFSET:
+            answer = str(action + 1)
+        else:
+            answer = ""
+        self._send(answer)
+        self._advance()
+
+        game = self.game
+        completed = len(game.player.quests_completed)
+        reward = (completed - self._quests_completed) * self.quest_reward
+        self._quests_completed = completed
+        died = game.player.health <= 0
+        won = completed == len(game.quests)
+        if died:
+            reward += self.death_penalty
+        elif won:
+            reward += self.win_reward
+        truncated = self.prompt is not None and game.turns >= self.max_turns
+        done = self.prompt is None or truncated
+        info = {"invalid": answer == "", "turns": game.turns, "died": died, "won": won, "truncated": truncated}
+        return reward, done, info
+
+    def observation(self) -> np.ndarray:
+        return np.array(self.features(), dtype=np.float32)
+
+    def features(self) -> List[float]:
+        """The observation as a plain list, laid out as in observation_names()"""
+        game = self.game
+        world = game.world
+        player = game.player
+        in_combat = self.prompt is not None and self.prompt.kind == "combat"
+        enemy = game.enemy if in_combat else None
+        features = [player.health, player.max_health, player.strength, player.agility, player.magic,
+                    float(game.final), float(in_combat), enemy["current_health"] if enemy else 0]
+
+        locations = [0.0] * len(world.locations)
+        locations[player.current_location] = 1.0
+        enemies = [0.0] * len(world.enemies)
+        if enemy:
+            enemies[world.enemy_ids[enemy["name"]]] = 1.0
+        items = [0.0] * len(world.items)
+        for item, count in player.inventory.grouped():
+            items[item] = count
+        features += locations
+        features += enemies
+        features += items
+
+        tracker = game.quest_tracker
+        progress = player.quest_progress
+        for quest in range(len(world.quests)):
+            if quest in player.quests_completed:
+                status = COMPLETED
+            elif quest in player.active_quests:
+                status = ACTIVE
+            elif tracker.is_available(quest):
+                status = AVAILABLE
+            else:
+                status = LOCKED
+            features += (status, progress.get(quest, 0))
+        return features
+
+
+class VectorEnv:
+    """Many GameEnvs stepped in lockstep with batched NumPy observations"""
+    def __init__(self, num_envs: int, seed: int = 0, **env_options):
+        seeds = random.Random(seed)
+        self.envs = [GameEnv(seed=seeds.getrandbits(64), **env_options) for _ in range(num_envs)]
+        self.num_envs = num_envs
+
+    def reset(self) -> np.ndarray:
+        return np.array([env.reset() for env in self.envs], dtype=np.float32)
+
+    def action_masks(self) -> np.ndarray:
+        return np.array([env.action_mask() for env in self.envs], dtype=bool)
+
+    def step(self, actions: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """Step every game; finished games are reset and their last observation put in info"""
+        rows = []
+        rewards = np.empty(self.num_envs, dtype=np.float32)
+        dones = np.empty(self.num_envs, dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            reward, done, info = env._step(action)
+            features = env.features()
+            if done:
+                info["final_observation"] = np.array(features, dtype=np.float32)
+                env.reset()
+                features = env.features()
+            rows.append(features)
+            rewards[i] = reward
+            dones[i] = done
+            infos.append(info)
+        return np.array(rows, dtype=np.float32), rewards, dones, infos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure environment steps per second")
+    parser.add_argument("--envs", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vector = VectorEnv(args.envs, args.seed)
+    observations = vector.reset()
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    episodes = 0
+    for _ in range(args.steps):
+        # Random valid action for every game, never quitting
+        scores = rng.random((args.envs, len(ACTIONS))) * vector.action_masks()
+        scores[:, MENU_ACTIONS.index("quit")] = 0
+        observations, rewards, dones, infos = vector.step(scores.argmax(axis=1))
+        episodes += int(dones.sum())
+    elapsed = time.perf_counter() - start
+    steps = args.envs * args.steps
+    print(f"{args.envs} games x {args.steps} steps in {elapsed:.2f}s: {steps / elapsed:.0f} steps/s")
+    print(f"Observation size {observations.shape[1]}, {episodes} episodes finished")
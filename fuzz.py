@@ -0,0 +1,377 @@
+"""Coverage-guided fuzzer for the prompts of The Crystal Kingdoms.
+
+A test case is a game seed plus the answers typed at successive prompts.
+Each execution plays a fresh headless game on those answers until they run
+out, with a line tracer limited to AI_edited_rpg.py. Cases that run a line
+no earlier case ran join the corpus and are mutated further:
+answers are replaced or inserted from a dictionary of awkward inputs,
+deleted, repeated (which finds unbounded recursion) or spliced with other
+cases, and the seed is changed now and then. Cases are capped at
+MAX_ANSWERS answers, which keeps executions short. Playing the game is most
+of the cost, about 80µs an answer against 45µs to build the game, so one
+worker runs 100-150 executions a second on cases of 75 answers on average.
+
+Any exception other than running out of answers is a crash. Crashes are
+grouped by exception type and the game line that raised it, minimized with
+delta debugging and saved as replay.py session logs, so
+`python replay.py crashes/<name>.log` reproduces one with a traceback.
+Recursion is not run until the real stack overflows: a game whose stack
+grows MAX_DEPTH frames deeper than where the execution started is stopped
+with a RecursionError. Its log records MAX_DEPTH, so replay.py stops the
+game at the same prompt, and repeating its answers makes the stack
+overflow for real.
+
+Run `python fuzz.py --duration 3600 --workers 8 --corpus corpus`; the
+workers share new cases through the corpus directory, and corpus and crashes
+are loaded again on the next run.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import AI_edited_rpg
+from AI_edited_rpg import run_sync
+from headless import QuietGame
+from pacing import TurboPacer
+from replay import SessionLog, check_depth, generate, stack_depth
+
+GAME_FILE = AI_edited_rpg.__file__
+TOKENS = (
+    "", " ", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "99", "-1", "+1", "1_0", "01",
+    " 1 ", "1.5", "1e3", "０", "٣", "y", "n", "Y", "N", "yes", "no", "x", "warrior", "mage", "rogue",
+    "WARRIOR", "\t", "é", "9" * 30,
+)
+MAX_ANSWERS = 300
+# Frames the game may stack up in one execution; without recursion prompts are asked under 10 deep
+MAX_DEPTH = 50
+
+Case = Tuple[int, List[str]]
+
+
+class OutOfAnswers(Exception):
+    """Ends an execution: the case has no answers left"""
+
+
+class FuzzIO:
+    """Feeds a case's answers to the game and notes which prompt took each one.
+
+    A prompt asked more than max_depth frames deep raises RecursionError.
+    """
+    __slots__ = ("answers", "kinds", "max_depth")
+
+    def __init__(self, answers: Sequence[str], max_depth: int):
+        self.answers = answers
+        self.kinds: List[str] = []
+        self.max_depth = max_depth
+
+    async def ask(self, kind: str, prompt: str) -> str:
+        check_depth(self.max_depth)
+        if len(self.kinds) >= len(self.answers):
+            raise OutOfAnswers
+        answer = self.answers[len(self.kinds)]
+        self.kinds.append(kind)
+        return answer
+
+    def say(self, text: str):
+        pass
+
+
+class LineTracer:
+    """Line coverage of one source file, accumulated over many executions.
+
+    Once every line of a function has been seen, the function is no longer
+    traced, so the cost of tracing falls as coverage saturates. Functions in
+    `ignore` are never traced.
+    """
+    def __init__(self, filename: str, ignore: Sequence[Callable] = ()):
+        self.filename = filename
+        self.lines: Set[int] = set()
+        self.new: List[int] = []
+        self.unseen: Dict[Any, Set[int]] = {function.__code__: set() for function in ignore}
+
+    def _call(self, frame, event, arg):
+        code = frame.f_code
+        unseen = self.unseen.get(code)
+        if unseen is None:
+            if code.co_filename != self.filename:
+                self.unseen[code] = set()
+                return None
+            unseen = self.unseen[code] = {line for _, _, line in code.co_lines()
+                                          if line is not None and line != code.co_firstlineno
+                                          and line not in self.lines}
+        if not unseen:
+            return None
+
+        def trace_line(frame, event, arg):
+            if event == "line" and frame.f_lineno in unseen:
+                unseen.discard(frame.f_lineno)
+                self.new.append(frame.f_lineno)
+                if not unseen:
+                    return None
+            return trace_line
+        return trace_line
+
+    def __enter__(self):
+        self.new = []
+        sys.settrace(self._call)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.settrace(None)
+        self.lines.update(self.new)
+
+
+def crash_signature(error: BaseException) -> str:
+    """Exception type and the innermost game line in its traceback.
+
+    For a stack overflow the innermost line is wherever the stack happened to
+    run out, so the line repeated most often, the recursive call, is used.
+    """
+    frames = traceback.extract_tb(error.__traceback__)
+    game_frames = [(frame.name, frame.lineno) for frame in frames if frame.filename == GAME_FILE]
+    game_frames = game_frames or [(frame.name, frame.lineno) for frame in frames]
+    if not game_frames:
+        return f"{type(error).__name__}@?"
+    if isinstance(error, RecursionError):
+        name, line = Counter(game_frames).most_common(1)[0][0]
+    else:
+        name, line = game_frames[-1]
+    return f"{type(error).__name__}@{name}:{line}"
+
+
+def execute(seed: int, answers: Sequence[str], tracer: Optional[LineTracer] = None
+            ) -> Tuple[Optional[BaseException], FuzzIO]:
+    """Play one case; returns the crash, if any, and the io with the prompts answered"""
+    io = FuzzIO(answers, stack_depth() + MAX_DEPTH)
+    game = QuietGame(io=io, rng=random.Random(seed), pacer=TurboPacer(history=1))
+    error = None
+    try:
+        if tracer is None:
+            run_sync(game.start_game())
+        else:
+            with tracer:
+                run_sync(game.start_game())
+    except OutOfAnswers:
+        pass
+    except Exception as exception:  # RecursionError included
+        error = exception
+    return error, io
+
+
+def ddmin(answers: List[str], fails: Callable[[List[str]], bool], max_tests: int = 500) -> List[str]:
+    """Delta debugging: a smaller list of answers for which fails() still holds.
+
+    Gives up after max_tests calls of fails(); a case that needs almost all of
+    its answers, like a deep recursion, would otherwise take quadratic time.
+    """
+    granularity = 2
+    tests = 0
+    while len(answers) >= 2 and tests < max_tests:
+        size = max(1, len(answers) // granularity)
+        chunks = [answers[start:start + size] for start in range(0, len(answers), size)]
+        for index in range(len(chunks)):
+            complement = [answer for other, chunk in enumerate(chunks) if other != index for answer in chunk]
+            tests += 1
+            if tests > max_tests:
+                break
+            if fails(complement):
+                answers = complement
+                granularity = max(granularity - 1, 2)
+                break
+        else:
+            if granularity >= len(answers):
+                break
+            granularity = min(len(answers), granularity * 2)
+    return answers
+
+
+def minimize(seed: int, answers: List[str], signature: str, max_tests: int = 400) -> List[str]:
+    """Shrink a crashing case, then simplify its answers, keeping the same crash"""
+    tests = 0
+
+    def fails(candidate: List[str]) -> bool:
+        nonlocal tests
+        tests += 1
+        error, _ = execute(seed, candidate)
+        return error is not None and crash_signature(error) == signature
+
+    answers = ddmin(answers, fails, max_tests // 2)
+    for index, answer in enumerate(answers):
+        if tests >= max_tests:
+            break
+        for simpler in ("", "1"):
+            if simpler != answer:
+                candidate = answers[:index] + [simpler] + answers[index + 1:]
+                if fails(candidate):
+                    answers = candidate
+                    break
+    return answers
+
+
+def to_log(seed: int, answers: Sequence[str]) -> SessionLog:
+    """A replayable log of the answers the game actually asked for"""
+    _, io = execute(seed, answers)
+    return SessionLog(seed, answers=list(zip(io.kinds, answers)), max_depth=MAX_DEPTH)
+
+
+class Fuzzer:
+    def __init__(self, seed: int = 0, corpus_dir: Optional[str] = None, crash_dir: Optional[str] = None):
+        self.rng = random.Random(seed)
+        self.corpus_dir = corpus_dir
+        self.crash_dir = crash_dir
+        self.corpus: List[Tuple[int, List[str], List[str]]] = []  # seed, answers, prompt kinds
+        self.crashes: Dict[str, Case] = {}
+        self.known: Set[str] = set()
+        self.executions = 0
+        self.tracer = LineTracer(GAME_FILE, ignore=(run_sync,))
+        for directory in (corpus_dir, crash_dir):
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def load(self):
+        """Start from the saved corpus, or from a few random sessions, and the known crashes"""
+        if not self.sync():
+            for seed in range(8):
+                self.run_case(seed, [answer for _, answer in generate(seed, 30).answers])
+        if self.crash_dir:
+            # Known crashes are not reported again, unless they have been fixed
+            for name in sorted(os.listdir(self.crash_dir)):
+                log = SessionLog.load(os.path.join(self.crash_dir, name))
+                answers = [answer for _, answer in log.answers]
+                error, _ = execute(log.seed, answers)
+                if error is None:
+                    print(f"{name} no longer crashes")
+                else:
+                    self.crashes[crash_signature(error)] = (log.seed, answers)
+
+    def sync(self) -> int:
+        """Run corpus cases saved since the last sync, e.g. by other workers; returns how many"""
+        if not self.corpus_dir:
+            return 0
+        names = sorted(set(os.listdir(self.corpus_dir)) - self.known)
+        for name in names:
+            self.known.add(name)
+            log = SessionLog.load(os.path.join(self.corpus_dir, name))
+            self.run_case(log.seed, [answer for _, answer in log.answers], save=False)
+        return len(names)
+
+    def run_case(self, seed: int, answers: List[str], save: bool = True):
+        error, io = execute(seed, answers, self.tracer)
+        self.executions += 1
+        if error is not None:
+            if crash_signature(error) in self.crashes:
+                return
+            # A new crash must not depend on the tracer, so it is checked untraced before minimizing
+            error, io = execute(seed, answers)
+            if error is None:
+                return
+            signature = crash_signature(error)
+            if signature not in self.crashes:
+                self.add_crash(signature, seed, answers[:len(io.kinds)])
+            return
+        answers = answers[:len(io.kinds)]
+        if self.tracer.new:
+            self.corpus.append((seed, answers, io.kinds))
+            if save and self.corpus_dir:
+                name = hashlib.blake2b(repr((seed, answers)).encode(), digest_size=8).hexdigest() + ".log"
+                self.known.add(name)
+                SessionLog(seed, answers=list(zip(io.kinds, answers))).save(os.path.join(self.corpus_dir, name))
+
+    def add_crash(self, signature: str, seed: int, answers: List[str]):
+        answers = minimize(seed, answers, signature)
+        self.crashes[signature] = (seed, answers)
+        print(f"New crash {signature}: {len(answers)} answers")
+        if self.crash_dir:
+            name = signature.replace(":", "-") + ".log"
+            to_log(seed, answers).save(os.path.join(self.crash_dir, name))
+
+    def mutate(self, answers: List[str], kinds: List[str]) -> List[str]:
+        rng = self.rng
+        answers = list(answers)
+        if kinds and rng.random() < 0.5:
+            # Pick the kind of prompt first, so rare prompts get their share of odd answers
+            kind = rng.choice(sorted(set(kinds)))
+            answers[rng.choice([i for i, asked in enumerate(kinds) if asked == kind])] = rng.choice(TOKENS)
+        for _ in range(rng.choice((1, 1, 2, 4, 8))):
+            position = rng.randint(0, len(answers))
+            operation = rng.randrange(6)
+            if operation == 0 and answers:
+                answers[min(position, len(answers) - 1)] = rng.choice(TOKENS)
+            elif operation == 1:
+                answers.insert(position, rng.choice(TOKENS))
+            elif operation == 2 and answers:
+                del answers[position:position + rng.randint(1, 8)]
+            elif operation == 3 and answers:
+                start = rng.randrange(len(answers))
+                chunk = answers[start:start + rng.randint(1, 4)]
+                answers[start:start] = chunk * rng.choice((1, 2, 4, 16))
+            elif operation == 4:
+                _, other, _ = rng.choice(self.corpus)
+                cut = rng.randint(0, len(other))
+                answers = answers[:position] + other[cut:]
+            else:
+                answers.append(rng.choice(TOKENS))
+        return answers[:MAX_ANSWERS]
+
+    def step(self):
+        seed, answers, kinds = self.rng.choice(self.corpus)
+        if self.rng.random() < 0.05:
+            seed = self.rng.getrandbits(32)
+        self.run_case(seed, self.mutate(answers, kinds))
+
+    def run(self, duration: float, report_every: float = 10.0, label: str = ""):
+        start = last_report = time.perf_counter()
+        executions = self.executions
+        while time.perf_counter() - start < duration:
+            self.step()
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                self.sync()
+                rate = (self.executions - executions) / (now - last_report)
+                print(f"{label}{now - start:7.0f}s  {self.executions} execs ({rate:.0f}/s)  "
+                      f"{len(self.tracer.lines)} lines  corpus {len(self.corpus)}  crashes {len(self.crashes)}",
+                      flush=True)
+                last_report, executions = now, self.executions
+
+
+def fuzz_worker(index: int, seed: int, corpus_dir: Optional[str], crash_dir: Optional[str],
+                duration: float) -> Tuple[int, int, Dict[str, Case]]:
+    """One fuzzing process; workers share cases through the corpus directory"""
+    fuzzer = Fuzzer(seed, corpus_dir, crash_dir)
+    fuzzer.load()
+    fuzzer.run(duration, label=f"[{index}] ")
+    return fuzzer.executions, len(fuzzer.tracer.lines), fuzzer.crashes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuzz the prompts of The Crystal Kingdoms")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", metavar="DIR", help="keep interesting cases in DIR")
+    parser.add_argument("--crashes", metavar="DIR", default="crashes", help="save minimized crashes in DIR")
+    parser.add_argument("--workers", type=int, default=1, help="fuzzing processes sharing one corpus")
+    args = parser.parse_args()
+
+    corpus_dir = args.corpus
+    if corpus_dir is None and args.workers > 1:
+        corpus_dir = tempfile.mkdtemp(prefix="fuzz-corpus-")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(fuzz_worker, index, args.seed + index, corpus_dir, args.crashes, args.duration)
+                   for index in range(args.workers)]
+        results = [future.result() for future in futures]
+    crashes: Dict[str, Case] = {}
+    for _, _, found in results:
+        crashes.update(found)
+    executions = sum(executions for executions, _, _ in results)
+    print(f"{executions} executions ({executions / args.duration:.0f}/s), "
+          f"{max(lines for _, lines, _ in results)} lines covered")
+    for signature, (seed, answers) in sorted(crashes.items()):
+        print(f"  {signature}: seed {seed}, {len(answers)} answers")
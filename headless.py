@@ -0,0 +1,167 @@
+"""Headless mode for The Crystal Kingdoms.
+
+A policy object answers every decision point the game would normally ask the
+player about, and all output goes to a sink instead of the terminal. Games
+use a TurboPacer, so there is no pause between turns and a full playthrough
+runs as fast as the game logic allows.
+
+Run `python headless.py --games 1000` to measure games per second.
+"""
+import argparse
+import random
+import time
+from typing import List, Optional, Sequence
+
+from AI_edited_rpg import CrystalKingdoms, run_sync
+from content import CompiledWorld
+from pacing import TurboPacer
+
+
+class NullSink:
+    """Discards all game output"""
+    def write(self, text: str):
+        pass
+
+
+class CollectingSink:
+    """Keeps all game output in memory"""
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def write(self, text: str):
+        self.lines.append(text)
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+class RandomPolicy:
+    """Answers every prompt with a random but valid choice"""
+    # Attack, defend, use item, flee
+    combat_weights = (6, 2, 1, 1)
+
+    def __init__(self, rng: Optional[random.Random] = None, char_class: Optional[str] = None):
+        self.rng = rng or random.Random()
+        self.char_class = char_class
+
+    def choose(self, kind: str, prompt: str, game: CrystalKingdoms) -> str:
+        rng = self.rng
+        if kind == "name":
+            return "Bot"
+        if kind == "class":
+            return self.char_class or rng.choice(list(game.character_classes))
+        if kind == "action":
+            return rng.choice("123457" if game.final else "12345")
+        if kind == "combat":
+            return rng.choices("1234", weights=self.combat_weights)[0]
+        if kind == "item":
+            return str(rng.randint(0, len(game.player.inventory)))
+        if kind == "location":
+            exits = len(game.world.graph.exits(game.player.current_location))
+            return str(rng.randint(1, exits)) if exits else "0"
+        if kind == "npc":
+            return str(rng.randint(1, len(game.locations[game.player.current_location].npcs)))
+        if kind in ("turn_in", "accept_quest", "quit"):
+            return "y"
+        return "n"
+
+
+class ScriptedPolicy:
+    """Replays a fixed list of answers in order"""
+    def __init__(self, answers: Sequence[str]):
+        self.answers = list(answers)
+        self.position = 0
+
+    def choose(self, kind: str, prompt: str, game: CrystalKingdoms) -> str:
+        if self.position >= len(self.answers):
+            raise EOFError(f"Script ran out of answers at a '{kind}' prompt")
+        answer = self.answers[self.position]
+        self.position += 1
+        return answer
+
+
+class QuietGame(CrystalKingdoms):
+    """The game with its status screen switched off, for drivers that never show it"""
+    def show_status(self):
+        pass
+
+
+class Prompt:
+    """What the game awaits at a prompt under PromptIO: suspends the game until its driver answers"""
+    __slots__ = ("kind", "text")
+
+    def __init__(self, kind: str, text: str):
+        self.kind = kind
+        self.text = text
+
+    def __await__(self):
+        return (yield self)
+
+
+class PromptIO:
+    """Game I/O for drivers that step the game coroutine themselves.
+
+    Every prompt is yielded out of the coroutine as a Prompt; resume the
+    coroutine with coroutine.send(answer). Output is discarded.
+    """
+    def ask(self, kind: str, prompt: str) -> Prompt:
+        return Prompt(kind, prompt)
+
+    def say(self, text: str):
+        pass
+
+
+class HeadlessIO:
+    """Game I/O that asks a policy instead of the player"""
+    def __init__(self, policy, sink=None):
+        self.policy = policy
+        self.sink = sink or NullSink()
+        self.game: Optional[CrystalKingdoms] = None
+
+    async def ask(self, kind: str, prompt: str) -> str:
+        self.sink.write(prompt)
+        return self.policy.choose(kind, prompt, self.game)
+
+    def say(self, text: str):
+        self.sink.write(text)
+
+
+def new_game(policy, sink=None, rng: Optional[random.Random] = None,
+             world: Optional[CompiledWorld] = None) -> CrystalKingdoms:
+    """Create a game wired to a policy and an output sink"""
+    io = HeadlessIO(policy, sink)
+    game = CrystalKingdoms(io=io, rng=rng, world=world, pacer=TurboPacer())
+    io.game = game
+    return game
+
+
+def play(policy, sink=None, max_turns: Optional[int] = 1000,
+         rng: Optional[random.Random] = None, world: Optional[CompiledWorld] = None) -> CrystalKingdoms:
+    """Play one game from character creation until it ends or max_turns is reached"""
+    game = new_game(policy, sink, rng, world)
+    run_sync(game.create_character())
+    run_sync(game.game_loop(max_turns))
+    return game
+
+
+def benchmark(games: int, max_turns: int = 1000, seed: int = 0) -> float:
+    """Play `games` random playthroughs and return games per second"""
+    rng = random.Random(seed)
+    policy = RandomPolicy(random.Random(seed))
+    start = time.perf_counter()
+    turns = 0
+    for _ in range(games):
+        turns += play(policy, max_turns=max_turns, rng=rng).turns
+    elapsed = time.perf_counter() - start
+    print(f"{games} games, {turns} turns in {elapsed:.3f}s")
+    print(f"{games / elapsed:.1f} games/s, {turns / elapsed:.0f} turns/s")
+    return games / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless Crystal Kingdoms playthroughs")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    benchmark(args.games, args.max_turns, args.seed)
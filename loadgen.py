@@ -0,0 +1,160 @@
+"""Load generator for server.py.
+
+Opens many concurrent sessions that play with random answers and measures
+two latencies on the client side:
+
+- response latency: from sending an answer until the server's next prompt
+  arrives, i.e. one step of a turn (an action, a combat round, a menu)
+- turn latency: from choosing an action until the next action prompt,
+  covering every step of the turn plus the server's turn delay, if any
+
+Bots answer instantly, so neither number includes thinking time. Idle
+sessions (--idle) connect and then sit at the name prompt, like players who
+walked away.
+
+Run `python loadgen.py --spawn --clients 1000 --idle 2000` to test an
+in-process server, or point --host/--port at a running `server.py`.
+"""
+import argparse
+import asyncio
+import random
+import re
+import resource
+import time
+from typing import List, Optional
+
+from server import GO_AHEAD, GameServer
+
+OPTION = re.compile(rb"^\s*(\d+)\. ", re.MULTILINE)
+COMBAT_WEIGHTS = (6, 2, 1, 1)
+
+
+class Stats:
+    def __init__(self):
+        self.responses: List[float] = []
+        self.turns: List[float] = []
+        self.finished = 0
+        self.died = 0
+        self.errors = 0
+
+
+def _answer(output: bytes, rng: random.Random, quitting: bool) -> str:
+    """Pick an answer for the prompt at the end of output"""
+    prompt = output[output.rfind(b"\n") + 1:]
+    if b"name" in prompt:
+        return "Bot"
+    if b"class" in prompt:
+        return rng.choice(("warrior", "mage", "rogue"))
+    if b"What would you like to do" in prompt:
+        if quitting:
+            return "6"
+        return rng.choice("123457" if b"\n7. " in output else "12345")
+    if b"Choose your action" in prompt:
+        return rng.choices("1234", weights=COMBAT_WEIGHTS)[0]
+    if b"(0 to cancel)" in prompt:
+        options = OPTION.findall(output)
+        return str(rng.randint(1, len(options))) if options else "0"
+    if b"throw it away" in prompt:
+        return "n"
+    return "y"
+
+
+async def play_session(host: str, port: int, turns: int, stats: Stats, rng: random.Random):
+    try:
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    except OSError:
+        stats.errors += 1
+        return
+    turns_played = 0
+    turn_started: Optional[float] = None
+    sent = time.perf_counter()
+    try:
+        while True:
+            try:
+                output = await reader.readuntil(GO_AHEAD)
+            except asyncio.IncompleteReadError as end:
+                stats.finished += 1
+                stats.died += b"fallen in battle" in end.partial
+                break
+            now = time.perf_counter()
+            stats.responses.append(now - sent)
+            output = output[:-len(GO_AHEAD)].replace(b"\r\n", b"\n")
+            if b"What would you like to do" in output:
+                if turn_started is not None:
+                    stats.turns.append(now - turn_started)
+                turn_started = now
+                turns_played += 1
+            answer = _answer(output, rng, turns_played > turns)
+            sent = time.perf_counter()
+            writer.write(answer.encode() + b"\r\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError):
+        stats.errors += 1
+    finally:
+        writer.close()
+
+
+async def idle_session(host: str, port: int, opened: List[asyncio.StreamWriter], stats: Stats):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        await reader.readuntil(GO_AHEAD)
+    except (OSError, asyncio.IncompleteReadError):
+        stats.errors += 1
+        return
+    opened.append(writer)
+
+
+def percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "no samples"
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {p50 * 1000:.2f} ms  p99 {p99 * 1000:.2f} ms  max {samples[-1] * 1000:.2f} ms"
+
+
+async def run(host: str, port: int, clients: int, idle: int, turns: int, seed: int, spawn: bool):
+    server = None
+    if spawn:
+        server = GameServer(host, 0, max_sessions=clients + idle, seed=seed)
+        await server.start()
+        port = server.port
+
+    stats = Stats()
+    idle_writers: List[asyncio.StreamWriter] = []
+    await asyncio.gather(*(idle_session(host, port, idle_writers, stats) for _ in range(idle)))
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(play_session(host, port, turns, stats, random.Random(rng.getrandbits(64)))
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{clients} active and {len(idle_writers)} idle sessions, {stats.errors} errors")
+    print(f"{len(stats.turns)} turns in {elapsed:.2f}s ({len(stats.turns) / elapsed:.0f} turns/s), "
+          f"{stats.died} players died")
+    print(f"Response latency: {percentiles(stats.responses)}")
+    print(f"Turn latency:     {percentiles(stats.turns)}")
+    if server is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"Peak RSS (server and clients together): {peak:.1f} MiB")
+
+    for writer in idle_writers:
+        writer.close()
+    if server is not None:
+        while server.active:  # let the server notice every disconnect before shutting down
+            await asyncio.sleep(0.01)
+        server.server.close()
+        await server.server.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Crystal Kingdoms server latency under load")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--clients", type=int, default=100, help="sessions that play")
+    parser.add_argument("--idle", type=int, default=0, help="sessions that connect and never answer")
+    parser.add_argument("--turns", type=int, default=50, help="turns each playing session takes before quitting")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn", action="store_true", help="run the server in this process on a free port")
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port, args.clients, args.idle, args.turns, args.seed, args.spawn))
@@ -0,0 +1,57 @@
+"""Memory use of Crystal Kingdoms characters.
+
+Run `python memory_report.py --items 5000` to see how much memory a character
+holding that many found items takes, compared with plain lists.
+"""
+import argparse
+import random
+import sys
+from dataclasses import fields
+from typing import Optional, Set
+
+from AI_edited_rpg import Character, CrystalKingdoms, Inventory, QuestList, QuestProgress
+
+
+def deep_getsizeof(obj, seen: Optional[Set[int]] = None) -> int:
+    """Size in bytes of obj and everything it references, counting shared objects once"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(key, seen) + deep_getsizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(item, seen) for item in obj)
+    else:
+        if hasattr(obj, "__dict__"):
+            size += deep_getsizeof(vars(obj), seen)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                size += deep_getsizeof(getattr(obj, slot), seen)
+    return size
+
+
+def character_memory(character: Character) -> int:
+    """Bytes used by one character, field by field"""
+    seen: Set[int] = set()
+    return sum(deep_getsizeof(getattr(character, field.name), seen) for field in fields(character))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report memory used per character")
+    parser.add_argument("--items", type=int, default=5000, help="number of items in the inventory")
+    args = parser.parse_args()
+
+    game = CrystalKingdoms()
+    rng = random.Random(0)
+    found = [rng.randrange(len(game.items)) for _ in range(args.items)]
+    character = Character("Bot", "warrior", 100, 100, 8, 5, 2, found, 0, [], [], [], QuestProgress())
+    as_lists = character_memory(character)
+
+    character.inventory = Inventory(found)
+    character.quests_completed, character.active_quests = QuestList(), QuestList()
+    print(f"Character with {args.items} items")
+    print(f"  list-backed:      {as_lists:>10,} bytes")
+    print(f"  Inventory-backed: {character_memory(character):>10,} bytes")
@@ -0,0 +1,104 @@
+"""Turn pacing for The Crystal Kingdoms.
+
+A pacer decides how long to wait after each turn and timestamps every turn,
+so the time spent running game logic can be measured separately from the
+artificial delay between turns.
+
+- RealTimePacer sleeps for a fixed delay, blocking the thread (console play)
+- TurboPacer never waits (headless runs, simulations)
+- AsyncPacer waits with asyncio.sleep, so other sessions keep running (server)
+
+The game loop awaits end_turn_async(); end_turn() is the blocking
+equivalent for callers that drive turns themselves.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, NamedTuple, Optional
+
+
+class TurnRecord(NamedTuple):
+    turn: int
+    started: float
+    finished: float
+    delay: float
+
+    @property
+    def latency(self) -> float:
+        """Seconds spent running the turn itself, without the delay"""
+        return self.finished - self.started
+
+
+class Pacer:
+    """Timestamps turns; subclasses decide how to wait between them"""
+    def __init__(self, delay: float = 0.0, history: int = 1000):
+        self.delay = delay
+        self.records: Deque[TurnRecord] = deque(maxlen=history)
+        self._started: Optional[float] = None
+
+    def start_turn(self):
+        self._started = time.perf_counter()
+
+    def finish_turn(self, turn: int) -> float:
+        """Record the end of the turn and return how long to wait before the next one"""
+        finished = time.perf_counter()
+        started = finished if self._started is None else self._started
+        self.records.append(TurnRecord(turn, started, finished, self.delay))
+        self._started = None
+        return self.delay
+
+    def end_turn(self, turn: int):
+        """Finish the turn and wait, blocking the thread"""
+        delay = self.finish_turn(turn)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def end_turn_async(self, turn: int):
+        """Finish the turn and wait without blocking the event loop"""
+        delay = self.finish_turn(turn)
+        await asyncio.sleep(delay)
+
+    def summary(self) -> Dict[str, float]:
+        """Turn latency statistics over the recorded turns, in seconds"""
+        latencies = sorted(record.latency for record in self.records)
+        if not latencies:
+            return {"turns": 0}
+        return {
+            "turns": len(latencies),
+            "mean": sum(latencies) / len(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            "max": latencies[-1],
+            "delay": sum(record.delay for record in self.records),
+        }
+
+
+class RealTimePacer(Pacer):
+    """Waits a fixed delay after every turn, like the classic console game"""
+    def __init__(self, delay: float = 1.5, history: int = 1000):
+        super().__init__(delay, history)
+
+    async def end_turn_async(self, turn: int):
+        # Blocks on purpose, so the console game can run without an event loop
+        self.end_turn(turn)
+
+
+class TurboPacer(Pacer):
+    """Never waits between turns"""
+    def __init__(self, history: int = 1000):
+        super().__init__(0.0, history)
+
+    def end_turn(self, turn: int):
+        self.finish_turn(turn)
+
+    async def end_turn_async(self, turn: int):
+        self.finish_turn(turn)
+
+
+class AsyncPacer(Pacer):
+    """Waits with asyncio.sleep; end_turn() refuses to block the thread"""
+    def __init__(self, delay: float = 1.5, history: int = 1000):
+        super().__init__(delay, history)
+
+    def end_turn(self, turn: int):
+        raise RuntimeError("AsyncPacer only supports end_turn_async(); run the game under asyncio")
@@ -0,0 +1,187 @@
+"""Content packs: a world loaded from a JSON or TOML file.
+
+A pack holds the same tables as the constants in AI_edited_rpg.py, under
+compile_world()'s argument names: character_classes, items, locations,
+enemies and quest_data, plus optional boss, start_location and
+starting_items. `python packs.py --export-default world.json` writes the
+built-in world as a pack and `python worldgen.py --output world.json` a
+generated one. TOML has no null, so a quest without a reward leaves
+"reward" out. A pack in which no location has "exits" is played with every
+location one move from every other, as before the location graph.
+
+Parsing and checking a multi-megabyte pack costs far more than starting a
+process, so load_pack() keeps every compiled world in a pickle cache, in
+__packcache__ next to the pack by default. The cache file is named after a
+hash of the pack's bytes and CACHE_VERSION, so an edited pack misses the
+cache and is compiled again; bump CACHE_VERSION when the compiled records
+change. Pickles run code when loaded, so only use cache directories nobody
+else can write to. Within a process each pack is loaded once and its world
+shared.
+
+load_pack() also opens memory-mapped world stores (*.world, see
+worldstore.py), so anything that takes a pack takes a store.
+
+Run `python packs.py world.json` to compile and cache a pack and compare
+loading it from source with loading it from the cache.
+"""
+import argparse
+import gc
+import hashlib
+import json
+import os
+import pickle
+import time
+from typing import Dict, Optional
+
+from content import CompiledWorld, ContentError, compile_world, completability_problems
+from worldstore import SUFFIX as STORE_SUFFIX, WorldStore
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+CACHE_VERSION = 5
+TABLES = ("character_classes", "items", "locations", "enemies", "quest_data")
+OPTIONS = ("boss", "start_location", "starting_items")
+
+_loaded: Dict[str, CompiledWorld] = {}
+
+
+def parse_pack(data: bytes, path: str) -> dict:
+    """The tables of a pack file; TOML if path ends in .toml, JSON otherwise"""
+    try:
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise ContentError(f"{path}: TOML packs need Python 3.11 or later")
+            tables = tomllib.loads(data.decode("utf-8"))
+        else:
+            tables = json.loads(data)
+    except (ValueError, UnicodeDecodeError) as error:  # JSONDecodeError and TOMLDecodeError are ValueErrors
+        raise ContentError(f"{path}: {error}") from None
+    if not isinstance(tables, dict):
+        raise ContentError(f"{path}: a pack must be a table of tables")
+    missing = [name for name in TABLES if name not in tables]
+    unknown = [name for name in tables if name not in TABLES + OPTIONS]
+    if missing or unknown:
+        raise ContentError(f"{path}: missing tables {missing}, unknown keys {unknown}")
+    return tables
+
+
+def compile_pack(data: bytes, path: str) -> CompiledWorld:
+    tables = parse_pack(data, path)
+    try:
+        return compile_world(**tables)
+    except (KeyError, TypeError, AttributeError) as error:  # a field missing or of the wrong type
+        raise ContentError(f"{path}: malformed entry ({error!r})") from None
+    except ContentError as error:
+        raise ContentError(f"{path}: {error}") from None
+
+
+def pack_key(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16, person=f"pack-v{CACHE_VERSION}".encode()).hexdigest()
+
+
+def cache_path(path: str, key: str, cache_dir: Optional[str] = None) -> str:
+    directory = cache_dir or os.path.join(os.path.dirname(path) or ".", "__packcache__")
+    return os.path.join(directory, f"{os.path.basename(path)}.{key}.pickle")
+
+
+def _read_cache(path: str) -> Optional[CompiledWorld]:
+    collecting = gc.isenabled()
+    gc.disable()  # the cache is one big tree of tuples; collecting while it loads only wastes time
+    try:
+        with open(path, "rb") as file:
+            world = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError, ValueError):
+        return None  # damaged or from an incompatible version; compile again
+    finally:
+        if collecting:
+            gc.enable()
+    return world if isinstance(world, CompiledWorld) else None
+
+
+def _write_cache(path: str, world: CompiledWorld):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        pickle.dump(world, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)  # readers in other processes never see a partial file
+
+
+def load_pack(path: str, cache_dir: Optional[str] = None, use_cache: bool = True) -> CompiledWorld:
+    """The compiled world of a pack, from the cache when the pack has not changed.
+
+    A *.world file is opened as a memory-mapped WorldStore instead. Raises
+    ContentError if the pack is malformed. Failing to write the cache is
+    not an error; the world is just compiled again next time.
+    """
+    if path.endswith(STORE_SUFFIX):
+        key = os.path.realpath(path)
+        world = _loaded.get(key)
+        if world is None:
+            world = _loaded[key] = WorldStore(path)
+        return world
+    with open(path, "rb") as file:
+        data = file.read()
+    key = pack_key(data)
+    world = _loaded.get(key)
+    if world is not None:
+        return world
+    cached = cache_path(path, key, cache_dir)
+    world = _read_cache(cached) if use_cache else None
+    if world is None:
+        world = compile_pack(data, path)
+        if use_cache:
+            try:
+                _write_cache(cached, world)
+            except OSError:
+                pass
+    _loaded[key] = world
+    return world
+
+
+def export_default(path: str):
+    """Write the built-in world as a JSON pack"""
+    import AI_edited_rpg
+    tables = {
+        "character_classes": AI_edited_rpg.CHARACTER_CLASSES, "items": AI_edited_rpg.ITEMS,
+        "locations": AI_edited_rpg.LOCATIONS, "enemies": AI_edited_rpg.ENEMIES,
+        "quest_data": AI_edited_rpg.QUEST_DATA, "boss": "Emperor SkekSo", "start_location": "crystal_cave",
+        "starting_items": ["health_potion"],
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(tables, file, indent=2, default=dict)  # default turns the frozen mappingproxies into dicts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile and cache Crystal Kingdoms content packs")
+    parser.add_argument("packs", nargs="*", help="JSON or TOML content packs")
+    parser.add_argument("--cache-dir", help="where to keep compiled packs (default: __packcache__ beside each pack)")
+    parser.add_argument("--check", action="store_true", help="also check that each world can be finished")
+    parser.add_argument("--export-default", metavar="FILE", help="write the built-in world as a JSON pack")
+    args = parser.parse_args()
+
+    if args.export_default:
+        export_default(args.export_default)
+        print(f"Wrote the built-in world to {args.export_default}")
+    for pack in args.packs:
+        with open(pack, "rb") as file:
+            data = file.read()
+        start = time.perf_counter()
+        world = compile_pack(data, pack)
+        compiled = time.perf_counter()
+        cached = cache_path(pack, pack_key(data), args.cache_dir)
+        _write_cache(cached, world)
+        start_cached = time.perf_counter()
+        _read_cache(cached)
+        loaded = time.perf_counter()
+        print(f"{pack}: {len(data) / 1e6:.1f}MB, {len(world.quests)} quests, {len(world.locations)} locations")
+        print(f"  parse and compile {(compiled - start) * 1e3:.1f}ms, "
+              f"load from cache {(loaded - start_cached) * 1e3:.1f}ms "
+              f"({os.path.getsize(cached) / 1e6:.1f}MB at {cached})")
+        if args.check:
+            problems = completability_problems(world)
+            print("  completable" if not problems else "  not completable:\n    " + "\n    ".join(problems))
@@ -0,0 +1,165 @@
+"""Status screen rendering for The Crystal Kingdoms.
+
+The Renderer builds the whole status screen into one string so the game can
+write it out in a single call per turn. Display names are computed once per
+ID, and sections that rarely change (the action menu, completed and
+available quests) are cached until their inputs change. Only the first
+AVAILABLE_SHOWN available quests are listed, so a world with a million open
+quests does not put them all on screen.
+"""
+from itertools import chain
+from typing import Any, Dict, List, Tuple
+
+from content import NO_ID, CompiledWorld
+
+RULE = "=" * 50
+AVAILABLE_SHOWN = 20  # available quests listed on the status screen; the rest are counted
+ACTIONS = ("Explore", "Use item", "Move to new location", "Rest", "Talk to NPCs", "Quit game")
+
+
+class Renderer:
+    def __init__(self, world: CompiledWorld):
+        self.world = world
+        self._item_titles: Dict[int, str] = {}
+        self._item_labels: Dict[int, str] = {}
+        self._location_titles: Dict[int, str] = {}
+        self._menus: Dict[Tuple[bool, bool], str] = {}
+        self._completed: Tuple[object, int, str] = (None, 0, "")
+        self._available: Tuple[object, int, str] = (None, -1, "")
+
+    def item_title(self, item: int) -> str:
+        """Item name as shown in lists, e.g. 'Health Potion'"""
+        title = self._item_titles.get(item)
+        if title is None:
+            title = self._item_titles[item] = self.world.items[item].name.replace('_', ' ').title()
+        return title
+
+    def item_label(self, item: int) -> str:
+        """Item name as used in sentences, e.g. 'health potion'"""
+        label = self._item_labels.get(item)
+        if label is None:
+            label = self._item_labels[item] = self.world.items[item].name.replace('_', ' ')
+        return label
+
+    def location_title(self, location: int) -> str:
+        title = self._location_titles.get(location)
+        if title is None:
+            title = self._location_titles[location] = self.world.locations[location].name.replace('_', ' ').title()
+        return title
+
+    def action_menu(self, final: bool, undo: bool = False) -> str:
+        menu = self._menus.get((final, undo))
+        if menu is None:
+            lines = [RULE, "\nActions:"]
+            lines.extend(f"{key}. {label}" for key, label in self.actions(final, undo))
+            menu = self._menus[(final, undo)] = "\n".join(lines)
+        return menu
+
+    def actions(self, final: bool, undo: bool = False) -> List[Tuple[str, str]]:
+        """(key, label) pairs of the action menu"""
+        actions = [(str(key), label) for key, label in enumerate(ACTIONS, 1)]
+        if final:
+            actions.append(("7", f"Fight {self.world.enemies[self.world.boss].name}"))
+        if undo:
+            actions.append(("8", "Undo last turn"))
+        return actions
+
+    def completed_quests(self, quests_completed) -> str:
+        owner, count, text = self._completed
+        if owner is not quests_completed or count != len(quests_completed):
+            text = "\n".join(chain(["\n=== Completed Quests ==="],
+                                   (f"✓ {self.world.quests[quest].name}" for quest in quests_completed)))
+            self._completed = (quests_completed, len(quests_completed), text)
+        return text
+
+    def available_quests(self, tracker) -> str:
+        owner, version, text = self._available
+        if owner is not tracker or version != tracker.version:
+            available = tracker.available(AVAILABLE_SHOWN)
+            more = [f"... and {tracker.count - len(available)} more"] if tracker.count > len(available) else []
+            text = "\n".join(chain(["\n=== Available Quests ==="],
+                                   (f"! {self.world.quests[quest].name}" for quest in available),
+                                   more)) if available else ""
+            self._available = (tracker, tracker.version, text)
+        return text
+
+    def active_quests(self, player) -> List[str]:
+        lines = ["\n=== Active Quests ==="]
+        quests, enemies = self.world.quests, self.world.enemies
+        for quest_id in player.active_quests:
+            quest = quests[quest_id]
+            progress = player.quest_progress.get(quest_id, 0)
+            lines.append(f"\n- {quest.name} ({progress}/{quest.progress_max})")
+
+            # Show enemy kills needed
+            if quest.enemy_kills:
+                lines.append("  Required kills:")
+                for enemy, count in quest.enemy_kills:
+                    current_kills = min(progress, count)  # Estimate kills based on progress
+                    lines.append(f"  - {enemies[enemy].name}: {current_kills}/{count}")
+
+            # Show items needed
+            if quest.items_needed:
+                lines.append("  Required items:")
+                for item in quest.items_needed:
+                    status = "✓" if item in player.inventory else "✗"
+                    lines.append(f"  - {self.item_label(item)}: {status}")
+
+            # Show reward if any
+            if quest.reward != NO_ID:
+                lines.append(f"  Reward: {self.item_label(quest.reward)}")
+        return lines
+
+    def status_data(self, player, tracker, final: bool, undo: bool = False) -> Dict[str, Any]:
+        """The status screen as plain data, for front ends that draw their own"""
+        quests, enemies = self.world.quests, self.world.enemies
+        active = []
+        for quest_id in player.active_quests:
+            quest = quests[quest_id]
+            progress = player.quest_progress.get(quest_id, 0)
+            active.append({
+                "name": quest.name,
+                "progress": progress,
+                "progress_max": quest.progress_max,
+                "kills": [{"enemy": enemies[enemy].name, "current": min(progress, count), "needed": count}
+                          for enemy, count in quest.enemy_kills],
+                "items": [{"item": self.world.items[item].name, "have": item in player.inventory}
+                          for item in quest.items_needed],
+                "reward": None if quest.reward == NO_ID else self.world.items[quest.reward].name,
+            })
+        return {
+            "name": player.name,
+            "char_class": player.char_class,
+            "location": self.world.locations[player.current_location].name,
+            "health": player.health,
+            "max_health": player.max_health,
+            "strength": player.strength,
+            "agility": player.agility,
+            "magic": player.magic,
+            "inventory": [{"item": self.world.items[item].name, "count": count}
+                          for item, count in player.inventory.grouped()],
+            "active_quests": active,
+            "completed_quests": [quests[quest].name for quest in player.quests_completed],
+            "available_quests": [quests[quest].name for quest in tracker.available(AVAILABLE_SHOWN)],
+            "available_quest_count": tracker.count,
+            "actions": [{"key": key, "label": label} for key, label in self.actions(final, undo)],
+        }
+
+    def status(self, player, tracker, final: bool, undo: bool = False) -> str:
+        """The full status screen shown at the start of every turn"""
+        inventory = ", ".join(self.item_title(item) for item in player.inventory)
+        lines = [
+            "\n" + RULE,
+            f"Location: {self.location_title(player.current_location)}",
+            f"Health: {player.health}/{player.max_health}",
+            f"Inventory: {inventory or 'Empty'}",
+        ]
+        if player.active_quests:
+            lines.extend(self.active_quests(player))
+        if player.quests_completed:
+            lines.append(self.completed_quests(player.quests_completed))
+        available = self.available_quests(tracker)
+        if available:
+            lines.append(available)
+        lines.append(self.action_menu(final, undo))
+        return "\n".join(lines)
@@ -0,0 +1,231 @@
+"""Session recording and replay for The Crystal Kingdoms.
+
+A session log holds the game's random seed and every answer the player gave,
+tagged with the kind of prompt it answered (action menu, combat menu, item,
+NPC, y/n questions...). Since all randomness comes from the seeded game RNG,
+seed and answers are enough to reproduce the whole session. The log also
+keeps a digest of the final state, so a replay can check that it ended up
+exactly where the original session did.
+
+The file format is one JSON header line followed by one line per answer:
+a one-letter prompt code, a space, then the answer. Files ending in .gz are
+gzipped. Sessions played on a content pack name the pack in the header, and
+the replay loads it from there. Crash logs saved by fuzz.py also hold the
+depth at which the fuzzer stopped a recursing game, and the replay stops it
+at the same prompt.
+
+Record with `python AI_edited_rpg.py --record session.log` (or
+`server.py --record DIR`), replay with `python replay.py session.log`.
+`python replay.py --generate out.log --seed 1` records a random session.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from AI_edited_rpg import CrystalKingdoms, run_sync
+from headless import QuietGame, RandomPolicy
+from packs import load_pack
+from pacing import TurboPacer
+
+# Bumped whenever the game draws from its RNG differently, so older logs fail
+# to load rather than replay a different game; 2 sampled encounter tables
+# everywhere, 3 draws the old way at locations with the default weights
+FORMAT = 3
+KIND_CODES = {
+    "name": "N", "class": "C", "action": "a", "combat": "c", "item": "i", "location": "l",
+    "npc": "n", "turn_in": "t", "accept_quest": "q", "throw_away": "w", "quit": "x", "rewind": "r",
+}
+CODE_KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+
+class ReplayError(Exception):
+    """The game did not follow the recorded session"""
+
+
+class EndOfLog(EOFError):
+    """The game asked for more answers than the log holds"""
+
+
+@dataclass
+class SessionLog:
+    seed: int
+    undo_depth: int = 0
+    answers: List[Tuple[str, str]] = field(default_factory=list)
+    turns: Optional[int] = None
+    digest: Optional[str] = None
+    pack: Optional[str] = None  # content pack the session was played on, if not the built-in world
+    max_depth: Optional[int] = None  # frames the game's stack may grow by before RecursionError, as fuzz.py plays
+
+    def save(self, path: str):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as file:
+            header = {"format": FORMAT, "seed": self.seed, "undo_depth": self.undo_depth, "turns": self.turns, "digest": self.digest}
+            if self.pack is not None:
+                header["pack"] = self.pack
+            if self.max_depth is not None:
+                header["max_depth"] = self.max_depth
+            file.write(json.dumps(header) + "\n")
+            for kind, answer in self.answers:
+                file.write(f"{KIND_CODES[kind]} {answer}\n")
+
+    @classmethod
+    def load(cls, path: str) -> "SessionLog":
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as file:
+            header = json.loads(file.readline())
+            if header.get("format") != FORMAT:
+                raise ReplayError(f"{path}: unsupported log format {header.get('format')!r} (this version "
+                                  f"replays format {FORMAT}; older logs were played with different random draws)")
+            answers = [(CODE_KINDS[line[0]], line[2:].rstrip("\n")) for line in file]
+        return cls(header["seed"], header.get("undo_depth", 0), answers, header.get("turns"), header.get("digest"),
+                   header.get("pack"), header.get("max_depth"))
+
+
+def state_digest(game: CrystalKingdoms) -> str:
+    """Fingerprint of everything that changes while playing, including the RNG position"""
+    player = game.player
+    state = (
+        player.name, player.char_class, player.health, player.max_health, player.strength,
+        player.agility, player.magic, tuple(player.inventory), player.current_location,
+        tuple(player.story_choices), tuple(player.quests_completed), tuple(player.active_quests),
+        tuple(sorted(player.quest_progress.items())),
+        game.final, game.fighting_skekso, game.game_running, game.turns, game.rng.getstate(),
+    )
+    return hashlib.blake2b(repr(state).encode(), digest_size=16).hexdigest()
+
+
+class RecordingIO:
+    """Wraps another game I/O and logs every answer it returns"""
+    def __init__(self, io, log: SessionLog):
+        self.io = io
+        self.log = log
+
+    async def ask(self, kind: str, prompt: str) -> str:
+        answer = await self.io.ask(kind, prompt)
+        self.log.answers.append((kind, answer))
+        return answer
+
+    def say(self, text: str):
+        self.io.say(text)
+
+
+def finish(log: SessionLog, game: CrystalKingdoms):
+    """Stamp the log with the final state of the recorded game"""
+    log.turns = game.turns
+    log.digest = state_digest(game) if game.player is not None else None
+
+
+def stack_depth() -> int:
+    """Frames on the stack of the caller, itself included"""
+    depth = 0
+    frame = sys._getframe(1)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def check_depth(limit: Optional[int]):
+    """Raise RecursionError if the stack is more than limit frames deep"""
+    if limit is None:
+        return
+    try:
+        sys._getframe(limit)
+    except ValueError:  # the stack is shallower than that
+        return
+    raise RecursionError(f"the stack is more than {limit} frames deep")
+
+
+class ReplayIO:
+    """Answers prompts from a session log, checking that each prompt is the one recorded.
+
+    A prompt asked more than max_depth frames deep raises RecursionError.
+    """
+    __slots__ = ("answers", "position", "max_depth")
+
+    def __init__(self, answers: List[Tuple[str, str]], max_depth: Optional[int] = None):
+        self.answers = answers
+        self.position = 0
+        self.max_depth = max_depth
+
+    async def ask(self, kind: str, prompt: str) -> str:
+        check_depth(self.max_depth)
+        if self.position >= len(self.answers):
+            raise EndOfLog(f"The log ran out at a '{kind}' prompt")
+        recorded, answer = self.answers[self.position]
+        if recorded != kind:
+            raise ReplayError(f"Answer {self.position}: the game asked a '{kind}' prompt, "
+                              f"the log has a '{recorded}' answer")
+        self.position += 1
+        return answer
+
+    def say(self, text: str):
+        pass
+
+
+def replay(log: SessionLog, verify: bool = True) -> CrystalKingdoms:
+    """Re-drive a game from a session log as fast as possible.
+
+    With verify, raises ReplayError unless every answer was used and the
+    final state matches the recorded digest. A log with a max_depth raises
+    RecursionError where the stack grows that many frames past replay()'s.
+    """
+    io = ReplayIO(log.answers, None if log.max_depth is None else stack_depth() + log.max_depth)
+    world = load_pack(log.pack) if log.pack else None
+    game = QuietGame(io=io, rng=random.Random(log.seed), world=world, pacer=TurboPacer(history=1),
+                     undo_depth=log.undo_depth)
+    try:
+        run_sync(game.start_game())
+    except EndOfLog:
+        pass  # the recorded session was cut off here too
+    if verify:
+        if io.position != len(log.answers):
+            raise ReplayError(f"The game ended after {io.position} of {len(log.answers)} answers")
+        if log.turns is not None and game.turns != log.turns:
+            raise ReplayError(f"Replay played {game.turns} turns, the session played {log.turns}")
+        if log.digest is not None and state_digest(game) != log.digest:
+            raise ReplayError("The replayed final state differs from the recorded one")
+    return game
+
+
+def generate(seed: int, max_turns: int = 1000) -> SessionLog:
+    """Record a session played by RandomPolicy"""
+    from headless import HeadlessIO
+    log = SessionLog(seed)
+    io = HeadlessIO(RandomPolicy(random.Random(f"policy:{seed}")))
+    game = CrystalKingdoms(io=RecordingIO(io, log), rng=random.Random(seed), pacer=TurboPacer())
+    io.game = game
+    run_sync(game.create_character())
+    run_sync(game.game_loop(max_turns))
+    finish(log, game)
+    return log
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded Crystal Kingdoms sessions")
+    parser.add_argument("logs", nargs="*", help="session logs to replay")
+    parser.add_argument("--repeat", type=int, default=1, help="replay each log this many times (benchmarking)")
+    parser.add_argument("--generate", metavar="PATH", help="record a random session to PATH instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.generate:
+        log = generate(args.seed, args.max_turns)
+        log.save(args.generate)
+        print(f"Recorded {len(log.answers)} answers over {log.turns} turns to {args.generate}")
+    for path in args.logs:
+        log = SessionLog.load(path)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            game = replay(log)
+        elapsed = time.perf_counter() - start
+        turns = game.turns * args.repeat
+        print(f"{path}: OK, {len(log.answers)} answers, {game.turns} turns; "
+              f"{args.repeat} replays in {elapsed:.3f}s ({turns / elapsed:.0f} turns/s)")
@@ -0,0 +1,188 @@
+"""Weighted encounter and loot tables, sampled in O(1) with the alias method.
+
+Each location has three weighted tables: what exploring it turns up
+(EVENTS: a fight, an item or nothing), which enemy a fight is with, and
+which item is found. compile_world() compiles every table into an
+AliasTable, using Vose's alias method. The table has one slot per entry.
+Each slot holds a probability of keeping its own entry and an alias, the
+entry to use otherwise. A sample is then one random number, whatever the
+number or weights of the entries, where cumulative weights need a scan or
+a bisection. Building a table is O(n).
+
+samples() draws many entries in a plain loop. sample_array() draws them
+in one vectorized pass with NumPy, for batch simulations.
+probabilities() turns a table back into the chance of each entry, which
+is how drop rates are reported. A location with the default weights is
+explored with the draws the game made before these tables, which give the
+same chances, so seeded games play as they always did. Run `python sampling.py [pack]` for the
+effective encounter and drop rates of every location, checked against
+sampled counts.
+"""
+import argparse
+import random
+import time
+from array import array
+from typing import Dict, List, NamedTuple, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # only sample_array() needs it
+    np = None
+
+EVENTS = ("combat", "item", "nothing")
+COMBAT, ITEM, NOTHING = range(len(EVENTS))
+# 70% chance of an event, of which 60% are fights
+DEFAULT_EVENT_WEIGHTS = (42, 28, 30)
+
+
+class AliasTable:
+    """Entries 0..n-1 drawn with chances proportional to their weights, in O(1) per draw"""
+    __slots__ = ("size", "probability", "alias")
+
+    def __init__(self, probability: Sequence[float], alias: Sequence[int]):
+        self.size = len(probability)
+        self.probability = probability
+        self.alias = alias
+
+    @classmethod
+    def build(cls, weights: Sequence[float]) -> "AliasTable":
+        """Raises ValueError on negative weights, or weights that are all zero"""
+        size = len(weights)
+        total = sum(weights)
+        if any(weight < 0 for weight in weights) or size and total <= 0:
+            raise ValueError(f"Weights must be at least 0 and not all 0, not {list(weights)}")
+        scaled = [weight * size / total for weight in weights]
+        probability = array("d", [1.0]) * size
+        alias = array("i", range(size))
+        small = [entry for entry, value in enumerate(scaled) if value < 1.0]
+        large = [entry for entry, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            entry, donor = small.pop(), large.pop()
+            probability[entry] = scaled[entry]
+            alias[entry] = donor
+            scaled[donor] -= 1.0 - scaled[entry]
+            (small if scaled[donor] < 1.0 else large).append(donor)
+        # Whatever is left is within rounding error of 1 and keeps its own slot
+        return cls(probability, alias)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def sample(self, rng: random.Random) -> int:
+        """One entry; raises IndexError if the table is empty"""
+        position = rng.random() * self.size
+        slot = int(position)
+        return slot if position - slot < self.probability[slot] else self.alias[slot]
+
+    def samples(self, rng: random.Random, count: int) -> List[int]:
+        """count entries, drawn as count calls to sample() would draw them"""
+        size, probability, alias = self.size, self.probability, self.alias
+        random_ = rng.random
+        drawn = []
+        for _ in range(count):
+            position = random_() * size
+            slot = int(position)
+            drawn.append(slot if position - slot < probability[slot] else alias[slot])
+        return drawn
+
+    def sample_array(self, generator: "np.random.Generator", count: int) -> "np.ndarray":
+        """count entries as a NumPy array, from a NumPy generator"""
+        if np is None:
+            raise RuntimeError("sample_array() needs NumPy")
+        position = generator.random(count) * self.size
+        slot = position.astype(np.int64)
+        probability = np.asarray(self.probability, dtype=np.float64)
+        alias = np.asarray(self.alias, dtype=np.int64)
+        return np.where(position - slot < probability[slot], slot, alias[slot])
+
+    def probabilities(self) -> List[float]:
+        """The chance of drawing each entry, recovered from the slots"""
+        chances = [0.0] * self.size
+        for slot in range(self.size):
+            chances[slot] += self.probability[slot] / self.size
+            chances[self.alias[slot]] += (1.0 - self.probability[slot]) / self.size
+        return chances
+
+
+def draws_classically(location) -> bool:
+    """Whether the location weighs exploring as the game did before weighted tables.
+
+    That is the default events, with all its enemies and all its items
+    equally likely. Exploring it then makes the old draws (two threshold
+    checks and a choice), so seeds and differential.py play as before.
+    """
+    return (tuple(location.event_weights) == DEFAULT_EVENT_WEIGHTS and len(set(location.enemy_weights)) <= 1
+            and len(set(location.item_weights)) <= 1)
+
+
+class LocationTables(NamedTuple):
+    """The compiled tables of one location; enemy and item draws index its enemies and items"""
+    events: AliasTable
+    enemies: AliasTable
+    items: AliasTable
+    classic: bool = False  # draws_classically(); explore() then draws without the tables
+
+    @classmethod
+    def build(cls, location) -> "LocationTables":
+        return cls(AliasTable.build(location.event_weights), AliasTable.build(location.enemy_weights),
+                   AliasTable.build(location.item_weights), draws_classically(location))
+
+
+def drop_rates(world, location_id: int) -> Dict[str, Dict[str, float]]:
+    """The chance that one exploration of the location finds each enemy and item, by name"""
+    location = world.locations[location_id]
+    tables = world.location_tables[location_id]
+    events = tables.events.probabilities()
+    rates: Dict[str, Dict[str, float]] = {"events": dict(zip(EVENTS, events)), "enemies": {}, "items": {}}
+    for kind, entries, table, event, names in (("enemies", location.enemies, tables.enemies, COMBAT, world.enemies),
+                                               ("items", location.items, tables.items, ITEM, world.items)):
+        for entry, chance in zip(entries, table.probabilities()):
+            name = names[entry].name  # an entry listed twice adds up
+            rates[kind][name] = rates[kind].get(name, 0.0) + events[event] * chance
+    return rates
+
+
+def _sampled_rates(world, location_id: int, count: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    location = world.locations[location_id]
+    tables = world.location_tables[location_id]
+    events = tables.events.samples(rng, count)
+    rates: Dict[str, Dict[str, float]] = {"events": {}, "enemies": {}, "items": {}}
+    for event in range(len(EVENTS)):
+        rates["events"][EVENTS[event]] = events.count(event) / count
+    for kind, entries, table, event, names in (("enemies", location.enemies, tables.enemies, COMBAT, world.enemies),
+                                               ("items", location.items, tables.items, ITEM, world.items)):
+        hits = events.count(event)
+        if not entries:
+            continue
+        for entry in table.samples(rng, hits):
+            name = names[entries[entry]].name
+            rates[kind][name] = rates[kind].get(name, 0.0) + 1 / count
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the encounter and drop rates of every location")
+    parser.add_argument("pack", nargs="?", help="content pack or world store (default: the built-in world)")
+    parser.add_argument("--location", action="append", help="only these locations (repeatable)")
+    parser.add_argument("--samples", type=int, default=100_000, help="explorations sampled per location")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.pack:
+        from packs import load_pack
+        world = load_pack(args.pack)
+    else:
+        from AI_edited_rpg import DEFAULT_WORLD as world
+    rng = random.Random(args.seed)
+    labels = {"events": "event", "enemies": "enemy", "items": "item"}
+    locations = ([world.location_ids[name] for name in args.location] if args.location
+                 else range(len(world.locations)))
+    for location_id in locations:
+        start = time.perf_counter()
+        sampled = _sampled_rates(world, location_id, args.samples, rng)
+        elapsed = time.perf_counter() - start
+        print(f"{world.locations[location_id].name}: {args.samples} explorations sampled in {elapsed * 1e3:.0f}ms")
+        print(f"  {'':32}{'exact':>9}{'sampled':>9}")
+        for kind, rates in drop_rates(world, location_id).items():
+            for name, rate in sorted(rates.items(), key=lambda pair: -pair[1]):
+                print(f"  {labels[kind]:6}{name:<26.26}{rate:9.2%}{sampled[kind].get(name, 0.0):9.2%}")
@@ -0,0 +1,170 @@
+"""Multi-session text server for The Crystal Kingdoms.
+
+Every TCP connection gets its own CrystalKingdoms session, all running as
+asyncio tasks in one process. A prompt is a read on the session's socket, so
+an idle player costs nothing but a small amount of memory: the session's game
+state, a line buffer capped at MAX_LINE bytes and a bounded turn history.
+
+Prompts end with a telnet Go Ahead (IAC GA) so clients can tell where the
+server stops talking and waits for input; ordinary telnet clients ignore it.
+
+Run `python server.py --port 4000` and connect with `telnet localhost 4000`.
+With --record DIR every session is saved as a replay.py session log, and
+with --pack FILE every session plays the world in a content pack.
+"""
+import argparse
+import asyncio
+import os
+import random
+import traceback
+from contextlib import suppress
+from typing import Optional
+
+from AI_edited_rpg import CrystalKingdoms
+from packs import load_pack
+from pacing import AsyncPacer, TurboPacer
+from replay import RecordingIO, SessionLog, finish
+
+IAC, GA = 255, 249
+GO_AHEAD = bytes((IAC, GA))
+MAX_LINE = 1024
+TURN_HISTORY = 64
+
+
+class SessionClosed(Exception):
+    """The player disconnected, went idle or sent garbage"""
+
+
+def _strip_telnet(data: bytes) -> bytes:
+    """Drop telnet commands (IAC sequences) from a line of client input"""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] != IAC:
+            out.append(data[i])
+            i += 1
+        elif data[i + 1:i + 2] == bytes((IAC,)):
+            out.append(IAC)
+            i += 2
+        elif i + 1 < len(data) and 251 <= data[i + 1] <= 254:  # WILL/WONT/DO/DONT <option>
+            i += 3
+        else:
+            i += 2
+    return bytes(out)
+
+
+def _encode(text: str) -> bytes:
+    return text.replace("\n", "\r\n").encode()
+
+
+class SessionIO:
+    """Game I/O over one client connection"""
+    __slots__ = ("reader", "writer", "idle_timeout")
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, idle_timeout: float):
+        self.reader = reader
+        self.writer = writer
+        self.idle_timeout = idle_timeout
+
+    async def ask(self, kind: str, prompt: str) -> str:
+        self.writer.write(_encode(prompt) + GO_AHEAD)
+        try:
+            await self.writer.drain()
+            line = await asyncio.wait_for(self.reader.readline(), self.idle_timeout)
+        except (asyncio.TimeoutError, ConnectionError, ValueError) as error:  # ValueError: line over MAX_LINE
+            raise SessionClosed(kind) from error
+        if not line:
+            raise SessionClosed(kind)
+        if IAC in line:
+            line = _strip_telnet(line)
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    def say(self, text: str):
+        self.writer.write(_encode(text) + b"\r\n")
+
+
+class GameServer:
+    """Accepts connections and runs one game per connection"""
+    def __init__(self, host: str = "127.0.0.1", port: int = 4000, delay: float = 0.0,
+                 idle_timeout: float = 900.0, max_sessions: int = 10_000, seed: Optional[int] = None,
+                 record_dir: Optional[str] = None, pack: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.rng = random.Random(seed)
+        self.record_dir = record_dir
+        self.pack = pack
+        self.world = load_pack(pack) if pack else None
+        self.active = 0
+        self.served = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def new_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    log: Optional[SessionLog] = None) -> CrystalKingdoms:
+        pacer = AsyncPacer(self.delay, TURN_HISTORY) if self.delay > 0 else TurboPacer(TURN_HISTORY)
+        seed = self.rng.getrandbits(64)
+        io = SessionIO(reader, writer, self.idle_timeout)
+        if log is not None:
+            log.seed = seed
+            io = RecordingIO(io, log)
+        return CrystalKingdoms(io=io, rng=random.Random(seed), world=self.world, pacer=pacer)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.active >= self.max_sessions:
+            writer.write(b"The server is full, please try again later.\r\n")
+            writer.close()
+            return
+        self.active += 1
+        self.served += 1
+        number = self.served
+        log = SessionLog(0, pack=self.pack) if self.record_dir else None
+        game = self.new_session(reader, writer, log)
+        try:
+            await game.start_game()
+            await writer.drain()
+        except (SessionClosed, ConnectionError):
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self.active -= 1
+            if log is not None:
+                finish(log, game)
+                log.save(os.path.join(self.record_dir, f"session-{number:06d}.log"))
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port,
+                                                 limit=MAX_LINE, backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host Crystal Kingdoms sessions over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds each session waits after a turn")
+    parser.add_argument("--idle-timeout", type=float, default=900.0, help="seconds before an idle player is dropped")
+    parser.add_argument("--max-sessions", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--record", metavar="DIR", help="save a session log of every game in DIR")
+    parser.add_argument("--pack", metavar="FILE", help="serve the world in a JSON or TOML content pack")
+    args = parser.parse_args()
+
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    server = GameServer(args.host, args.port, args.delay, args.idle_timeout, args.max_sessions, args.seed,
+                        args.record, args.pack)
+    print(f"Serving The Crystal Kingdoms on {args.host}:{args.port}")
+    with suppress(KeyboardInterrupt):
+        asyncio.run(server.serve_forever())
@@ -0,0 +1,37 @@
+"""GameApi validates requests and locks sessions one by one; run with `python -m pytest tests`."""
+import tempfile
+import threading
+import unittest
+from http import HTTPStatus
+
+from api import ApiError, GameApi, SessionStore
+
+
+class Api(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.api = GameApi(SessionStore(self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_non_scalar_seed_is_a_bad_request(self):
+        for seed in ([1, 2], {"a": 1}):
+            with self.assertRaises(ApiError) as caught:
+                self.api.create({"char_class": "warrior", "seed": seed})
+            self.assertEqual(caught.exception.status, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(self.api.create({"char_class": "warrior", "seed": "abc"})["over"])
+
+    def test_sessions_do_not_wait_for_each_other(self):
+        first = self.api.create({"char_class": "warrior", "seed": 1})["id"]
+        second = self.api.create({"char_class": "mage", "seed": 2})["id"]
+        with self.api._session(first):
+            viewed = []
+            thread = threading.Thread(target=lambda: viewed.append(self.api.view(second)))
+            thread.start()
+            thread.join(5)
+            self.assertEqual([view["id"] for view in viewed], [second])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+"""Inventory behaves like the list it replaced; run with `python -m pytest tests`."""
+import random
+import unittest
+
+from AI_edited_rpg import Inventory
+
+
+class InventoryOrder(unittest.TestCase):
+    def test_mixed_order_iteration_and_indexing(self):
+        inventory = Inventory([0, 2, 0])
+        self.assertEqual(list(inventory), [0, 2, 0])
+        self.assertEqual(inventory[1], 2)
+        self.assertEqual(inventory[-1], 0)
+
+    def test_matches_a_list(self):
+        rng = random.Random(0)
+        items, inventory = [], Inventory()
+        for _ in range(2000):
+            item = rng.randrange(6)
+            if rng.random() < 0.4 and item in items:
+                items.remove(item)
+                inventory.remove(item)
+            else:
+                items.append(item)
+                inventory.append(item)
+            self.assertEqual(list(inventory), items)
+            self.assertEqual(len(inventory), len(items))
+            self.assertEqual(inventory.count(item), items.count(item))
+            if items:
+                index = rng.randrange(len(items))
+                self.assertEqual(inventory[index], items[index])
+        self.assertEqual(inventory.copy(), Inventory(items))
+        with self.assertRaises(IndexError):
+            inventory[len(items)]
+        with self.assertRaises(ValueError):
+            inventory.remove(99)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""QuestTracker lists what a full scan of the quests would; run with `python -m pytest tests`."""
+import random
+import unittest
+
+from AI_edited_rpg import QuestTracker
+from worldgen import LazyWorld, generate_world
+
+
+def scan(world, completed, active):
+    return [quest for quest in range(len(world.quests))
+            if quest not in completed and quest not in active
+            and all(required in completed for required in world.quests[quest].requires)]
+
+
+class AvailableQuests(unittest.TestCase):
+    def test_matches_a_scan(self):
+        world = generate_world(5, quests=300, locations=10, cross_links=0.3)
+        rng = random.Random(0)
+        tracker = QuestTracker(world)
+        completed, active = set(), set()
+        for _ in range(200):
+            available = tracker.available()
+            self.assertEqual(available, scan(world, completed, active))
+            self.assertEqual(tracker.count, len(available))
+            self.assertEqual(tracker.available(5), available[:5])
+            if active and rng.random() < 0.5:
+                quest = rng.choice(sorted(active))
+                active.discard(quest)
+                completed.add(quest)
+                tracker.complete(quest)
+            elif available:
+                quest = rng.choice(available)
+                active.add(quest)
+                tracker.accept(quest)
+        rebuilt = QuestTracker(world, completed, active)
+        self.assertEqual((rebuilt.available(), rebuilt.count), (tracker.available(), tracker.count))
+
+    def test_a_huge_world_lists_a_page(self):
+        world = LazyWorld(quests=1_000_000, locations=1000)
+        tracker = QuestTracker(world)
+        self.assertEqual(tracker.available(3), list(world.root_quests[:3]))
+        self.assertEqual(tracker.count, len(world.root_quests))
+        self.assertFalse(tracker.taken or tracker.unlocked or tracker.missing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Encounter tables of compiled locations; run with `python -m pytest tests`."""
+import random
+import unittest
+
+from AI_edited_rpg import DEFAULT_WORLD, CrystalKingdoms, run_sync
+from content import compile_world
+from headless import HeadlessIO, RandomPolicy
+from pacing import TurboPacer
+from worldgen import generate_world
+
+
+def world_with(location):
+    return compile_world({"warrior": {"health": 100, "strength": 8, "agility": 5, "magic": 2}},
+                         {"potion": {"type": "consumable", "effect": "heal", "value": 10}},
+                         {"cave": dict({"description": "A cave.", "npcs": []}, **location)},
+                         {"rat": {"health": 5, "strength": 1, "agility": 1}}, {})
+
+
+class ClassicDraws(unittest.TestCase):
+    def test_default_weights_draw_as_before(self):
+        self.assertTrue(all(tables.classic for tables in DEFAULT_WORLD.location_tables))
+        weighted = world_with({"enemies": {"rat": 3}, "items": {"potion": 1}, "events": {"combat": 1}})
+        self.assertFalse(weighted.location_tables[0].classic)
+        uneven = generate_world(3, quests=20, locations=4)
+        self.assertFalse(any(tables.classic for tables in uneven.location_tables))
+
+
+class EmptyTables(unittest.TestCase):
+    def test_nothing_to_fight_or_find_turns_up_nothing(self):
+        for location, weights in (({"enemies": [], "items": ["potion"]}, (0, 28, 72)),
+                                  ({"enemies": ["rat"], "items": []}, (42, 0, 58)),
+                                  ({"enemies": [], "items": [], "events": {"combat": 1, "item": 2}}, (0, 0, 3))):
+            with self.subTest(location):
+                world = world_with(location)
+                self.assertEqual(world.locations[0].event_weights, weights)
+                io = HeadlessIO(RandomPolicy(random.Random(0), char_class="warrior"))
+                game = CrystalKingdoms(io=io, rng=random.Random(0), world=world, pacer=TurboPacer())
+                io.game = game
+                run_sync(game.create_character())
+                for _ in range(100):
+                    game.player.health = game.player.max_health
+                    run_sync(game.explore())
+
+
+if __name__ == "__main__":
+    unittest.main()
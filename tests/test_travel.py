@@ -0,0 +1,41 @@
+"""Editing a location graph; run with `python -m pytest tests`."""
+import unittest
+
+from AI_edited_rpg import CHARACTER_CLASSES, DEFAULT_WORLD
+from content import compile_world
+
+
+def chain_world():
+    """Three locations in a row, the outer ones 5 apart"""
+    locations = {name: {"description": name, "enemies": [], "items": [], "npcs": [], "exits": exits}
+                 for name, exits in (("a", {"b": 2}), ("b", {"c": 3}), ("c", {}))}
+    return compile_world(CHARACTER_CLASSES, {}, locations, {}, {})
+
+
+class LocationGraphEdits(unittest.TestCase):
+    def test_the_shared_graph_cannot_be_edited(self):
+        with self.assertRaises(RuntimeError):
+            DEFAULT_WORLD.graph.set_exit(0, 1, 5)
+        with self.assertRaises(RuntimeError):
+            DEFAULT_WORLD.graph.remove_exit(0, 1)
+
+    def test_a_copy_is_edited_alone(self):
+        world = chain_world()
+        cache = world.graph.cache_info()
+        graph = world.graph.copy()
+        graph.set_exit(0, 2, 1)
+        self.assertEqual(graph.distance(0, 2), 1)
+        self.assertEqual(world.graph.distance(0, 2), 5)
+        self.assertEqual(world.graph.cache_info()["version"], cache["version"])
+        graph.remove_exit(0, 2)
+        self.assertEqual(graph.route(0, 2), [1, 2])
+
+    def test_edited_exits_stay_sorted(self):
+        graph = chain_world().graph.copy()
+        graph.set_exit(2, 0, 3)
+        for location in (0, 2):
+            self.assertEqual(list(graph.exits(location)), sorted(graph.exits(location)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""UndoHistory rewinds to exactly the recorded turn starts; run with `python -m pytest tests`."""
+import random
+import unittest
+
+from AI_edited_rpg import Character, CrystalKingdoms, Inventory, QuestList, QuestProgress, UndoHistory
+
+
+def state(player):
+    return (list(player.inventory), list(player.quests_completed), list(player.active_quests),
+            dict(player.quest_progress.items()), player.health)
+
+
+class Rewind(unittest.TestCase):
+    def test_matches_recorded_states(self):
+        rng = random.Random(0)
+        game = CrystalKingdoms(undo_depth=5)
+        game.player = Character("Bot", "warrior", 100, 100, 8, 5, 2, Inventory([0]), 0, [],
+                                QuestList(), QuestList(), QuestProgress())
+        history, recorded = game.history, []
+        for _ in range(3000):
+            player = game.player
+            for _ in range(rng.randrange(4)):
+                roll = rng.random()
+                if roll < 0.3:
+                    player.inventory.append(rng.randrange(5))
+                elif roll < 0.5 and player.inventory:
+                    player.inventory.remove(rng.choice(list(player.inventory)))
+                elif roll < 0.6:
+                    quest = rng.randrange(4)
+                    if quest not in player.active_quests and quest not in player.quests_completed:
+                        player.active_quests.append(quest)
+                elif roll < 0.7 and player.active_quests:
+                    quest = rng.choice(list(player.active_quests))
+                    player.active_quests.remove(quest)
+                    player.quests_completed.append(quest)
+                elif roll < 0.9:
+                    player.quest_progress[rng.randrange(4)] = rng.randrange(3)
+                elif roll < 0.95:
+                    player.inventory = player.inventory.copy()  # replaced, as restore() does
+                else:
+                    player.health -= 1
+            history.record(game)
+            recorded = (recorded + [state(game.player)])[-5:]
+            self.assertEqual(len(history), len(recorded))
+            if rng.random() < 0.2:
+                turns = rng.randrange(len(recorded))
+                self.assertTrue(history.rewind(game, turns))
+                self.assertEqual(state(game.player), recorded[-turns - 1])
+                del recorded[-turns - 1:]
+        self.assertFalse(history.rewind(game, 5))
+
+    def test_frames_hold_only_changes(self):
+        game = CrystalKingdoms(undo_depth=3)
+        game.player = Character("Bot", "warrior", 100, 100, 8, 5, 2, Inventory(range(1000)), 0, [],
+                                QuestList(), QuestList(), QuestProgress())
+        history = UndoHistory(3)
+        history.record(game)
+        game.player.inventory.append(7)
+        history.record(game)
+        history.record(game)
+        self.assertEqual(history.frames[1].inventory, (("append", 7),))
+        self.assertEqual(history.frames[2].inventory, ())
+
+
+if __name__ == "__main__":
+    unittest.main()
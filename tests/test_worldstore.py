@@ -0,0 +1,35 @@
+"""WorldStore stands in for a CompiledWorld; run with `python -m pytest tests`."""
+import os
+import tempfile
+import unittest
+
+from AI_edited_rpg import DEFAULT_WORLD
+from content import completability_problems
+from packs import load_pack
+from worldgen import generate_world, requires_depth
+from worldstore import write_store
+
+
+class WorldStoreChecks(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def store(self, world, name: str):
+        path = os.path.join(self.directory.name, name)
+        write_store(world, path)
+        return load_pack(path)
+
+    def test_completability_problems_on_a_store(self):
+        for world, name in ((DEFAULT_WORLD, "default.world"),
+                            (generate_world(3, quests=500, locations=20), "generated.world")):
+            with self.subTest(name):
+                self.assertEqual(completability_problems(self.store(world, name)), completability_problems(world))
+
+    def test_requires_depth_on_a_store(self):
+        world = generate_world(3, quests=500, locations=20, cross_links=0.3)
+        self.assertEqual(requires_depth(self.store(world, "depth.world")), requires_depth(world))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""The location graph and shortest-route travel.
+
+Every location lists its exits: the neighbouring locations it leads to and
+what it costs to get there. Exits are two-way. The move menu lists only the
+exits of the player's location. Typing a location's name travels there by
+the cheapest route, through the locations in between.
+
+Routes come from memoized shortest-path tables. The first route to a
+destination runs Dijkstra's algorithm once, outwards from that destination.
+It stores two arrays over every location: the next hop towards the
+destination, and the total cost of getting there. After that, next_hop()
+and distance() for that destination are one array lookup from any
+location, and a route costs one lookup per hop. Tables are kept for the
+max_routes most recently used destinations, shared by every thread that
+routes over the graph.
+
+A world's graph is shared by every game played in it, so it cannot be
+edited. A game that changes its exits routes over copy() instead: the
+copy lists the edited exits over the world's, and keeps its own route
+tables. Adding, removing or re-costing an exit drops the copy's tables.
+"""
+import heapq
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+NO_ID = -1  # the same as content.NO_ID; content imports this module
+
+
+class LocationGraph:
+    """Exits between locations, with cached shortest routes; only a copy() can be edited"""
+    def __init__(self, locations: Sequence, max_routes: int = 256, editable: bool = False):
+        self.locations = locations
+        self.max_routes = max_routes
+        self.editable = editable
+        self.version = 0  # bumped on every edit
+        self.hits = self.misses = 0
+        self._edited: Dict[int, Dict[int, int]] = {}  # the exits of edited locations, neighbour -> cost
+        self._routes: "OrderedDict[int, Tuple[array, array]]" = OrderedDict()
+        self._lock = threading.Lock()  # guards _routes and the counters
+
+    def copy(self) -> "LocationGraph":
+        """An editable graph over the same locations, with this one's edits and no route tables"""
+        graph = LocationGraph(self.locations, self.max_routes, editable=True)
+        graph._edited = {location: dict(exits) for location, exits in self._edited.items()}
+        return graph
+
+    def exits(self, location: int) -> Sequence[Tuple[int, int]]:
+        """(neighbour, cost) pairs of the exits from location"""
+        edited = self._edited.get(location)
+        return self.locations[location].exits if edited is None else tuple(sorted(edited.items()))
+
+    def set_exit(self, location: int, neighbour: int, cost: int):
+        """Add the exit between two locations, or change its cost"""
+        if location == neighbour:
+            raise ValueError("A location cannot lead to itself")
+        if cost < 1:
+            raise ValueError("Travel costs must be at least 1")
+        self._edit(location)[neighbour] = cost
+        self._edit(neighbour)[location] = cost
+        self._invalidate()
+
+    def remove_exit(self, location: int, neighbour: int):
+        self._edit(location).pop(neighbour, None)
+        self._edit(neighbour).pop(location, None)
+        self._invalidate()
+
+    def _edit(self, location: int) -> Dict[int, int]:
+        if not self.editable:
+            raise RuntimeError("A world's location graph is shared by its games; edit a copy() of it")
+        edited = self._edited.get(location)
+        if edited is None:
+            edited = self._edited[location] = dict(self.locations[location].exits)
+        return edited
+
+    def _invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._routes.clear()
+
+    def _table(self, destination: int) -> Tuple[array, array]:
+        """Next hop towards destination and distance to it, for every location; -1 where unreachable"""
+        with self._lock:
+            table = self._routes.get(destination)
+            if table is not None:
+                self._routes.move_to_end(destination)
+                self.hits += 1
+                return table
+            self.misses += 1
+            version = self.version
+        # Built unlocked: two threads may both build a missing table, and one of them is kept
+        count = len(self.locations)
+        next_hop = array("i", [NO_ID]) * count
+        distance = array("q", [-1]) * count
+        next_hop[destination] = destination
+        distance[destination] = 0
+        pending = [(0, destination)]
+        while pending:
+            cost, location = heapq.heappop(pending)
+            if cost > distance[location]:
+                continue  # already reached more cheaply
+            for neighbour, step in self.exits(location):
+                total = cost + step
+                if distance[neighbour] < 0 or total < distance[neighbour]:
+                    distance[neighbour] = total
+                    next_hop[neighbour] = location  # exits are two-way, so this is the way back
+                    heapq.heappush(pending, (total, neighbour))
+        table = (next_hop, distance)
+        with self._lock:
+            if version == self.version:  # not edited meanwhile
+                self._routes[destination] = table
+                if len(self._routes) > self.max_routes:
+                    self._routes.popitem(last=False)
+        return table
+
+    def next_hop(self, source: int, destination: int) -> int:
+        """The neighbour of source to go to first on the cheapest route to destination, or NO_ID"""
+        return self._table(destination)[0][source]
+
+    def distance(self, source: int, destination: int) -> Optional[int]:
+        """Total cost of the cheapest route, or None if there is none"""
+        cost = self._table(destination)[1][source]
+        return None if cost < 0 else cost
+
+    def route(self, source: int, destination: int) -> Optional[List[int]]:
+        """The locations passed through after source, ending with destination; None if unreachable"""
+        next_hop = self._table(destination)[0]
+        if next_hop[source] == NO_ID:
+            return None
+        hops = []
+        location = source
+        while location != destination:
+            location = next_hop[location]
+            hops.append(location)
+        return hops
+
+    def nearest(self, source: int, targets: Iterable[int]) -> int:
+        """The reachable target closest to source, or NO_ID; exits are two-way, so one table answers this"""
+        distance = self._table(source)[1]
+        reachable = [target for target in targets if distance[target] >= 0]
+        return min(reachable, key=distance.__getitem__, default=NO_ID)
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "resident": len(self._routes),
+                    "max_routes": self.max_routes, "version": self.version}
@@ -0,0 +1,461 @@
+"""Seeded generator for large Crystal Kingdoms worlds.
+
+A WorldShape (seed plus sizes) describes a whole world, and every enemy,
+item, location, NPC and quest in it is derived on its own from the seed and
+its ID, so any one record can be rebuilt without the rest. Two ways to use
+it:
+
+- generate_tables() builds name-keyed tables in the same shape as ITEMS,
+  LOCATIONS, ENEMIES and QUEST_DATA in AI_edited_rpg.py, so they can be
+  compiled, saved as JSON or played like the built-in world.
+- LazyWorld plays the same world without building it: locations with their
+  NPCs and quests are generated in regions when the game first touches
+  them and kept in a size-bounded LRU, so startup time and resident memory
+  do not depend on the world size. Evicted regions are rebuilt identically.
+
+Quests are laid out in requirement chains of chain_length quests, each
+requiring the one before it; with probability cross_links a quest also
+requires the quest at the same position in one of the LINK_SPAN chains
+before its own, which makes chains hang off each other and the graph deeper
+than one chain. NPCs are spread evenly over the locations and quests
+round-robin over the NPCs, so a world with 200 locations, 250 NPCs per
+location and 50,000 quests has one quest per NPC. Locations sit on a ring,
+and each one has exits to the locations 1, ROAD_STRIDE, ROAD_STRIDE ** 2...
+places away on either side, so any location is a few hops from any other
+and the exits of one location are known without looking at the rest.
+Each enemy and item at a location is rare, uncommon or common there
+(RARITY), which sets its weight in the location's encounter or loot table.
+
+Generated worlds can always be finished: every enemy appears at some
+location, every item can be found somewhere and every quest counts kills of
+at least one enemy. `python worldgen.py` checks this with
+content.completability_problems() and reports sizes and timings, e.g.
+`python worldgen.py --quests 50000 --locations 200 --npcs-per-location 250`.
+`--lazy` plays random games on a LazyWorld instead and reports its cache.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from array import array
+from collections import OrderedDict, abc
+from typing import Callable, Container, Dict, Iterator, List, NamedTuple, Tuple
+
+from AI_edited_rpg import CHARACTER_CLASSES, DEFAULT_WORLD, run_sync
+from content import (NO_ID, CompiledWorld, Enemy, Item, Location, Npc, Quest, compile_world,
+                     completability_problems)
+from headless import HeadlessIO, QuietGame, RandomPolicy
+from pacing import TurboPacer
+from sampling import DEFAULT_EVENT_WEIGHTS, LocationTables
+from travel import LocationGraph
+
+ITEM_KINDS = (
+    ("potion", {"type": "consumable", "effect": "heal", "value": 30}),
+    ("scroll", {"type": "consumable", "effect": "magic_boost", "value": 5}),
+    ("sword", {"type": "weapon", "effect": "strength_boost", "value": 3}),
+    ("relic", {"type": "key_item", "effect": "story"}),
+)
+BOSS = Enemy("boss", 300, 15, 7)
+LINK_SPAN = 8
+ROAD_STRIDE = 8
+RARITY = (1, 3, 10)  # rare, uncommon and common encounter and loot weights
+
+
+class WorldShape(NamedTuple):
+    """A generated world: its seed and sizes, and the records derived from them"""
+    seed: int = 0
+    quests: int = 1000
+    locations: int = 50
+    npcs_per_location: int = 20
+    enemies: int = 50
+    items: int = 200
+    chain_length: int = 50
+    cross_links: float = 0.1
+
+    def _rng(self, kind: str, index: int) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}:{index}")
+
+    @property
+    def npc_count(self) -> int:
+        return self.locations * self.npcs_per_location
+
+    def enemy(self, enemy: int) -> Enemy:
+        """Enemy records; the ID after the last regular enemy is the boss"""
+        if enemy == self.enemies:
+            return BOSS
+        rng = self._rng("enemy", enemy)
+        return Enemy(f"enemy_{enemy}", rng.randint(20, 80), rng.randint(3, 9), rng.randint(2, 8))
+
+    def item(self, item: int) -> Item:
+        kind, data = ITEM_KINDS[item % len(ITEM_KINDS)]
+        return Item(f"{kind}_{item}", data["type"], data["effect"], data.get("value", 0))
+
+    def cross_link(self, quest: int) -> int:
+        """The quest of an earlier chain that quest also requires, or NO_ID"""
+        chain, position = divmod(quest, self.chain_length)
+        if not chain or not position:
+            return NO_ID
+        rng = self._rng("link", quest)
+        if rng.random() >= self.cross_links:
+            return NO_ID
+        return (chain - 1 - rng.randrange(min(chain, LINK_SPAN))) * self.chain_length + position
+
+    def requires(self, quest: int) -> Tuple[int, ...]:
+        required = (quest - 1,) if quest % self.chain_length else ()
+        link = self.cross_link(quest)
+        return required if link == NO_ID else required + (link,)
+
+    def dependents(self, quest: int) -> Tuple[int, ...]:
+        """The quests that require quest, found without looking at any other chain than the next few"""
+        chain, position = divmod(quest, self.chain_length)
+        found = []
+        if position + 1 < self.chain_length and quest + 1 < self.quests:
+            found.append(quest + 1)
+        if position:
+            for later in range(chain + 1, chain + 1 + LINK_SPAN):
+                candidate = later * self.chain_length + position
+                if candidate >= self.quests:
+                    break
+                if self.cross_link(candidate) == quest:
+                    found.append(candidate)
+        return tuple(found)
+
+    def quest(self, quest: int) -> Quest:
+        rng = self._rng("quest", quest)
+        enemies = rng.sample(range(self.enemies), min(rng.randint(1, 2), self.enemies))
+        kills = tuple((enemy, rng.randint(1, 3)) for enemy in enemies)
+        items_needed = tuple(rng.sample(range(self.items), min(rng.randint(0, 2), self.items)))
+        reward = rng.randrange(self.items) if rng.random() < 0.9 else NO_ID
+        return Quest(f"quest_{quest}", self.requires(quest), kills, items_needed, reward,
+                     sum(count for _, count in kills))
+
+    def npc(self, npc: int) -> Npc:
+        """Every npc_count-th quest; a range, which takes the same memory however many that is"""
+        return Npc(f"npc_{npc}", range(npc, self.quests, self.npc_count))
+
+    def location(self, location: int) -> Location:
+        """Every enemy and item is placed at least once, then each location gets a few more at random"""
+        rng = self._rng("location", location)
+        enemies = list(range(location, self.enemies, self.locations))
+        enemies += rng.sample(range(self.enemies), min(2, self.enemies))
+        items = list(range(location, self.items, self.locations))
+        items += rng.sample(range(self.items), min(2, self.items))
+        enemies, items = tuple(dict.fromkeys(enemies)), tuple(dict.fromkeys(items))
+        first_npc = location * self.npcs_per_location
+        return Location(f"location_{location}", f"Generated location {location}.", enemies, items,
+                        tuple(range(first_npc, first_npc + self.npcs_per_location)), self.exits(location),
+                        enemy_weights=tuple(rng.choice(RARITY) for _ in enemies),
+                        item_weights=tuple(rng.choice(RARITY) for _ in items),
+                        event_weights=DEFAULT_EVENT_WEIGHTS)
+
+    def exits(self, location: int) -> Tuple[Tuple[int, int], ...]:
+        """(neighbour, cost) pairs; a road's cost is derived from both ends, so it is the same either way"""
+        neighbours = set()
+        stride = 1
+        while stride < self.locations:
+            neighbours.update(((location + stride) % self.locations, (location - stride) % self.locations))
+            stride *= ROAD_STRIDE
+        neighbours.discard(location)
+        return tuple((neighbour, self._rng("road", min(location, neighbour) * self.locations
+                                           + max(location, neighbour)).randint(1, 5))
+                     for neighbour in sorted(neighbours))
+
+    def location_of_quest(self, quest: int) -> int:
+        return quest % self.npc_count // self.npcs_per_location
+
+    def check(self):
+        if min(self.quests, self.locations, self.npcs_per_location, self.enemies, self.items,
+               self.chain_length) < 1:
+            raise ValueError("Every size must be at least 1")
+
+
+def generate_tables(seed: int = 0, **sizes) -> dict:
+    """World tables keyed by compile_world()'s argument names; sizes are WorldShape fields"""
+    shape = WorldShape(seed, **sizes)
+    shape.check()
+    enemies = [shape.enemy(enemy) for enemy in range(shape.enemies + 1)]
+    items = [shape.item(item) for item in range(shape.items)]
+    quests = [shape.quest(quest) for quest in range(shape.quests)]
+
+    locations = {}
+    for location_id in range(shape.locations):
+        location = shape.location(location_id)
+        locations[location.name] = {
+            "description": location.description,
+            "enemies": {enemies[enemy].name: weight for enemy, weight in zip(location.enemies, location.enemy_weights)},
+            "items": {items[item].name: weight for item, weight in zip(location.items, location.item_weights)},
+            "npcs": [{"name": npc.name, "quests": [quests[quest].name for quest in npc.quests]}
+                     for npc in map(shape.npc, location.npcs)],
+            "exits": {f"location_{neighbour}": cost for neighbour, cost in location.exits},
+        }
+
+    return {
+        "character_classes": {name: dict(stats) for name, stats in CHARACTER_CLASSES.items()},
+        "items": {item.name: dict(ITEM_KINDS[item_id % len(ITEM_KINDS)][1]) for item_id, item in enumerate(items)},
+        "locations": locations,
+        "enemies": {enemy.name: {"health": enemy.health, "strength": enemy.strength, "agility": enemy.agility}
+                    for enemy in enemies},
+        "quest_data": {quest.name: {
+            "requires": [quests[required].name for required in quest.requires],
+            "enemy_kills": {enemies[enemy].name: count for enemy, count in quest.enemy_kills},
+            "items_needed": [items[item].name for item in quest.items_needed],
+            "reward": None if quest.reward == NO_ID else items[quest.reward].name,
+            "progress_max": quest.progress_max,
+        } for quest in quests},
+        "boss": BOSS.name,
+        "start_location": "location_0",
+        "starting_items": [items[0].name],
+    }
+
+
+def generate_world(seed: int = 0, **sizes) -> CompiledWorld:
+    """A compiled generated world; takes the same arguments as generate_tables()"""
+    return compile_world(**generate_tables(seed, **sizes))
+
+
+class _Derived(abc.Sequence):
+    """A read-only sequence whose entries are computed on access"""
+    def __init__(self, length: int, entry: Callable[[int], object]):
+        self._length = length
+        self._entry = entry
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._entry(index)
+
+    def __iter__(self) -> Iterator:
+        return map(self._entry, range(self._length))
+
+
+class _NameIds(abc.Mapping):
+    """Name to ID lookup for generated names such as "location_12", without storing them"""
+    def __init__(self, prefix: str, count: int):
+        self._prefix = prefix
+        self._count = count
+
+    def __getitem__(self, name: str) -> int:
+        if isinstance(name, str) and name.startswith(self._prefix) and name[len(self._prefix):].isdigit():
+            index = int(name[len(self._prefix):])
+            if index < self._count and name == f"{self._prefix}{index}":
+                return index
+        raise KeyError(name)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        return (f"{self._prefix}{index}" for index in range(self._count))
+
+
+class _Region:
+    """A run of consecutive locations; their NPCs and quests are filled in as they are looked up"""
+    __slots__ = ("locations", "tables", "npcs", "quests")
+
+    def __init__(self, shape: WorldShape, first: int, last: int):
+        self.locations = [shape.location(location) for location in range(first, last)]
+        self.tables = [LocationTables.build(location) for location in self.locations]
+        self.npcs: Dict[int, Npc] = {}
+        self.quests: Dict[int, Quest] = {}
+
+
+class LazyWorld:
+    """A generated world that materializes regions of locations on demand.
+
+    It offers what the game uses of a CompiledWorld. Enemies and items are
+    small catalogs and are built up front; locations, NPCs and quests live
+    in regions of region_size consecutive locations, of which at most
+    max_regions stay resident, least recently used first out. The quest
+    indexes (dependents, root_quests, quests_for_*) are computed from the
+    shape or from the player's active quests rather than stored. A route
+    table covers every location, so the first route to each destination
+    visits every region and graph keeps only max_routes tables.
+    """
+    def __init__(self, seed: int = 0, region_size: int = 16, max_regions: int = 64, max_routes: int = 4,
+                 **sizes):
+        self.shape = shape = WorldShape(seed, **sizes)
+        shape.check()
+        self.region_size = region_size
+        self.max_regions = max_regions
+        self.hits = self.misses = self.evictions = 0
+        self._regions: "OrderedDict[int, _Region]" = OrderedDict()
+
+        self.character_classes = CHARACTER_CLASSES
+        self.enemies = tuple(shape.enemy(enemy) for enemy in range(shape.enemies + 1))
+        self.items = tuple(shape.item(item) for item in range(shape.items))
+        self.boss = shape.enemies
+        self.start_location = 0
+        self.starting_items = (0,)
+
+        self.enemy_ids = {enemy.name: i for i, enemy in enumerate(self.enemies)}
+        self.item_ids = {item.name: i for i, item in enumerate(self.items)}
+        self.location_ids = _NameIds("location_", shape.locations)
+        self.quest_ids = _NameIds("quest_", shape.quests)
+        self.enemy_health = array("i", (enemy.health for enemy in self.enemies))
+        self.enemy_strength = array("i", (enemy.strength for enemy in self.enemies))
+
+        self.locations = _Derived(shape.locations, self._location)
+        self.location_tables = _Derived(shape.locations, self._location_tables)
+        self.npcs = _Derived(shape.npc_count, self._npc)
+        self.quests = _Derived(shape.quests, self._quest)
+        self.quest_progress_max = _Derived(shape.quests, lambda quest: self._quest(quest).progress_max)
+        self.requires_count = _Derived(shape.quests, lambda quest: len(shape.requires(quest)))
+        self.dependents = _Derived(shape.quests, shape.dependents)
+        self.root_quests = range(0, shape.quests, shape.chain_length)
+        self.graph = LocationGraph(self.locations, max_routes)
+
+    def _region(self, location: int) -> _Region:
+        number = location // self.region_size
+        region = self._regions.get(number)
+        if region is not None:
+            self._regions.move_to_end(number)
+            self.hits += 1
+            return region
+        self.misses += 1
+        first = number * self.region_size
+        region = self._regions[number] = _Region(self.shape, first, min(first + self.region_size,
+                                                                          self.shape.locations))
+        if len(self._regions) > self.max_regions:
+            self._regions.popitem(last=False)
+            self.evictions += 1
+        return region
+
+    def _location(self, location: int) -> Location:
+        return self._region(location).locations[location % self.region_size]
+
+    def _location_tables(self, location: int) -> LocationTables:
+        return self._region(location).tables[location % self.region_size]
+
+    def _npc(self, npc: int) -> Npc:
+        npcs = self._region(npc // self.shape.npcs_per_location).npcs
+        record = npcs.get(npc)
+        if record is None:
+            record = npcs[npc] = self.shape.npc(npc)
+        return record
+
+    def _quest(self, quest: int) -> Quest:
+        quests = self._region(self.shape.location_of_quest(quest)).quests
+        record = quests.get(quest)
+        if record is None:
+            record = quests[quest] = self.shape.quest(quest)
+        return record
+
+    def quests_for_kill(self, enemy: int, active: Container[int]) -> List[int]:
+        """Active quests that count kills of enemy, in ID order"""
+        return sorted(quest for quest in active if any(kill == enemy for kill, _ in self._quest(quest).enemy_kills))
+
+    def quests_for_item(self, item: int, active: Container[int]) -> List[int]:
+        """Active quests that need item, in ID order"""
+        return sorted(quest for quest in active if item in self._quest(quest).items_needed)
+
+    def cache_info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "resident": len(self._regions), "max_regions": self.max_regions}
+
+
+def requires_depth(world: CompiledWorld) -> int:
+    """Length of the longest requirement chain"""
+    missing = array("i", world.requires_count)  # a copy; a WorldStore's is read-only
+    depth = [1] * len(world.quests)
+    ready = [quest for quest, count in enumerate(missing) if not count]
+    while ready:
+        quest = ready.pop()
+        for dependent in world.dependents[quest]:
+            depth[dependent] = max(depth[dependent], depth[quest] + 1)
+            missing[dependent] -= 1
+            if not missing[dependent]:
+                ready.append(dependent)
+    return max(depth, default=0)
+
+
+def _report_problems(problems: List[str], limit: int = 20) -> bool:
+    if not problems:
+        print("Completable: yes")
+        return True
+    print(f"Completable: no, {len(problems)} problems")
+    for problem in problems[:limit]:
+        print(f"  {problem}")
+    if len(problems) > limit:
+        print(f"  ... and {len(problems) - limit} more")
+    return False
+
+
+def play_lazy(world: LazyWorld, games: int, max_turns: int, seed: int = 0) -> int:
+    """Play random headless games on world; returns the turns played"""
+    turns = 0
+    for game_seed in range(seed, seed + games):
+        io = HeadlessIO(RandomPolicy(random.Random(game_seed)))
+        game = QuietGame(io=io, rng=random.Random(game_seed), world=world, pacer=TurboPacer(history=1))
+        io.game = game
+        run_sync(game.create_character())
+        run_sync(game.game_loop(max_turns))
+        turns += game.turns
+    return turns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large Crystal Kingdoms world")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quests", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--npcs-per-location", type=int, default=20)
+    parser.add_argument("--enemies", type=int, default=50)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--chain-length", type=int, default=50, help="quests in each requirement chain")
+    parser.add_argument("--cross-links", type=float, default=0.1,
+                        help="chance that a quest also requires one from an earlier chain")
+    parser.add_argument("--output", metavar="FILE", help="write the tables as JSON")
+    parser.add_argument("--check-default", action="store_true", help="check the built-in world instead")
+    parser.add_argument("--lazy", action="store_true", help="play random games on a LazyWorld instead")
+    parser.add_argument("--region-size", type=int, default=16, help="locations per LazyWorld region")
+    parser.add_argument("--max-regions", type=int, default=64, help="regions a LazyWorld keeps resident")
+    parser.add_argument("--games", type=int, default=20, help="games to play with --lazy")
+    parser.add_argument("--max-turns", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.check_default:
+        raise SystemExit(0 if _report_problems(completability_problems(DEFAULT_WORLD)) else 1)
+
+    sizes = dict(quests=args.quests, locations=args.locations, npcs_per_location=args.npcs_per_location,
+                 enemies=args.enemies, items=args.items, chain_length=args.chain_length,
+                 cross_links=args.cross_links)
+    if args.lazy:
+        tracemalloc.start()
+        start = time.perf_counter()
+        lazy = LazyWorld(args.seed, args.region_size, args.max_regions, **sizes)
+        built = time.perf_counter()
+        startup_memory = tracemalloc.get_traced_memory()[0]
+        turns = play_lazy(lazy, args.games, args.max_turns, args.seed)
+        played = time.perf_counter()
+        resident, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Started in {(built - start) * 1e3:.1f}ms using {startup_memory / 1024:.0f}KB")
+        print(f"{args.games} games, {turns} turns in {played - built:.2f}s; "
+              f"{resident / 1024:.0f}KB resident afterwards, {peak / 1024:.0f}KB at peak")
+        print("Region cache: " + ", ".join(f"{key} {value}" for key, value in lazy.cache_info().items()))
+        raise SystemExit(0)
+
+    start = time.perf_counter()
+    tables = generate_tables(args.seed, **sizes)
+    generated = time.perf_counter()
+    world = compile_world(**tables)
+    compiled = time.perf_counter()
+    problems = completability_problems(world)
+    checked = time.perf_counter()
+
+    print(f"{len(world.quests)} quests, {len(world.locations)} locations, {len(world.npcs)} NPCs, "
+          f"{len(world.enemies)} enemies, {len(world.items)} items")
+    print(f"Longest requirement chain: {requires_depth(world)} quests, "
+          f"most NPCs at one location: {max(len(location.npcs) for location in world.locations)}")
+    print(f"Generated in {generated - start:.2f}s, compiled in {compiled - generated:.2f}s, "
+          f"checked in {checked - compiled:.2f}s")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(tables, file)
+    raise SystemExit(0 if _report_problems(problems) else 1)
@@ -0,0 +1,368 @@
+"""Memory-mapped, read-only world store.
+
+write_store() saves a CompiledWorld as a flat file of fixed-layout arrays,
+and WorldStore maps that file read-only and offers the same interface as a
+CompiledWorld without building its tables. Worker processes that open (or
+inherit) the same store share its physical pages: nothing in the mapping is
+ever written, so unlike the tuples and dicts of a CompiledWorld, reference
+counting cannot un-share copy-on-write pages. Records are built from the
+mapping when they are looked up, and only the most recently used few are
+kept, so a worker's private memory does not grow with the world.
+
+Layout: a header (MAGIC, FORMAT, directory length), a JSON directory giving
+each section's offset, length and array type, then the sections, 8-byte
+aligned, in native byte order:
+
+- numeric columns: int32 arrays with one entry per enemy, item, quest...
+- lists: CSR pairs, an offsets array with one more entry than there are
+  rows and a values array; row i is values[offsets[i]:offsets[i + 1]].
+  Location exits are two lists with matching rows, neighbours and costs,
+  and each compiled sampling table is a float64 list of probabilities and
+  a list of aliases, so sampling reads the mapping without copying it
+- strings: one UTF-8 blob with int64 offsets; names and descriptions are
+  string IDs, and equal strings are stored once
+- name indexes: IDs sorted by name, searched by bisection
+
+Stores are named *.world; packs.load_pack() opens them too, so every
+--pack option accepts one. Build one with
+`python worldstore.py build world.json world.world` (or without a pack for
+the built-in world) and compare worker memory with
+`python worldstore.py bench world.world --workers 8` and the same for
+world.json.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+from array import array
+from collections import abc
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Container, Dict, Iterator, List, Optional, Tuple
+
+from content import CompiledWorld, Enemy, Item, Location, Npc, Quest
+from sampling import AliasTable, LocationTables, draws_classically
+from travel import LocationGraph
+
+MAGIC = b"CKWS"
+FORMAT = 3
+SUFFIX = ".world"
+RECORD_CACHE = 1024  # records kept per table, so menus and the status screen do not rebuild them every turn
+_HEADER = 12  # MAGIC, FORMAT and the directory length
+# Each location's sampling tables and the Location field with their weights
+_LOCATION_TABLES = (("events", "event_weights"), ("enemies", "enemy_weights"), ("items", "item_weights"))
+
+
+class StoreError(ValueError):
+    """Raised when a file is not a world store this version can read"""
+
+
+class _Writer:
+    def __init__(self):
+        self.sections: Dict[str, Tuple[str, bytes]] = {}
+        self.strings: Dict[str, int] = {}
+        self.string_data = bytearray()
+        self.string_offsets = array("q", [0])
+
+    def string(self, text: str) -> int:
+        string_id = self.strings.get(text)
+        if string_id is None:
+            string_id = self.strings[text] = len(self.strings)
+            self.string_data += text.encode("utf-8")
+            self.string_offsets.append(len(self.string_data))
+        return string_id
+
+    def column(self, name: str, values, typecode: str = "i"):
+        self.sections[name] = (typecode, array(typecode, values).tobytes())
+
+    def rows(self, name: str, rows, typecode: str = "i"):
+        offsets = array("i", [0])
+        values = array(typecode)
+        for row in rows:
+            values.extend(row)
+            offsets.append(len(values))
+        self.sections[f"{name}.offsets"] = ("i", offsets.tobytes())
+        self.sections[f"{name}.values"] = (typecode, values.tobytes())
+
+    def names(self, name: str, records):
+        self.column(f"{name}.name", (self.string(record.name) for record in records))
+        self.column(f"{name}.by_name", sorted(range(len(records)), key=lambda i: records[i].name))
+
+
+def write_store(world: CompiledWorld, path: str):
+    """Save world as a store at path (written to a temporary file, then moved into place)"""
+    out = _Writer()
+    out.names("enemy", world.enemies)
+    for field in ("health", "strength", "agility"):
+        out.column(f"enemy.{field}", (getattr(enemy, field) for enemy in world.enemies))
+    out.names("item", world.items)
+    out.column("item.type", (out.string(item.type) for item in world.items))
+    out.column("item.effect", (out.string(item.effect) for item in world.items))
+    out.column("item.value", (item.value for item in world.items))
+    out.names("location", world.locations)
+    out.column("location.description", (out.string(location.description) for location in world.locations))
+    for field in ("enemies", "items", "npcs"):
+        out.rows(f"location.{field}", (getattr(location, field) for location in world.locations))
+    out.rows("location.exits", ((neighbour for neighbour, _ in location.exits) for location in world.locations))
+    out.rows("location.exit_costs", ((cost for _, cost in location.exits) for location in world.locations))
+    for table, weights in _LOCATION_TABLES:
+        out.rows(f"location.{weights}", (getattr(location, weights) for location in world.locations), "d")
+        out.rows(f"location.{table}.probability",
+                 (getattr(tables, table).probability for tables in world.location_tables), "d")
+        out.rows(f"location.{table}.alias", (getattr(tables, table).alias for tables in world.location_tables))
+    out.column("npc.name", (out.string(npc.name) for npc in world.npcs))
+    out.rows("npc.quests", (npc.quests for npc in world.npcs))
+    out.names("quest", world.quests)
+    out.rows("quest.requires", (quest.requires for quest in world.quests))
+    out.rows("quest.kill_enemies", ((enemy for enemy, _ in quest.enemy_kills) for quest in world.quests))
+    out.rows("quest.kill_counts", ((count for _, count in quest.enemy_kills) for quest in world.quests))
+    out.rows("quest.items_needed", (quest.items_needed for quest in world.quests))
+    out.column("quest.reward", (quest.reward for quest in world.quests))
+    out.column("quest.progress_max", world.quest_progress_max)
+    out.column("quest.requires_count", world.requires_count)
+    out.column("quest.roots", world.root_quests)
+    out.rows("quests_by_enemy", world.quests_by_enemy)
+    out.rows("quests_by_item", world.quests_by_item)
+    out.rows("dependents", world.dependents)
+    out.column("starting_items", world.starting_items)
+    out.sections["strings"] = ("B", bytes(out.string_data))
+    out.sections["strings.offsets"] = ("q", out.string_offsets.tobytes())
+
+    directory = {
+        "byteorder": sys.byteorder,
+        "character_classes": {name: dict(stats) for name, stats in world.character_classes.items()},
+        "boss": world.boss, "start_location": world.start_location,
+        "sections": {},
+    }
+    offset = 0
+    for name, (typecode, data) in out.sections.items():
+        directory["sections"][name] = [offset, len(data), typecode]
+        offset += -len(data) % 8 + len(data)
+    encoded = json.dumps(directory).encode("utf-8")
+    start = _HEADER + len(encoded) + (-(_HEADER + len(encoded)) % 8)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(MAGIC + FORMAT.to_bytes(4, "little") + len(encoded).to_bytes(4, "little") + encoded)
+        file.write(bytes(start - file.tell()))
+        for typecode, data in out.sections.values():
+            file.write(data + bytes(-len(data) % 8))
+    os.replace(temporary, path)
+
+
+class _Rows(abc.Sequence):
+    """CSR rows; each row is a read-only memoryview of ints"""
+    __slots__ = ("offsets", "values")
+
+    def __init__(self, offsets: memoryview, values: memoryview):
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> memoryview:
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+
+class _Records(abc.Sequence):
+    """Records built from the store when looked up, the most recent RECORD_CACHE of them kept"""
+    __slots__ = ("length", "build")
+
+    def __init__(self, length: int, build: Callable[[int], tuple]):
+        self.length = length
+        self.build = lru_cache(RECORD_CACHE)(build)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return self.build(index)
+
+    def __iter__(self) -> Iterator:
+        return map(self.build, range(self.length))
+
+
+class _NameIndex(abc.Mapping):
+    """Name to ID lookup by bisection over the IDs sorted by name"""
+    __slots__ = ("by_name", "name")
+
+    def __init__(self, by_name: memoryview, name: Callable[[int], str]):
+        self.by_name = by_name
+        self.name = name
+
+    def __getitem__(self, name: str) -> int:
+        low, high = 0, len(self.by_name)
+        while low < high:
+            middle = (low + high) // 2
+            if self.name(self.by_name[middle]) < name:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.by_name) and self.name(self.by_name[low]) == name:
+            return self.by_name[low]
+        raise KeyError(name)
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.name(record) for record in range(len(self.by_name)))
+
+
+class WorldStore:
+    """A world read straight from a memory-mapped store, with the interface of a CompiledWorld"""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if bytes(view[:4]) != MAGIC or int.from_bytes(view[4:8], "little") != FORMAT:
+            raise StoreError(f"{path} is not a format {FORMAT} world store")
+        length = int.from_bytes(view[8:12], "little")
+        directory = json.loads(bytes(view[_HEADER:_HEADER + length]))
+        if directory["byteorder"] != sys.byteorder:
+            raise StoreError(f"{path} was written on a {directory['byteorder']}-endian machine")
+        start = _HEADER + length + (-(_HEADER + length) % 8)
+        sections = {name: view[start + offset:start + offset + size].cast(typecode)
+                    for name, (offset, size, typecode) in directory["sections"].items()}
+        self._sections = sections
+
+        self._strings = sections["strings"]
+        self._string_offsets = sections["strings.offsets"]
+        rows = lambda name: _Rows(sections[f"{name}.offsets"], sections[f"{name}.values"])
+
+        self.character_classes = MappingProxyType(
+            {name: MappingProxyType(stats) for name, stats in directory["character_classes"].items()})
+        self.boss = directory["boss"]
+        self.start_location = directory["start_location"]
+        self.starting_items = tuple(sections["starting_items"])
+
+        enemy_name, health = sections["enemy.name"], sections["enemy.health"]
+        strength, agility = sections["enemy.strength"], sections["enemy.agility"]
+        self.enemies = _Records(len(enemy_name), lambda i: Enemy(
+            self._string(enemy_name[i]), health[i], strength[i], agility[i]))
+        self.enemy_health = health
+        self.enemy_strength = strength
+
+        item_name, item_type = sections["item.name"], sections["item.type"]
+        item_effect, item_value = sections["item.effect"], sections["item.value"]
+        self.items = _Records(len(item_name), lambda i: Item(
+            self._string(item_name[i]), self._string(item_type[i]), self._string(item_effect[i]), item_value[i]))
+
+        location_name, description = sections["location.name"], sections["location.description"]
+        location_enemies, location_items = rows("location.enemies"), rows("location.items")
+        location_npcs, exits, exit_costs = rows("location.npcs"), rows("location.exits"), rows("location.exit_costs")
+        weights = {field: rows(f"location.{field}") for _, field in _LOCATION_TABLES}
+        self.locations = _Records(len(location_name), lambda i: Location(
+            self._string(location_name[i]), self._string(description[i]), tuple(location_enemies[i]),
+            tuple(location_items[i]), tuple(location_npcs[i]), tuple(zip(exits[i], exit_costs[i])),
+            **{field: tuple(row[i]) for field, row in weights.items()}))
+        self.graph = LocationGraph(self.locations)
+        tables = [(rows(f"location.{table}.probability"), rows(f"location.{table}.alias"))
+                  for table, _ in _LOCATION_TABLES]  # in LocationTables field order
+        self.location_tables = _Records(len(location_name), lambda i: LocationTables(
+            *(AliasTable(probability[i], alias[i]) for probability, alias in tables),
+            classic=draws_classically(self.locations[i])))
+
+        npc_name, npc_quests = sections["npc.name"], rows("npc.quests")
+        self.npcs = _Records(len(npc_name), lambda i: Npc(self._string(npc_name[i]), tuple(npc_quests[i])))
+
+        quest_name, requires = sections["quest.name"], rows("quest.requires")
+        kill_enemies, kill_counts = rows("quest.kill_enemies"), rows("quest.kill_counts")
+        items_needed, reward = rows("quest.items_needed"), sections["quest.reward"]
+        progress_max = sections["quest.progress_max"]
+        self.quests = _Records(len(quest_name), lambda i: Quest(
+            self._string(quest_name[i]), tuple(requires[i]), tuple(zip(kill_enemies[i], kill_counts[i])),
+            tuple(items_needed[i]), reward[i], progress_max[i]))
+        self.quest_progress_max = progress_max
+        self.requires_count = sections["quest.requires_count"]
+        self.root_quests = sections["quest.roots"]
+        self.quests_by_enemy = rows("quests_by_enemy")
+        self.quests_by_item = rows("quests_by_item")
+        self.dependents = rows("dependents")
+
+        self.enemy_ids = _NameIndex(sections["enemy.by_name"], lambda i: self._string(enemy_name[i]))
+        self.item_ids = _NameIndex(sections["item.by_name"], lambda i: self._string(item_name[i]))
+        self.location_ids = _NameIndex(sections["location.by_name"], lambda i: self._string(location_name[i]))
+        self.quest_ids = _NameIndex(sections["quest.by_name"], lambda i: self._string(quest_name[i]))
+
+    def _string(self, string_id: int) -> str:
+        offsets = self._string_offsets
+        return str(self._strings[offsets[string_id]:offsets[string_id + 1]], "utf-8")
+
+    def quests_for_kill(self, enemy: int, active: Container[int]) -> List[int]:
+        """Active quests that count kills of enemy, in ID order"""
+        return [quest for quest in self.quests_by_enemy[enemy] if quest in active]
+
+    def quests_for_item(self, item: int, active: Container[int]) -> List[int]:
+        """Active quests that need item, in ID order"""
+        return [quest for quest in self.quests_by_item[item] if quest in active]
+
+
+def _proportional_memory(pid: int) -> Optional[int]:
+    """Proportional set size in bytes: private pages plus a fair share of shared ones (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            for line in file:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def _bench_worker(path: str, games: int, seed: int) -> Tuple[int, Optional[int]]:
+    from batch_runner import play_seeded
+    from packs import load_pack
+    world = load_pack(path)
+    turns = sum(play_seeded(game_seed, world=world).turns for game_seed in range(seed, seed + games))
+    return turns, _proportional_memory(os.getpid())
+
+
+def bench(path: str, workers: int, games: int) -> List[Optional[int]]:
+    """Play games in forked workers on path (pack or store) and return each worker's memory"""
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    from packs import load_pack
+    load_pack(path)  # workers inherit the loaded world through fork
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        results = list(pool.map(_bench_worker, [path] * workers, [games] * workers,
+                                range(0, workers * games, games)))
+    return [memory for _, memory in results]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and inspect memory-mapped world stores")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write a store from a content pack or the built-in world")
+    build.add_argument("pack", nargs="?", help="JSON or TOML content pack (default: the built-in world)")
+    build.add_argument("output", nargs="?", default=f"default{SUFFIX}")
+    measure = commands.add_parser("bench", help="report worker memory when playing on a store or a pack")
+    measure.add_argument("path", help="store or pack to play on; run once per file, so they do not share a parent")
+    measure.add_argument("--workers", type=int, default=4)
+    measure.add_argument("--games", type=int, default=20, help="games per worker")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.pack:
+            from packs import load_pack
+            world = load_pack(args.pack)
+        else:
+            from AI_edited_rpg import DEFAULT_WORLD as world
+        write_store(world, args.output)
+        print(f"Wrote {args.output}: {os.path.getsize(args.output) / 1e6:.2f}MB, "
+              f"{len(world.quests)} quests, {len(world.locations)} locations")
+    else:
+        memory = [value for value in bench(args.path, args.workers, args.games) if value is not None]
+        if memory:
+            print(f"{args.path}: {len(memory)} workers, {sum(memory) / len(memory) / 1e6:.1f}MB "
+                  f"proportional memory per worker")
+        else:
+            print(f"{args.path}: worker memory is only reported on Linux")